@@ -1,3 +1,8 @@
-import importlib.metadata
+def __getattr__(name: str):
+    # Resolved on demand: reading the package metadata is slow, and most
+    # invocations never need the version.
+    if name == "__version__":
+        import importlib.metadata
 
-__version__ = importlib.metadata.version("esctl")
+        return importlib.metadata.version("esctl")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,71 +1,163 @@
 import importlib
 import logging
-from typing import Annotated, Any, Callable
+from pathlib import Path
+import sys
+from typing import Annotated, Any, Callable, NamedTuple
 
-import elasticsearch8
-import elasticsearch9
 import typer
+from typer.core import CompletionItem, TyperGroup
 from rich.logging import RichHandler
 from rich import print
 
 
-from esctl.commands.cat import app as cat_app
-from esctl.commands.cluster import app as cluster_app
-from esctl.commands.config import app as config_app
-from esctl.commands.tasks import app as task_app
-from esctl.commands.index import app as index_app
-from esctl.commands.reindex import app as reindex_app
-from esctl.commands.troubleshoot import app as troubleshoot_app
-from esctl.commands.snapshot import app as snapshot_app
-from esctl.commands.shell import app as shell_app
-from esctl.commands._exec import app as exec_app
 from esctl.options.output import OutputOption
 from esctl.config import Config, ESConfigType
-from esctl.utils import try_create_github_issue
+from esctl.utils import EsctlError, try_create_github_issue
 
 
 class CustomTyper(typer.Typer):
     def __call__(self, *args, **kwargs):
-        token = cfg.github_auth
         try:
             super(CustomTyper, self).__call__(*args, **kwargs)
         except (KeyboardInterrupt, typer.Exit):
             raise
-        except tuple(
-            getattr(elasticsearch8.exceptions, s)
-            for s in elasticsearch8.exceptions.__all__
-        ) as e:
-            try_create_github_issue(
-                e, token, ".".join(str(part) for part in elasticsearch8.__version__)
-            )
-            raise
-        except tuple(
-            getattr(elasticsearch9.exceptions, s)
-            for s in elasticsearch9.exceptions.__all__
-        ) as e:
-            try_create_github_issue(
-                e, token, ".".join(str(part) for part in elasticsearch9.__version__)
-            )
-            raise
+        except EsctlError as e:
+            print(f"[red]Error:[/] {e}")
+            sys.exit(1)
         except Exception as e:
-            try_create_github_issue(e, token, "unknown")
+            try_create_github_issue(e, lambda: cfg.github_auth, _es_version(e))
             raise
 
 
-app = CustomTyper(rich_markup_mode="rich")
-setattr(cat_app, "root", app)
-setattr(cluster_app, "root", app)
-setattr(config_app, "root", app)
-setattr(task_app, "root", app)
-setattr(index_app, "root", app)
-setattr(reindex_app, "root", app)
-setattr(troubleshoot_app, "root", app)
-setattr(snapshot_app, "root", app)
-setattr(shell_app, "root", app)
-setattr(exec_app, "root", app)
+def _es_version(e: Exception) -> str:
+    """Version of the elasticsearch client library that raised ``e``."""
+    # Only ever imported by the commands talking to a cluster, don't pull the
+    # clients in just to report an unrelated error.
+    for name in ("elasticsearch8", "elasticsearch9"):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        exceptions = tuple(
+            getattr(module.exceptions, s) for s in module.exceptions.__all__
+        )
+        if isinstance(e, exceptions):
+            return ".".join(str(part) for part in module.__version__)
+    return "unknown"
+
+
+class LazyCommand(NamedTuple):
+    module: str
+    help: str
+    # Whether a valid current context is needed to run the command
+    needs_context: bool = True
+
+
+# Sub-commands are only imported when dispatched: most of them pull in heavy
+# dependencies (elasticsearch clients, kubernetes, IPython, ...), and startup
+# time matters, as shell completion runs it on every TAB press.
+COMMANDS: dict[str, LazyCommand] = {
+    "agent": LazyCommand(
+        "esctl.commands.agent",
+        "Manage the esctl agent, which keeps connections warm across runs",
+        needs_context=False,
+    ),
+    "cat": LazyCommand(
+        "esctl.commands.cat",
+        "Compact and aligned text (CAT) APIs for Elasticsearch",
+    ),
+    "capture": LazyCommand(
+        "esctl.commands.capture",
+        "Capture the diagnostic APIs of a cluster into a bundle, for --bundle",
+    ),
+    "cluster": LazyCommand(
+        "esctl.commands.cluster", "Elasticsearch Cluster management APIs"
+    ),
+    "config": LazyCommand(
+        "esctl.commands.config", "Manage esctl configuration", needs_context=False
+    ),
+    "task": LazyCommand("esctl.commands.tasks", "Elasticsearch Task management APIs"),
+    "index": LazyCommand("esctl.commands.index", "Elasticsearch Index management APIs"),
+    "reindex": LazyCommand(
+        "esctl.commands.reindex", "Reindex from one index to another"
+    ),
+    "troubleshoot": LazyCommand(
+        "esctl.commands.troubleshoot", "Troubleshoot Elasticsearch cluster issues"
+    ),
+    "snapshot": LazyCommand(
+        "esctl.commands.snapshot", "Elasticsearch Snapshot and Restore APIs"
+    ),
+    "shell": LazyCommand(
+        "esctl.commands.shell",
+        "Start an interactive shell to interact with your cluster",
+    ),
+    "exec": LazyCommand(
+        "esctl.commands._exec",
+        "Execute a python script to interact with your cluster",
+    ),
+}
+
+
+def load_command(name: str) -> typer.Typer:
+    """Import the sub-app of a command, and attach it to the root app."""
+    sub_app: typer.Typer = importlib.import_module(COMMANDS[name].module).app
+    setattr(sub_app, "root", app)
+    return sub_app
+
+
+class LazyGroup(TyperGroup):
+    def list_commands(self, ctx) -> list[str]:
+        return [*COMMANDS, *super().list_commands(ctx)]
+
+    def get_command(self, ctx, cmd_name: str):
+        if cmd_name in COMMANDS and cmd_name not in self.commands:
+            command = COMMANDS[cmd_name]
+            # Build the click group the same way add_typer on the root app
+            # would have.
+            wrapper = typer.Typer()
+            wrapper.add_typer(load_command(cmd_name), name=cmd_name, help=command.help)
+            group = typer.main.get_group(wrapper)
+            cmd = group.commands[cmd_name]  # type: ignore[attr-defined]
+            if command.needs_context:
+                # Passed as the callback of add_typer, the guard would replace
+                # the callback of the sub-app, e.g. the whole of `esctl exec`.
+                cmd.invoke = guarded(cmd.invoke)
+            self.commands[cmd_name] = cmd
+        return super().get_command(ctx, cmd_name)
 
+    def shell_complete(self, ctx, incomplete: str) -> list[CompletionItem]:
+        # Complete command names without importing them.
+        results = [
+            CompletionItem(name, help=command.help)
+            for name, command in COMMANDS.items()
+            if name.startswith(incomplete)
+        ]
+        results.extend(
+            CompletionItem(name, help=command.get_short_help_str())
+            for name, command in self.commands.items()
+            if name not in COMMANDS
+            and name.startswith(incomplete)
+            and not command.hidden
+        )
+        results.extend(super(TyperGroup, self).shell_complete(ctx, incomplete))
+        return results
+
+
+app = CustomTyper(rich_markup_mode="rich", cls=LazyGroup)
+
+
+def guarded(invoke: Callable[[typer.Context], Any]) -> Callable[[typer.Context], Any]:
+    """Run ``no_context_guard_callback`` before invoking a command."""
+
+    def wrapper(ctx: typer.Context) -> Any:
+        no_context_guard_callback(ctx)
+        return invoke(ctx)
 
-def no_context_guard_callback():
+    return wrapper
+
+
+def no_context_guard_callback(ctx: typer.Context):
+    if ctx.obj and ctx.obj.get("bundle") is not None:
+        return  # Served from the bundle, whatever the context
     if cfg.current_context is None or cfg.current_context == "":
         print(
             "[red]Error:[/] No context set. Please set a context with --context first."
@@ -87,66 +179,6 @@ def no_context_guard_callback():
     return
 
 
-app.add_typer(
-    cat_app,
-    name="cat",
-    help="Compact and aligned text (CAT) APIs for Elasticsearch",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    cluster_app,
-    name="cluster",
-    help="Elasticsearch Cluster management APIs",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    config_app,
-    name="config",
-    help="Manage esctl configuration",
-)
-app.add_typer(
-    task_app,
-    name="task",
-    help="Elasticsearch Task management APIs",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    index_app,
-    name="index",
-    help="Elasticsearch Index management APIs",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    reindex_app,
-    name="reindex",
-    help="Reindex from one index to another",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    troubleshoot_app,
-    name="troubleshoot",
-    help="Troubleshoot Elasticsearch cluster issues",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    snapshot_app,
-    name="snapshot",
-    help="Elasticsearch Snapshot and Restore APIs",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    shell_app,
-    name="shell",
-    help="Start an interactive shell to interact with your cluster",
-    callback=no_context_guard_callback,
-)
-app.add_typer(
-    exec_app,
-    name="exec",
-    help="Execute a python script to interact with your cluster",
-    callback=no_context_guard_callback,
-)
-
 cfg = Config.load()
 
 
@@ -167,10 +199,12 @@ for alias_name, alias in cfg.aliases.items():
 
 
 def exit_handler(conf: ESConfigType | None):
-    if conf is None:
-        return
-    if conf.type == "gce":
-        conf.stop_ssh_tunnel()
+    # Closes every client, cache connection and tunnel opened during the run,
+    # whichever context they belong to. Nothing was opened if the transport
+    # was never imported.
+    session = sys.modules.get("esctl.transport.session")
+    if session is not None:
+        session.sessions.close()
 
 
 @app.callback(invoke_without_command=True)
@@ -214,6 +248,17 @@ def callback(
             help="Enable or disable HTTP response caching. Caching is enabled by default.",
         ),
     ] = True,
+    bundle: Annotated[
+        Path | None,
+        typer.Option(
+            "--bundle",
+            exists=True,
+            dir_okay=False,
+            envvar="ESCTL_BUNDLE",
+            help="Serve requests from a bundle made by `esctl capture`, "
+            "instead of the cluster.",
+        ),
+    ] = None,
     version: Annotated[
         bool,
         typer.Option(
@@ -230,9 +275,13 @@ def callback(
     if version:
         from esctl import __version__ as esctl_version
         from kubernetes import __version__ as k8s_version
-        import sys
 
-        info = conf.client.info() if conf is not None else {}
+        info = {}
+        if bundle is not None:
+            cfg.bundle = str(bundle)
+            info = cfg.client.info()
+        elif conf is not None:
+            info = conf.client.info()
         if isinstance(info, dict):
             es_version = info.get("version", {}).get("number", "unknown")
         else:
@@ -263,6 +312,7 @@ def callback(
     ctx.obj = {
         "config": cfg,
         "cache_enabled": bool(cache),
+        "bundle": str(bundle) if bundle is not None else None,
         "context": conf,
         "verbosity": verbose,
         "logger": logger,
@@ -278,6 +328,5 @@ if __name__ == "__main__":
     # except (typer.Exit, typer.Abort, SystemExit, KeyboardInterrupt):
     #     raise
     except Exception as e:
-        token = cfg.github_auth
-        try_create_github_issue(e, token, "unknown")
+        try_create_github_issue(e, lambda: cfg.github_auth, "unknown")
         raise
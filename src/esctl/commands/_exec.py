@@ -7,7 +7,7 @@ from rich import print
 from pathlib import Path
 import json
 
-from esctl.transport import Cache
+from esctl.transport import sessions
 from esctl.config import Config
 
 
@@ -27,11 +27,13 @@ def execute(
         ),
     ] = "-",
 ):
-    conf = Config.load()
-    context_name = conf.get_current_context_name(ctx)
-    if conf.contexts[context_name].type == "gce":
-        conf.contexts[context_name].start_ssh_tunnel()  # type: ignore
-    client = conf.contexts[context_name].client
+    conf = Config.from_context(ctx)
+    client = conf.client
+    if conf.bundle is not None:
+        # Named after the bundle, which has no cache: it is never stale
+        context_name = Path(conf.bundle).name
+    else:
+        context_name = conf.get_current_context_name(ctx)
     yaml = YAML(typ="rt")
     yaml.indent(mapping=2, sequence=4, offset=2)
     context = {
@@ -39,7 +41,7 @@ def execute(
         "yaml": yaml,
         "json": json,
         "config": conf,
-        "cache": Cache(context_name),
+        "cache": sessions.cache(context_name) if conf.bundle is None else None,
     }
     source = ""
     if script == "-":
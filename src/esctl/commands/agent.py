@@ -0,0 +1,83 @@
+from datetime import timedelta
+import subprocess
+import sys
+import time
+from typing import Annotated
+
+from rich import print
+import typer
+
+from esctl.constants import ESCTL_AGENT_LOG_PATH, ESCTL_AGENT_SOCKET_PATH
+from esctl.transport import agent
+from esctl.utils import strfdelta
+
+
+app = typer.Typer(rich_markup_mode="rich")
+
+
+def _is_running() -> bool:
+    agent.agent_available.cache_clear()
+    return agent.agent_available()
+
+
+@app.command(help="Start the esctl agent, keeping connections warm across runs")
+def start(
+    foreground: Annotated[
+        bool,
+        typer.Option(
+            "--foreground/--background",
+            help="Run the agent in this process instead of detaching it",
+        ),
+    ] = False,
+    timeout: Annotated[
+        float,
+        typer.Option(help="Seconds to wait for a background agent to come up"),
+    ] = 10.0,
+):
+    if _is_running():
+        print(f"[yellow]esctl agent already running on {ESCTL_AGENT_SOCKET_PATH}[/]")
+        return
+    if foreground:
+        agent.serve()
+        return
+    with ESCTL_AGENT_LOG_PATH.open("ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "esctl.cli", "agent", "start", "--foreground"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while time.monotonic() < deadline:
+        if _is_running():
+            print(f"[green]esctl agent listening on {ESCTL_AGENT_SOCKET_PATH}[/]")
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    print(f"[red]esctl agent failed to start, see {ESCTL_AGENT_LOG_PATH}[/]")
+    raise typer.Exit(code=1)
+
+
+@app.command(help="Stop the esctl agent")
+def stop():
+    if not _is_running():
+        print("esctl agent is not running")
+        return
+    agent.call({"op": "stop"})
+    print("[green]esctl agent stopped[/]")
+
+
+@app.command(help="Show whether the esctl agent is running, and its warm contexts")
+def status():
+    if not _is_running():
+        print("esctl agent is not running")
+        raise typer.Exit(code=1)
+    reply, _ = agent.call({"op": "status"})
+    print(f"esctl agent running (pid [b]{reply['pid']}[/])")
+    print(f"  socket : {ESCTL_AGENT_SOCKET_PATH}")
+    print(f"  uptime : {strfdelta(timedelta(seconds=reply['uptime']))}")
+    for context in reply["contexts"]:
+        cache = "" if context["cache_enabled"] else " (no cache)"
+        print(f"  - {context['context']}{cache}")
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Annotated
+
+from rich import print
+import typer
+
+from esctl.config import Config
+
+
+app = typer.Typer(rich_markup_mode="rich")
+
+
+@app.callback(
+    help="""Capture the diagnostic APIs of a cluster into a bundle.
+
+    Cat APIs, cluster health, settings, state metadata, pending tasks, tasks and node
+    stats are fetched once, in parallel, along with the allocation explanation of
+    unassigned shards. Commands run with [b]--bundle[/] are then served from it,
+    without sending anything to the cluster.
+    """,
+    invoke_without_command=True,
+)
+def capture(
+    ctx: typer.Context,
+    output: Annotated[
+        Path | None,
+        typer.Argument(
+            dir_okay=False,
+            help="Where to write the bundle: .tar.zst, .tar.gz or .tar. "
+            "Defaults to esctl-<context>-<time>.tar.zst in the current directory.",
+        ),
+    ] = None,
+    max_explanations: Annotated[
+        int,
+        typer.Option(
+            "--max-explanations",
+            min=0,
+            help="How many unassigned shards to explain the allocation of.",
+        ),
+    ] = 20,
+):
+    from esctl.transport.bundle import capture as capture_bundle
+    from esctl.transport.compression import zstd_compress
+
+    config = Config.from_context(ctx)
+    if config.bundle is not None:
+        print("[red]Error:[/] Cannot capture from a bundle.")
+        raise typer.Exit(code=1)
+    # A bundle is a snapshot of the cluster as it is now, not of the cache
+    config.cache_enabled = False
+    context_name = config.get_current_context_name(ctx)
+    captured_at = datetime.now(timezone.utc)
+    if output is None:
+        suffix = ".tar.zst" if zstd_compress is not None else ".tar.gz"
+        output = Path(f"esctl-{context_name}-{captured_at:%Y%m%dT%H%M%SZ}{suffix}")
+    bundle = capture_bundle(
+        config.client,
+        {"context": context_name, "captured_at": captured_at.isoformat()},
+        max_explanations=max_explanations,
+    )
+    try:
+        size = bundle.save(output)
+    except ValueError as e:
+        print(f"[red]Error:[/] {e}")
+        raise typer.Exit(code=1)
+    print(
+        f"Captured {len(bundle.responses)} responses into [b]{output}[/] "
+        f"({size / 1024:.0f} KiB)"
+    )
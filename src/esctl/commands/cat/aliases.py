@@ -7,6 +7,9 @@ from esctl.config import Config
 from esctl.options import (
     OutputOption,
     Result,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -116,17 +119,21 @@ def aliases(
             help="Columns to include in the response",
         ),
     ] = None,
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "h": ",".join(header) if header else None,
         "format": "json",
         "v": True,
         "name": ",".join(name) if name else None,
     }
     client = Config.from_context(ctx).client
-    response = client.cat.aliases(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.aliases(**params), where, group_by, agg, sort
+    )
     if header is None:
         result.exclude_headers.update(set(["epoch", "timestamp"]))
     result.print(
@@ -7,6 +7,9 @@ from esctl.options import (
     OutputOption,
     Result,
     BytesOption,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 
@@ -94,9 +97,12 @@ def allocation(
         ),
     ] = False,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "h": ",".join(header) if header else None,
         "bytes": bytes,
         "local": local_only,
@@ -104,8 +110,9 @@ def allocation(
         "v": True,
     }
     client = Config.from_context(ctx).client
-    response = client.cat.allocation(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.allocation(**params), where, group_by, agg, sort
+    )
     result.print(
         output=output,
         formatter=formatter,
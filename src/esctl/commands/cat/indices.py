@@ -10,6 +10,9 @@ from esctl.options import (
     TimeOption,
     OutputOption,
     Result,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -215,16 +218,20 @@ def indices(
     time: TimeOption | None = None,
     bytes: BytesOption | None = None,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     client = Config.from_context(ctx).client
     params = {
         "h": ",".join(header) if header else None,
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "time": time,
         "bytes": bytes,
         "index": index,
         "format": "json",
     }
-    response = client.cat.indices(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.indices(**params), where, group_by, agg, sort
+    )
     result.print(output, formatter=formatter)
@@ -8,6 +8,9 @@ from esctl.options import (
     OutputOption,
     Result,
     TimeOption,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -179,10 +182,13 @@ def nodes(
         ),
     ] = False,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
         "h": ",".join(header) if header else None,
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "time": time,
         "full_id": full_id,
         "bytes": bytes,
@@ -190,6 +196,7 @@ def nodes(
         "format": "json",
     }
     client = Config.from_context(ctx).client
-    response = client.cat.nodes(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.nodes(**params), where, group_by, agg, sort
+    )
     result.print(output)
@@ -11,6 +11,9 @@ from esctl.options import (
     Result,
     IndexOption,
     TimeOption,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -111,10 +114,13 @@ def recovery(
         ),
     ] = False,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
         "h": ",".join(header) if header else None,
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "time": time,
         "active_only": active_only,
         "bytes": bytes,
@@ -124,6 +130,7 @@ def recovery(
     }
 
     client = Config.from_context(ctx).client
-    response = client.cat.recovery(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.recovery(**params), where, group_by, agg, sort
+    )
     result.print(output)
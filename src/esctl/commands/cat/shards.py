@@ -11,6 +11,9 @@ from esctl.options import (
     TimeOption,
     OutputOption,
     Result,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -163,16 +166,20 @@ def shards(
     time: TimeOption | None = None,
     bytes: BytesOption | None = None,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
         "h": header,
-        "s": sort,
+        "s": None if group_by or agg else sort,
         "time": time,
         "bytes": bytes,
         "index": index,
         "format": "json",
     }
     client = Config.from_context(ctx).client
-    response = client.cat.shards(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.shards(**params), where, group_by, agg, sort
+    )
     result.print(output=output, formatter=formatter)
@@ -11,6 +11,9 @@ from esctl.options import (
     TimeOption,
     OutputOption,
     Result,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -100,10 +103,13 @@ def tasks(
     time: TimeOption | None = None,
     parent_task_id: ParentTaskIdOption = None,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
         "h": header,
-        "s": sort,
+        "s": None if group_by or agg else sort,
         "time": time,
         "detailed": detailed,
         "nodes": nodes,
@@ -111,8 +117,9 @@ def tasks(
         "format": "json",
     }
     client = Config.from_context(ctx).client
-    response = client.cat.tasks(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.tasks(**params), where, group_by, agg, sort
+    )
     result.print(
         output=output,
         formatter=formatter,
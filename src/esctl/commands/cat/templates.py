@@ -6,6 +6,9 @@ from esctl.config import Config
 from esctl.options import (
     OutputOption,
     Result,
+    AggOption,
+    GroupByOption,
+    WhereOption,
 )
 
 app = typer.Typer(rich_markup_mode="rich")
@@ -65,13 +68,17 @@ def templates(
     ] = None,
     sort: SortOption | None = None,
     output: OutputOption = "table",
+    where: WhereOption = None,
+    group_by: GroupByOption = None,
+    agg: AggOption = None,
 ):
     params = {
         "h": ",".join(header) if header else None,
-        "s": ",".join(sort) if sort else None,
+        "s": None if group_by or agg else sort,
         "format": "json",
     }
     client = Config.from_context(ctx).client
-    response = client.cat.templates(**params)
-    result: Result = ctx.obj["selector"](response)
+    result: Result = ctx.obj["selector"](
+        client.cat.templates(**params), where, group_by, agg, sort
+    )
     result.print(output)
@@ -739,7 +739,7 @@ def validate_settings_value(
 def print_settings(
     output: OutputOption, settings: dict[str, Any], result: Result
 ) -> None:
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
         return
     # If output is table, csv, tsv, let's make it pretty
@@ -117,7 +117,7 @@ def gce(
         typer.Option(
             "--target-port",
             "-p",
-            help="Local port to use for the SSH tunnel to the ES node",
+            help="Preferred local port for the SSH tunnel to the ES node",
         ),
     ] = 9200,
     username: Annotated[
@@ -1,11 +1,17 @@
+from collections import defaultdict
 from http import HTTPMethod
+from types import SimpleNamespace
 from typing import Annotated
 import orjson
 import typer
 
-from esctl.transport import Cache
+from esctl.transport import sessions
+from esctl.transport.cache import compact as compact_cache
+from esctl.transport.stats import COUNTERS, endpoint_pattern
+from esctl.transport.ttl import ttl_policy
 from esctl.config import get_root_ctx, ESConfigType
 from esctl.constants import ESCTL_TTL_CONFIG_PATH
+from esctl.options import OutputOption, Result
 
 app = typer.Typer(rich_markup_mode="rich")
 
@@ -14,16 +20,32 @@ app = typer.Typer(rich_markup_mode="rich")
 def purge(ctx: typer.Context):
     root_ctx: typer.Context = get_root_ctx(ctx)
     conf: ESConfigType = root_ctx.obj["context"]
-    cache = Cache(conf.name)
+    cache = sessions.cache(conf.name)
     cache.clear()
     typer.echo(f"Cache purged for context {root_ctx.obj['config'].current_context}")
 
 
-@app.command(help="Set TTL for a given ES API call")
+@app.command(
+    help="Drop expired and least recently used responses beyond the size limits"
+)
+def compact(ctx: typer.Context):
+    root_ctx: typer.Context = get_root_ctx(ctx)
+    conf: ESConfigType = root_ctx.obj["context"]
+    cache = sessions.cache(conf.name)
+    cache.flush_touches()
+    compact_cache(cache.conn, force=True)
+    typer.echo("Cache compacted")
+
+
+@app.command(
+    help="Set the TTL for a given ES API call, or show the rule it resolves to"
+)
 def ttl(
     method: HTTPMethod = typer.Argument(help="HTTP method, e.g. GET, HEAD"),
     target: str = typer.Argument(help="API endpoint, e.g. /_cluster/health"),
-    ttl: int = typer.Argument(help="TTL in seconds, e.g. 300 for 5 minutes"),
+    ttl: int | None = typer.Argument(
+        None, help="TTL in seconds, e.g. 300 for 5 minutes. Omit to show the TTL"
+    ),
     match_all: Annotated[
         bool,
         typer.Option(
@@ -31,15 +53,123 @@ def ttl(
             help="Should the pattern match query params and fragments as well",
         ),
     ] = False,
+    max_stale: Annotated[
+        int,
+        typer.Option(
+            "--max-stale",
+            help="Seconds past the TTL during which the cached response is still "
+            "served, while it is refreshed in the background",
+        ),
+    ] = 0,
 ):
-    ttls = orjson.loads(ESCTL_TTL_CONFIG_PATH.read_bytes() or b"{}")
+    if ttl is None:
+        rule = ttl_policy().resolve(method, target)
+        match rule.source:
+            case "default":
+                typer.echo(f"{method} {target}: {rule.ttl} seconds (default)")
+            case source:
+                typer.echo(
+                    f"{method} {target}: {rule.ttl} seconds "
+                    f"({source} rule '{rule.pattern}')"
+                )
+        if rule.max_stale:
+            typer.echo(f"Served stale for up to {rule.max_stale} more seconds")
+        return
+    ttls = {}
+    if ESCTL_TTL_CONFIG_PATH.exists():
+        ttls = orjson.loads(ESCTL_TTL_CONFIG_PATH.read_bytes() or b"{}")
     qp_pattern = r"(\?.*)?(#.*)?" if match_all else ""
     pattern = rf"^{method.upper()} {target}{qp_pattern}$"
     original = ttls.get(pattern)
+    if isinstance(original, dict):
+        original = original["ttl"]
     if original is not None:
         typer.echo(
             f"Overriding existing TTL of {original} seconds for pattern '{pattern}'"
         )
-    ttls[pattern] = ttl
+    ttls[pattern] = {"ttl": ttl, "max_stale": max_stale} if max_stale else ttl
     ESCTL_TTL_CONFIG_PATH.write_bytes(orjson.dumps(ttls, option=orjson.OPT_INDENT_2))
     typer.echo(f"Set TTL for pattern '{pattern}' to {ttl} seconds")
+    if max_stale:
+        typer.echo(f"Served stale for up to {max_stale} more seconds")
+
+
+COLUMNS = {
+    "endpoint": "Endpoint",
+    "entries": "Entries",
+    "stored_bytes": "Stored (bytes)",
+    "hits": "Hits",
+    "misses": "Misses",
+    "expirations": "Expirations",
+    "hit_rate": "Hit rate",
+    "l1_hit_rate": "From memory",
+    "bytes_served": "Served (bytes)",
+    "latency_saved": "Latency saved (s)",
+}
+
+
+def _hit_rate(hits: float, misses: float) -> float:
+    return round(100 * hits / (hits + misses), 1) if hits + misses else 0.0
+
+
+def formatter(column: str, value: str) -> str:
+    match column:
+        case "hit_rate" | "l1_hit_rate":
+            color = "green" if float(value) >= 50 else "yellow"
+            return f"[{color}]{value}%[/]"
+        case "endpoint" if value == "TOTAL":
+            return f"[b]{value}[/]"
+        case _:
+            return value
+
+
+@app.command(help="Show hit rates and savings of the cache for the current context")
+def stats(
+    ctx: typer.Context,
+    output: OutputOption = "table",
+    reset: Annotated[
+        bool,
+        typer.Option("--reset", help="Reset the statistics after showing them"),
+    ] = False,
+):
+    root_ctx: typer.Context = get_root_ctx(ctx)
+    conf: ESConfigType = root_ctx.obj["context"]
+    cache = sessions.cache(conf.name)
+    counters = cache.stats.rows()
+    stored: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+    for method, target, size in cache.entries():
+        entry = stored[endpoint_pattern(method, target)]
+        entry[0] += 1
+        entry[1] += size
+
+    rows = []
+    for endpoint in sorted(counters.keys() | stored.keys()):
+        row = {
+            "endpoint": endpoint,
+            **counters.get(endpoint, dict.fromkeys(COUNTERS, 0)),
+        }
+        row["entries"], row["stored_bytes"] = stored[endpoint]
+        rows.append(row)
+    total = {
+        "endpoint": "TOTAL",
+        **{
+            name: sum(row[name] for row in rows)
+            for name in (*COUNTERS, "entries", "stored_bytes")
+        },
+    }
+    rows.append(total)
+    for row in rows:
+        row["hit_rate"] = _hit_rate(row["hits"], row["misses"])
+        # Share of the hits served from memory rather than cache.db
+        row["l1_hit_rate"] = _hit_rate(row["l1_hits"], row["hits"] - row["l1_hits"])
+        row["latency_saved"] = round(row["latency_saved"], 3)
+
+    result: Result = ctx.obj["selector"](
+        SimpleNamespace(
+            body=[{column: row[column] for column in COLUMNS} for row in rows]
+        )
+    )
+    result.header_names = COLUMNS
+    result.print(output, formatter=formatter)
+    if reset:
+        cache.stats.reset()
@@ -72,7 +72,7 @@ def get(
         include_defaults=with_defaults,
     )
     result: Result = ctx.obj["selector"](response)
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
         return
     # For table or text output, we need to iterate over the response to get the settings for each index.
@@ -103,7 +103,7 @@ def update(
     settings = {name: value}
     response = client.indices.put_settings(index=index, settings=settings)
     result: Result = ctx.obj["selector"](response)
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
     else:
         result.print("json")  # Default to json for structured output?
@@ -54,7 +54,7 @@ def reindex(
         require_alias=require_alias,
     )
     result: Result = ctx.obj["selector"](response)
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
     else:
         result.print("json")
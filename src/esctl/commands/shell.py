@@ -11,7 +11,7 @@ from pathlib import Path
 import json
 import time
 
-from esctl.transport import Cache
+from esctl.transport import sessions
 from esctl.config import Config as EsctlConfig
 from esctl.constants import ESCTL_HOME
 
@@ -63,11 +63,13 @@ def rich_to_ansi(markup: str) -> str:
 def shell(
     ctx: typer.Context,
 ):
-    conf = EsctlConfig.load()
-    context_name = conf.get_current_context_name(ctx)
-    if conf.contexts[context_name].type == "gce":
-        conf.contexts[context_name].start_ssh_tunnel()  # type: ignore
-    client = conf.contexts[context_name].client
+    conf = EsctlConfig.from_context(ctx)
+    client = conf.client
+    if conf.bundle is not None:
+        # Named after the bundle, which has no cache: it is never stale
+        context_name = Path(conf.bundle).name
+    else:
+        context_name = conf.get_current_context_name(ctx)
     ipython_dir = ESCTL_HOME / "ipython" / context_name
     if not ipython_dir.exists():
         ipython_dir.mkdir(parents=True, exist_ok=True)
@@ -81,7 +83,7 @@ def shell(
         "yaml": yaml,
         "json": json,
         "config": conf,
-        "cache": Cache(context_name),
+        "cache": sessions.cache(context_name) if conf.bundle is None else None,
         "Path": Path,
         "cwd": working_directory,
         "time": time,
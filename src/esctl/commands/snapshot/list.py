@@ -87,7 +87,7 @@ def _list(
     client = Config.from_context(ctx).client
     snapshots = client.snapshot.get(repository=repository, snapshot="*")
     result: Result = ctx.obj["selector"](snapshots)
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
         return
     result.value = [
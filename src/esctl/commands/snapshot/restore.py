@@ -190,7 +190,7 @@ def restore(
         )
     )
     result: Result = ctx.obj["selector"](response)
-    if output == "json" or output == "yaml":
+    if output in ("json", "ndjson", "yaml"):
         result.print(output)
         return
     else:
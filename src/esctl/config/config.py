@@ -1,11 +1,12 @@
 import errno
 import functools
 import os
+from pathlib import Path
 import shlex
 import shutil
 import subprocess
 import sys
-from typing import Annotated, Any, Self
+from typing import TYPE_CHECKING, Annotated, Any, Self
 
 from pydantic import BaseModel, Field, ValidationError, model_validator
 from rich import print
@@ -16,10 +17,21 @@ from esctl.constants import ESCTL_CONFIG_PATH
 from esctl.config.models.http import HTTPESConfig
 from esctl.config.models.kube import KubeESConfig
 from esctl.config.models.gce import GCEESConfig
-from esctl.transport import Elasticsearch
 
 from .utils import get_root_ctx
 
+if TYPE_CHECKING:
+    from esctl.transport import Elasticsearch
+
+
+@functools.lru_cache()
+def _run_github_auth_command(command: str) -> str | None:
+    try:
+        return subprocess.check_output(shlex.split(command)).decode("utf-8").strip()
+    except subprocess.CalledProcessError as e:
+        print(f"[red bold]ERROR:[/] Failed to get GitHub auth token: {e}")
+        return None
+
 
 class Config(BaseModel):
     contexts: dict[
@@ -35,6 +47,8 @@ class Config(BaseModel):
         exclude=True, default=("http", "kubernetes", "gce")
     )
     cache_enabled: bool = Field(default=False, exclude=True)
+    # Diagnostic bundle to serve requests from instead of the current context
+    bundle: str | None = Field(default=None, exclude=True)
 
     def __setattr__(self, name: str, value: Any):
         super().__setattr__(name, value)
@@ -42,16 +56,9 @@ class Config(BaseModel):
 
     @property
     def github_auth(self) -> str | None:
+        """GitHub token, from running ``github_auth_command`` (once per process)."""
         if self.github_auth_command:
-            try:
-                return (
-                    subprocess.check_output(shlex.split(self.github_auth_command))
-                    .decode("utf-8")
-                    .strip()
-                )
-            except subprocess.CalledProcessError as e:
-                print(f"[red bold]ERROR:[/] Failed to get GitHub auth token: {e}")
-                return None
+            return _run_github_auth_command(self.github_auth_command)
         return None
 
     @model_validator(mode="before")
@@ -152,21 +159,27 @@ class Config(BaseModel):
         root_ctx.obj["config"].cache_enabled = bool(
             root_ctx.obj.get("cache_enabled", False)
         )
+        root_ctx.obj["config"].bundle = root_ctx.obj.get("bundle")
         return root_ctx.obj["config"]
 
     @property
-    def client(self) -> Elasticsearch:
+    def client(self) -> "Elasticsearch":
+        if self.bundle is not None:
+            from esctl.transport import BundleClientFactory, sessions
+
+            path = Path(self.bundle)
+            return sessions.client(
+                f"bundle:{path.resolve()}", False, lambda: BundleClientFactory(path)
+            )
         es_config = self.contexts.get(self.current_context)
         if es_config is None:
             raise ValueError(f"Current context '{self.current_context}' not found")
-        if es_config.type == "gce":
-            es_config.start_ssh_tunnel()
         es_config.cache_enabled = bool(self.cache_enabled)
         return es_config.client
 
     def get_current_context_name(self, ctx: typer.Context | None = None) -> str:
         if ctx is not None:
             root_ctx = get_root_ctx(ctx)
-            if "context" in root_ctx.obj:
+            if root_ctx.obj.get("context") is not None:
                 return root_ctx.obj["context"].name
         return self.current_context
@@ -1,13 +1,33 @@
-from esctl.transport import Elasticsearch
+from typing import TYPE_CHECKING
+
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from esctl.transport import Elasticsearch
+
 
 class ESConfig(BaseModel):
     name: str = Field(exclude=True)
     cache_enabled: bool = Field(exclude=True, default=False)
 
     @property
-    def client(self) -> Elasticsearch:
+    def client(self) -> "Elasticsearch":
+        """The client for this context, shared for the lifetime of the process.
+
+        When the esctl agent is running, requests are forwarded to it instead.
+        """
+        from esctl.transport import sessions
+        from esctl.transport.agent import AgentClientFactory, agent_available
+
+        if agent_available():
+            return sessions.client(
+                self.name,
+                self.cache_enabled,
+                lambda: AgentClientFactory(self.name, self.cache_enabled),
+            )
+        return sessions.client(self.name, self.cache_enabled, self._create_client)
+
+    def _create_client(self) -> "Elasticsearch":
         raise NotImplementedError("Subclasses must implement this method")
 
     @property
@@ -1,15 +1,9 @@
-import os
-import signal
-import socket
-import subprocess
-import time
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
 from .base import ESConfig
-from esctl.transport import Elasticsearch, HTTPClientFactory
 
-
-_GCE_SSH_PROCESS = None
+if TYPE_CHECKING:
+    from esctl.transport import Elasticsearch
 
 
 class GCEESConfig(ESConfig):
@@ -20,12 +14,9 @@ class GCEESConfig(ESConfig):
     username: str | None = None
     password: str | None = None
     port: int = 9200
+    # Preferred local port of the tunnel, another one is used if it is taken
     target_port: int = 9200
 
-    @property
-    def url(self) -> str:
-        return f"http://localhost:{self.target_port}"
-
     @property
     def basic_auth(self) -> tuple[str, str] | None:
         if self.username is None or self.password is None:
@@ -38,54 +29,51 @@ class GCEESConfig(ESConfig):
             return ""
         return self.password[:4] + "*" * (len(self.password) - 4)
 
-    def _wait_port(self, host: str, port: int, timeout: float = 10.0) -> bool:
-        """Wait until TCP port is connectable or timeout."""
-        deadline = time.time() + timeout
-        while time.time() < deadline:
-            with socket.socket() as s:
-                s.settimeout(0.5)
-                try:
-                    s.connect((host, port))
-                    return True
-                except OSError:
-                    time.sleep(0.01)
-        return False
+    def _tunnel_command(self, local_port: int) -> list[str]:
+        return [
+            "gcloud",
+            "compute",
+            "ssh",
+            f"--ssh-flag=-N -L {local_port}:localhost:{self.port}",
+            "--ssh-flag=-o ExitOnForwardFailure=yes",
+            # Exit, rather than linger, once the connection is gone
+            "--ssh-flag=-o ServerAliveInterval=30",
+            f"--project={self.project_id}",
+            f"--zone={self.zone}",
+            self.vm_name,
+        ]
 
-    def start_ssh_tunnel(self) -> None:
-        global _GCE_SSH_PROCESS
-        if _GCE_SSH_PROCESS is not None and _GCE_SSH_PROCESS.poll() is None:
-            return  # Tunnel already running
-        process = subprocess.Popen(
-            [
-                "gcloud",
-                "compute",
-                "ssh",
-                f"--ssh-flag=-N -L {self.port}:localhost:{self.target_port}",
-                f"--project={self.project_id}",
-                f"--zone={self.zone}",
-                self.vm_name,
-            ],
-            stderr=subprocess.DEVNULL,
-            stdout=subprocess.DEVNULL,
-        )
+    def start_ssh_tunnel(self) -> int:
+        """Return the local port of the SSH tunnel to the instance.
+
+        The tunnel is shared with other esctl invocations, and kept open until
+        it has been idle for a while.
+        """
+        from esctl.transport.tunnel import open_tunnel
 
-        _GCE_SSH_PROCESS = process
-        self._wait_port("localhost", self.target_port, timeout=10.0)
-        return
+        return open_tunnel(
+            self.name,
+            f"{self.project_id}/{self.zone}/{self.vm_name}:{self.port}",
+            self._tunnel_command,
+            preferred_port=self.target_port,
+        )
 
     def stop_ssh_tunnel(self) -> None:
-        global _GCE_SSH_PROCESS
-        if _GCE_SSH_PROCESS is not None:
-            os.killpg(os.getpgid(_GCE_SSH_PROCESS.pid), signal.SIGKILL)
-            _GCE_SSH_PROCESS.wait()
-            _GCE_SSH_PROCESS = None
+        from esctl.transport.tunnel import close_tunnel
 
-    @property
-    def client(self) -> Elasticsearch:
+        close_tunnel(self.name)
+
+    def _create_client(self) -> "Elasticsearch":
+        from esctl.transport import HTTPClientFactory, sessions
+        from esctl.transport.tunnel import touch_tunnel
+
+        local_port = self.start_ssh_tunnel()
+        # Idle time counts from the end of the last command using the tunnel.
+        sessions.on_close(lambda: touch_tunnel(self.name))
         return HTTPClientFactory(
             self.name,
             self.cache_enabled,
-            self.url,
+            f"http://localhost:{local_port}",
             self.username,
             self.password,
         )
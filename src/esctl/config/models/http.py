@@ -1,9 +1,10 @@
-from typing import Literal
-
-from esctl.transport import Elasticsearch, HTTPClientFactory
+from typing import TYPE_CHECKING, Literal
 
 from .base import ESConfig
 
+if TYPE_CHECKING:
+    from esctl.transport import Elasticsearch
+
 
 class HTTPESConfig(ESConfig):
     type: Literal["http"] = "http"
@@ -28,8 +29,9 @@ class HTTPESConfig(ESConfig):
             return ""
         return self.password[:4] + "*" * (len(self.password) - 4)
 
-    @property
-    def client(self) -> Elasticsearch:
+    def _create_client(self) -> "Elasticsearch":
+        from esctl.transport import HTTPClientFactory
+
         return HTTPClientFactory(
             self.name,
             self.cache_enabled,
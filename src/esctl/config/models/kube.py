@@ -1,9 +1,10 @@
-from typing import Literal
-
-from esctl.transport import Elasticsearch, KubeClientFactory
+from typing import TYPE_CHECKING, Literal
 
 from .base import ESConfig
 
+if TYPE_CHECKING:
+    from esctl.transport import Elasticsearch
+
 
 class KubeESConfig(ESConfig):
     type: Literal["kubernetes"] = "kubernetes"
@@ -17,8 +18,9 @@ class KubeESConfig(ESConfig):
     def censored_password(self) -> str:
         return "*********"
 
-    @property
-    def client(self) -> Elasticsearch:
+    def _create_client(self) -> "Elasticsearch":
+        from esctl.transport import KubeClientFactory
+
         if (
             self.kube_context is None
             or self.kube_namespace is None
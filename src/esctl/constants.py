@@ -18,6 +18,36 @@ ESCTL_HOME.mkdir(exist_ok=True, parents=True)
 ESCTL_CONFIG_PATH = ESCTL_HOME / "config.json"
 ESCTL_TTL_CONFIG_PATH = ESCTL_HOME / "ttl.json"
 ESCTL_CACHE_DB_PATH = ESCTL_HOME / "cache.db"
+ESCTL_AGENT_SOCKET_PATH = ESCTL_HOME / "agent.sock"
+ESCTL_AGENT_LOG_PATH = ESCTL_HOME / "agent.log"
+ESCTL_TUNNELS_DIR = ESCTL_HOME / "tunnels"
+
+# Seconds of inactivity after which an open kubernetes port-forward is pinged
+ESCTL_KUBE_KEEPALIVE_INTERVAL = float(os.getenv("ESCTL_KUBE_KEEPALIVE_INTERVAL", 30))
+# How long discovered ECK pods and credentials are reused for kubernetes contexts
+ESCTL_KUBE_DISCOVERY_TTL = int(os.getenv("ESCTL_KUBE_DISCOVERY_TTL", 300))
+# Seconds after which a GCE SSH tunnel nobody used is closed
+ESCTL_TUNNEL_IDLE_TIMEOUT = int(os.getenv("ESCTL_TUNNEL_IDLE_TIMEOUT", 1800))
+# Size above which the least recently used responses are evicted from the cache,
+# for each context and for all of them together, in MiB
+ESCTL_CACHE_CONTEXT_MAX_SIZE = int(os.getenv("ESCTL_CACHE_CONTEXT_MAX_SIZE", 256))
+ESCTL_CACHE_MAX_SIZE = int(os.getenv("ESCTL_CACHE_MAX_SIZE", 1024))
+# Seconds esctl waits for another process sending the same request to cache its
+# response, before sending it too
+ESCTL_CACHE_INFLIGHT_TIMEOUT = float(os.getenv("ESCTL_CACHE_INFLIGHT_TIMEOUT", 30))
+# Size of the in-process cache of responses in front of the database, in MiB
+ESCTL_CACHE_MEMORY_SIZE = int(os.getenv("ESCTL_CACHE_MEMORY_SIZE", 64))
+# Minimum number of seconds between two compactions of the cache database
+ESCTL_CACHE_COMPACTION_INTERVAL = int(os.getenv("ESCTL_CACHE_COMPACTION_INTERVAL", 600))
+# Seconds a process exiting without closing its clients (e.g. shell completion)
+# waits for the background refresh of the stale responses it served
+ESCTL_BACKGROUND_EXIT_TIMEOUT = float(os.getenv("ESCTL_BACKGROUND_EXIT_TIMEOUT", 2))
+# Seconds during which a process trusts the cluster state version it last checked
+ESCTL_CLUSTER_STATE_CHECK_INTERVAL = float(
+    os.getenv("ESCTL_CLUSTER_STATE_CHECK_INTERVAL", 10)
+)
+# How long a probed cluster identity (major version, UUID, node name) is trusted
+ESCTL_CLUSTER_IDENTITY_TTL = int(os.getenv("ESCTL_CLUSTER_IDENTITY_TTL", 86400))
 
 
 ISSUE_TEMPLATE = Template("""# An exception of type `$exception_type` occurred.
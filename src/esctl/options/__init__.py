@@ -1,4 +1,5 @@
 from .output import OutputOption, Result
+from .query import AggOption, GroupByOption, WhereOption
 from .time import TimeOption
 from .bytes import BytesOption
 from .index import IndexArgument, IndexOption
@@ -17,4 +18,7 @@ __all__ = (
     "ParentTaskIdOption",
     "TaskIdArgument",
     "ShardOption",
+    "WhereOption",
+    "GroupByOption",
+    "AggOption",
 )
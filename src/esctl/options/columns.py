@@ -0,0 +1,221 @@
+"""Column-oriented storage for tabular results, like the rows of the cat APIs.
+
+A list of 100k row dicts repeats every key on every row, and holds a string
+object per cell. ``Columns`` keeps one column per key instead: integers and
+floats in typed arrays, anything else dictionary-encoded, as indices into the
+list of the distinct values of the column. Cat APIs return a handful of
+distinct values for most of their columns (states, nodes, indices...), which
+then only get formatted once each.
+"""
+
+from array import array
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+
+class _Missing:
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+# Cell of a row which has no value for the column
+MISSING: Any = _Missing()
+
+
+def sort_key(value: Any) -> tuple[int, float, str]:
+    """Order missing values first, then numbers, then anything else as text."""
+    if value is None or value is MISSING:
+        return (0, 0.0, "")
+    try:
+        return (1, float(value), "")
+    except (TypeError, ValueError):
+        return (2, 0.0, str(value))
+
+
+class Column:
+    def __len__(self) -> int:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def __iter__(self) -> Iterator[Any]:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def map(self, function: Callable[[Any], Any]) -> Iterator[Any]:
+        """Iterate over ``function`` applied to the values of the column."""
+        return map(function, self)
+
+    def sort_keys(self, key: Callable[[Any], Any] = sort_key) -> Sequence[Any]:
+        """Keys ordering the rows by ``key`` of the values of the column."""
+        return list(self.map(key))
+
+    def take(self, indices: Sequence[int]) -> "Column":
+        """Return the column made of the values at ``indices``."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class ArrayColumn(Column):
+    """Integers or floats, in a typed array."""
+
+    def __init__(self, data: array):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.data)
+
+    def sort_keys(self, key: Callable[[Any], Any] = sort_key) -> Sequence[Any]:
+        # Numbers only, which any key orders as such
+        return self.data
+
+    def take(self, indices: Sequence[int]) -> "ArrayColumn":
+        data = self.data
+        return ArrayColumn(array(data.typecode, [data[i] for i in indices]))
+
+
+class DictColumn(Column):
+    """Values as indices into the list of the distinct values of the column."""
+
+    def __init__(self, codes: array, values: list[Any]):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[Any]:
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def map(self, function: Callable[[Any], Any]) -> Iterator[Any]:
+        # Once per distinct value, rather than once per row
+        mapped = [function(value) for value in self.values]
+        return (mapped[code] for code in self.codes)
+
+    def sort_keys(self, key: Callable[[Any], Any] = sort_key) -> Sequence[Any]:
+        order = sorted(range(len(self.values)), key=lambda i: key(self.values[i]))
+        ranks = array("I", bytes(4 * len(order)))
+        for rank, code in enumerate(order):
+            ranks[code] = rank
+        return array("I", [ranks[code] for code in self.codes])
+
+    def take(self, indices: Sequence[int]) -> "DictColumn":
+        codes = self.codes
+        return DictColumn(array("I", [codes[i] for i in indices]), self.values)
+
+
+class ObjectColumn(Column):
+    """Values which cannot be dictionary-encoded, e.g. lists or objects."""
+
+    def __init__(self, values: list[Any]):
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.values)
+
+    def take(self, indices: Sequence[int]) -> "ObjectColumn":
+        return ObjectColumn([self.values[i] for i in indices])
+
+
+def make_column(values: list[Any]) -> Column:
+    """Store ``values`` in the most compact column which can hold them."""
+    if values and all(type(value) is int for value in values):
+        try:
+            return ArrayColumn(array("q", values))
+        except OverflowError:
+            pass
+    if values and all(type(value) is float for value in values):
+        return ArrayColumn(array("d", values))
+    # Keyed by type too: 1, 1.0 and True are equal, and hash the same
+    index: dict[tuple[type, Any], int] = {}
+    distinct: list[Any] = []
+    codes = array("I")
+    try:
+        for value in values:
+            key = (type(value), value)
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(distinct)
+                distinct.append(value)
+            codes.append(code)
+    except TypeError:  # Unhashable
+        return ObjectColumn(values)
+    return DictColumn(codes, distinct)
+
+
+class Columns:
+    """Rows stored column by column, see the module docstring."""
+
+    def __init__(self, columns: dict[str, Column], length: int):
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict[str, Any]]) -> "Columns":
+        values: dict[str, list[Any]] = {}
+        length = 0
+        for row in rows:
+            for name, value in row.items():
+                column = values.get(name)
+                if column is None:
+                    column = values[name] = [MISSING] * length
+                column.append(value)
+            length += 1
+            for column in values.values():
+                if len(column) < length:
+                    column.append(MISSING)
+        return cls({name: make_column(v) for name, v in values.items()}, length)
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, name: str) -> Column:
+        return self.columns[name]
+
+    def iter_rows(self, names: Sequence[str]) -> Iterator[tuple[Any, ...]]:
+        """Iterate over the values of ``names`` in each row."""
+        if not names:
+            return iter([()] * self.length)
+        return zip(*(self.columns[name] for name in names))
+
+    def iter_dicts(self) -> Iterator[dict[str, Any]]:
+        """Iterate over the rows as dicts, as they were before being stored."""
+        names = self.names
+        for row in self.iter_rows(names):
+            yield {
+                name: value for name, value in zip(names, row) if value is not MISSING
+            }
+
+    def rows(self) -> list[dict[str, Any]]:
+        """Return the rows as dicts, as they were before being stored."""
+        return list(self.iter_dicts())
+
+    def take(self, indices: Sequence[int]) -> "Columns":
+        return Columns(
+            {name: column.take(indices) for name, column in self.columns.items()},
+            len(indices),
+        )
+
+    def sort(
+        self,
+        keys: Sequence[tuple[str, bool]],
+        key: Callable[[Any], Any] = sort_key,
+    ) -> "Columns":
+        """Sort the rows by ``(column, descending)`` keys, the first one first.
+
+        Values are compared by ``key``, computed once per distinct value of a
+        dictionary-encoded column. Unknown columns are skipped.
+        """
+        indices = list(range(self.length))
+        for name, descending in reversed(keys):
+            if name not in self.columns:
+                continue
+            sort_keys = self.columns[name].sort_keys(key)
+            indices.sort(key=sort_keys.__getitem__, reverse=descending)
+        return self.take(indices)
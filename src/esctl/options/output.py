@@ -1,21 +1,27 @@
 import csv
 from io import StringIO
+from itertools import chain, islice
 import json
-from typing import Annotated, Any, Callable, Iterable
+from typing import TYPE_CHECKING, Annotated, Any, Callable, Iterable, Iterator
 
-from elastic_transport import ObjectApiResponse
-from jmespath import compile as compile_jmespath
-from jsonpath_ng import parse as parse_jsonpath
+from rich.cells import cell_len
 from rich.console import Console
 from rich.table import Table
-from rich.syntax import Syntax
-from ruamel.yaml import YAML
+from rich.text import Text
 import typer
 
 from esctl.config.utils import get_root_ctx
 
+from .columns import MISSING, Columns
+from .paths import compile_jmespath, compile_jsonpath
+from .query import parse_aggregation, parse_condition, quantity_sort_key, run_query
+
+if TYPE_CHECKING:
+    from elastic_transport import ObjectApiResponse
+
 OUTPUT_FORMATS = (
     "json",
+    "ndjson",
     "yaml",
     "table",
     "csv",
@@ -24,11 +30,36 @@ OUTPUT_FORMATS = (
     "jmespath=",
 )
 
+# Tables with more rows than this are streamed rather than rendered at once,
+# with their column widths sampled from their first rows
+STREAM_THRESHOLD = 1000
+STREAM_SAMPLE = 1000
+STREAM_BATCH = 500
+
 
 def _default_formatter(_: str, value: str) -> str:
     return value
 
 
+def _formatted(
+    header: list[str], table: Columns, formatter: Callable[[str, str], Any]
+) -> Iterator[tuple[Any, ...]]:
+    """Iterate over the formatted cells of each row.
+
+    Dictionary-encoded columns are formatted once per distinct value.
+    """
+    return zip(
+        *(
+            table[col].map(
+                lambda value, col=col: formatter(
+                    col, "" if value is MISSING else str(value)
+                )
+            )
+            for col in header
+        )
+    )
+
+
 class Result:
     def __init__(self, value: Any, pretty: bool = True):
         self.value = value
@@ -39,12 +70,105 @@ class Result:
         self.exclude_headers: set[str] = set()
         self.console = Console()
 
+    @property
+    def value(self) -> Any:
+        self._collect()
+        if self.columns is not None:
+            return self.columns.rows()
+        return self._value
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        # Lists of rows, like the responses of the cat APIs, are stored column
+        # by column: see columns.py. Iterators, like the matches of the
+        # jsonpath and jmespath selectors, are only read when needed.
+        if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+            self.columns: Columns | None = Columns.from_rows(value)
+            self._value = None
+        else:
+            self.columns = None
+            self._value = value
+
+    def _collect(self) -> None:
+        """Read the rest of an iterator value, see the ``value`` setter."""
+        if isinstance(self._value, Iterator):
+            self.value = list(self._value)
+
+    def _items(self) -> Iterator[Any] | None:
+        """Iterate over the items of a list value, or None for other values.
+
+        Iterator values are consumed: they can only be printed once.
+        """
+        if self.columns is not None:
+            return self.columns.iter_dicts()
+        if isinstance(self._value, Iterator):
+            return self._value
+        if isinstance(self._value, list):
+            return iter(self._value)
+        return None
+
+    def sort(self, keys: list[str]) -> None:
+        """Sort the rows by ``column[:asc|desc]`` keys, like the cat APIs ``s``.
+
+        Sizes and durations sort as such, see query.py.
+        """
+        self._collect()
+        if self.columns is None:
+            raise ValueError("Only lists of rows can be sorted")
+        parsed = []
+        for key in keys:
+            column, _, order = key.partition(":")
+            if column not in self.columns.names:
+                raise ValueError(
+                    f"Unknown column {column!r}, available: "
+                    f"{', '.join(self.columns.names)}"
+                )
+            if order not in ("", "asc", "desc"):
+                raise ValueError(f"Invalid order {order!r} in {key!r}: asc or desc")
+            parsed.append((column, order == "desc"))
+        self.columns = self.columns.sort(parsed, quantity_sort_key)
+
+    def query(
+        self,
+        where: list[str] | None = None,
+        group_by: list[str] | None = None,
+        aggregations: list[str] | None = None,
+        sort: list[str] | None = None,
+    ) -> None:
+        """Filter the rows, then group and aggregate them, see query.py.
+
+        Groups are sorted by ``sort``: the order Elasticsearch sorted the rows
+        in does not apply to them, so commands only send it ``--sort`` without
+        ``--group-by`` nor ``--agg``.
+        """
+        if not (where or group_by or aggregations):
+            return
+        self._collect()
+        if self.columns is None:
+            raise typer.BadParameter("--where, --group-by and --agg need rows")
+        try:
+            self.columns = run_query(
+                self.columns,
+                [parse_condition(condition) for condition in where or []],
+                [name for names in group_by or [] for name in names.split(",")],
+                [parse_aggregation(aggregation) for aggregation in aggregations or []],
+            )
+            if sort and (group_by or aggregations):
+                self.sort(sort)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
     def _print_json(self) -> None:
+        from rich.syntax import Syntax
+
         self.console.print(
             Syntax(json.dumps(self.value, indent=2), "json", line_numbers=True)
         )
 
     def _print_yaml(self) -> None:
+        from rich.syntax import Syntax
+        from ruamel.yaml import YAML
+
         yaml = YAML()
         yaml.default_flow_style = False
 
@@ -56,37 +180,62 @@ class Result:
         else:
             self.console.print(stream.getvalue())
 
-    def _make_table(self) -> tuple[list[str], list[dict]]:
-        if isinstance(self.value, list) and all(
-            isinstance(item, dict) for item in self.value
-        ):
-            # Assume that all dicts have uniform keys
-            header = list(self.value[0].keys()) if self.value else []
-            return [h for h in header if h not in self.exclude_headers], self.value
-        elif isinstance(self.value, dict):
-            return [h for h in self.value.keys() if h in self.header_names], [
-                self.value
-            ]
+    def _write(self, chunks: Iterable[str]) -> None:
+        """Write ``chunks`` straight to the output, a batch at a time."""
+        chunks = iter(chunks)
+        while batch := "".join(islice(chunks, STREAM_BATCH)):
+            self.console.file.write(batch)
+            self.console.file.flush()
+
+    def _print_compact_json(self) -> None:
+        # Lists are written an item at a time, the same as json.dumps would
+        items = self._items()
+        if items is None:
+            self._write([json.dumps(self._value), "\n"])
+            return
+        self._write(
+            chain(
+                ["["],
+                (
+                    f", {json.dumps(item)}" if i else json.dumps(item)
+                    for i, item in enumerate(items)
+                ),
+                ["]\n"],
+            )
+        )
+
+    def _print_ndjson(self) -> None:
+        items = self._items()
+        if items is None:
+            items = iter([self._value])
+        self._write(f"{json.dumps(item)}\n" for item in items)
+
+    def _make_table(self) -> tuple[list[str], Columns]:
+        self._collect()
+        if self.columns is not None:
+            header = self.columns.names
+            return [h for h in header if h not in self.exclude_headers], self.columns
+        elif isinstance(self._value, dict):
+            return [h for h in self._value.keys() if h in self.header_names], (
+                Columns.from_rows([self._value])
+            )
         else:
             raise ValueError("Cannot convert value to table format")
 
-    def _print_csv(self) -> None:
-        stream = StringIO()
-        writer = csv.writer(stream)
+    def _write_delimited(self, delimiter: str) -> None:
+        # Straight to the output, a row at a time: going through the console
+        # would buffer it all, and wrap lines at the terminal width.
+        writer = csv.writer(self.console.file, delimiter=delimiter)
         header, table = self._make_table()
         writer.writerow([self.header_names.get(h, h) for h in header])
-        for row in table:
-            writer.writerow([row.get(col, "") for col in header])
-        self.console.print(stream.getvalue())
+        for row in table.iter_rows(header):
+            writer.writerow(["" if value is MISSING else value for value in row])
+
+    def _print_csv(self) -> None:
+        self._write_delimited(",")
 
     def _print_tsv(self) -> None:
-        stream = StringIO()
-        writer = csv.writer(stream, delimiter="\t")
-        header, table = self._make_table()
-        writer.writerow([self.header_names.get(h, h) for h in header])
-        for row in table:
-            writer.writerow([row.get(col, "") for col in header])
-        self.console.print(stream.getvalue())
+        self._write_delimited("\t")
 
     def _print_table(
         self,
@@ -95,33 +244,99 @@ class Result:
         if formatter is None:
             formatter = _default_formatter
         header, table = self._make_table()
+        if len(table) > STREAM_THRESHOLD:
+            self._stream_table(header, table, formatter)
+            return
         rich_table = Table(*[self.header_names.get(h, h) for h in header])
-        for row in table:
-            rich_table.add_row(
-                *[formatter(col, str(row.get(col, ""))) for col in header]
-            )
+        for row in _formatted(header, table, formatter):
+            rich_table.add_row(*row)
         self.console.print(rich_table)
 
+    def _stream_table(
+        self,
+        header: list[str],
+        table: Columns,
+        formatter: Callable[[str, str], str],
+    ) -> None:
+        """Print a table a batch of rows at a time, rather than all at once.
+
+        Columns are as wide as their values in the first ``STREAM_SAMPLE`` rows:
+        longer values further down overflow their column instead. Lines are
+        written straight to the output: only the markup of the formatted values
+        goes through the console, once per distinct value.
+        """
+        styled = self.console.is_terminal and not self.console.no_color
+        # Formatters only return a handful of distinct markup strings
+        markup: dict[str, tuple[str, int]] = {}
+
+        def render(text: Text) -> str:
+            if not styled:
+                return text.plain
+            with self.console.capture() as capture:
+                self.console.print(text, end="", soft_wrap=True)
+            return capture.get()
+
+        def cell(value: str) -> tuple[str, int]:
+            if "[" not in value:
+                return value, cell_len(value)
+            if value not in markup:
+                text = Text.from_markup(value)
+                markup[value] = (render(text), text.cell_len)
+            return markup[value]
+
+        rows = _formatted(header, table, lambda col, value: cell(formatter(col, value)))
+        names = [self.header_names.get(h, h) for h in header]
+        sample = list(islice(rows, STREAM_SAMPLE))
+        widths = [
+            max(cell_len(name), *(row[i][1] for row in sample))
+            for i, name in enumerate(names)
+        ]
+
+        def line(cells: Iterable[tuple[str, int]]) -> str:
+            return "  ".join(
+                value + " " * (width - length)
+                for (value, length), width in zip(cells, widths)
+            ).rstrip()
+
+        def write(lines: list[str]) -> None:
+            self.console.file.write("\n".join(lines) + "\n")
+            self.console.file.flush()
+
+        lines = [render(Text(line([(n, cell_len(n)) for n in names]), style="bold"))]
+        for row in chain(sample, rows):
+            lines.append(line(row))
+            if len(lines) == STREAM_BATCH:
+                write(lines)
+                lines = []
+        if lines:
+            write(lines)
+
     def print(
         self,
         output: str,
         formatter: Callable[[str, str], str] | None = None,
     ) -> None:
-        match output:
-            case "json" if self.pretty:
-                self._print_json()
-            case "json" if not self.pretty:
-                print(json.dumps(self.value))
-            case "yaml":
-                self._print_yaml()
-            case "table":
-                self._print_table(formatter)
-            case "csv":
-                self._print_csv()
-            case "tsv":
-                self._print_tsv()
-            case _:
-                print(self.value)
+        try:
+            match output:
+                case "json" if self.pretty:
+                    self._print_json()
+                case "json" if not self.pretty:
+                    self._print_compact_json()
+                case "ndjson":
+                    self._print_ndjson()
+                case "yaml":
+                    self._print_yaml()
+                case "table":
+                    self._print_table(formatter)
+                case "csv":
+                    self._print_csv()
+                case "tsv":
+                    self._print_tsv()
+                case _:
+                    print(self.value)
+        except BrokenPipeError:
+            # Piped into e.g. head, which exited: stop quietly
+            self.console.on_broken_pipe()
 
 
 def complete_output(ctx: typer.Context, incomplete: str) -> Iterable[str]:
@@ -130,37 +345,72 @@ def complete_output(ctx: typer.Context, incomplete: str) -> Iterable[str]:
             yield fmt
 
 
-def noop_selector(pretty: bool) -> Callable[[ObjectApiResponse], Result]:
-    def selector(response: ObjectApiResponse) -> Result:
-        return Result(response.body, pretty)
+# Called with the response, and the --where, --group-by, --agg and --sort of
+# the command if it has them: see Result.query
+Selector = Callable[..., Result]
+
+
+def _queried(
+    body: Any,
+    where: list[str] | None,
+    group_by: list[str] | None,
+    aggregations: list[str] | None,
+    sort: list[str] | None,
+) -> Any:
+    """Return the rows of ``body`` the query keeps, for a selector to select from."""
+    if not (where or group_by or aggregations):
+        return body
+    result = Result(body)
+    result.query(where, group_by, aggregations, sort)
+    return result.value
+
+
+def noop_selector(pretty: bool) -> Selector:
+    def selector(
+        response: "ObjectApiResponse",
+        where: list[str] | None = None,
+        group_by: list[str] | None = None,
+        aggregations: list[str] | None = None,
+        sort: list[str] | None = None,
+    ) -> Result:
+        result = Result(response.body, pretty)
+        result.query(where, group_by, aggregations, sort)
+        return result
 
     return selector
 
 
-def jsonpath_selector(
-    jsonpath: str, pretty: bool
-) -> Callable[[ObjectApiResponse], Result]:
-    def selector(response: ObjectApiResponse) -> Any:
-        value = parse_jsonpath(jsonpath[len("jsonpath=") :]).find(response.body)
-        if isinstance(value, Iterable):
-            value = [match.value for match in value]
-            if len(value) == 1:
-                return Result(value[0], pretty)
-            return Result(value, pretty)
-        else:
-            return Result(value.value, pretty)
+def jsonpath_selector(jsonpath: str, pretty: bool) -> Selector:
+    find = compile_jsonpath(jsonpath[len("jsonpath=") :])
+
+    def selector(
+        response: "ObjectApiResponse",
+        where: list[str] | None = None,
+        group_by: list[str] | None = None,
+        aggregations: list[str] | None = None,
+        sort: list[str] | None = None,
+    ) -> Result:
+        matches = find(_queried(response.body, where, group_by, aggregations, sort))
+        first = list(islice(matches, 2))
+        if len(first) == 1:
+            return Result(first[0], pretty)
+        return Result(chain(first, matches), pretty)
 
     return selector
 
 
-def jmespath_selector(
-    jmespath: str, pretty: bool
-) -> Callable[[ObjectApiResponse], Result]:
-    def selector(response: ObjectApiResponse) -> Any:
-        return Result(
-            compile_jmespath(jmespath[len("jmespath=") :]).search(response.body),
-            pretty,
-        )
+def jmespath_selector(jmespath: str, pretty: bool) -> Selector:
+    search = compile_jmespath(jmespath[len("jmespath=") :])
+
+    def selector(
+        response: "ObjectApiResponse",
+        where: list[str] | None = None,
+        group_by: list[str] | None = None,
+        aggregations: list[str] | None = None,
+        sort: list[str] | None = None,
+    ) -> Result:
+        body = _queried(response.body, where, group_by, aggregations, sort)
+        return Result(search(body), pretty)
 
     return selector
 
@@ -179,13 +429,16 @@ def validate_output(ctx: typer.Context, value: str | None) -> str:
             f"Invalid output format: {value}. Must be one of: {', '.join(OUTPUT_FORMATS)}"
         )
 
-    if value.startswith("jsonpath"):
-        ctx.obj["selector"] = jsonpath_selector(value, pretty)
-        return "json"
+    try:
+        if value.startswith("jsonpath"):
+            ctx.obj["selector"] = jsonpath_selector(value, pretty)
+            return "json"
 
-    if value.startswith("jmespath"):
-        ctx.obj["selector"] = jmespath_selector(value, pretty)
-        return "json"
+        if value.startswith("jmespath"):
+            ctx.obj["selector"] = jmespath_selector(value, pretty)
+            return "json"
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
     return value
 
 
@@ -194,7 +447,7 @@ OutputOption = Annotated[
     typer.Option(
         "-o",
         "--output",
-        help="Output format. One of: (json, yaml, table, csv, tsv, jsonpath=EXPR, jmespath=EXPR)",
+        help="Output format. One of: (json, ndjson, yaml, table, csv, tsv, jsonpath=EXPR, jmespath=EXPR)",
         autocompletion=complete_output,
         callback=validate_output,
     ),
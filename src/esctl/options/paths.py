@@ -0,0 +1,197 @@
+"""Compiled jsonpath and jmespath expressions, for ``-o jsonpath=`` and ``-o jmespath=``.
+
+Expressions are compiled once, when the ``--output`` option is parsed. Simple
+paths, made of fields, indices and wildcards (``$.nodes.*.name``,
+``$[*].index``, ``hits.hits[*]._source``), are evaluated here rather than by
+jsonpath-ng or jmespath: lazily, one match at a time, so the matches of a path
+into a list of 100k rows are never all held at once. Other expressions go to
+the libraries, with the same results.
+"""
+
+import re
+from typing import Any, Callable, Iterable, Iterator
+
+# Fields, as jsonpath-ng lexes them, minus its "@" and reserved words
+JSONPATH_FIELD = r"[A-Za-z_][A-Za-z0-9_\-]*"
+JSONPATH_STEP = re.compile(rf"\.({JSONPATH_FIELD})|(\.\*)|(\[\*\])|\[(-?\d+)\]")
+JSONPATH_START = re.compile(rf"\$|({JSONPATH_FIELD})|(\*)")
+JSONPATH_RESERVED = ("where", "wherenot")
+
+JMESPATH_STEP = re.compile(r"\.([A-Za-z_][A-Za-z0-9_]*)|\[(-?\d+)\]|(\[\*\])")
+JMESPATH_START = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+Step = Callable[[Iterable[Any]], Iterator[Any]]
+
+
+def _field(name: str) -> Step:
+    def step(matches: Iterable[Any]) -> Iterator[Any]:
+        for value in matches:
+            if isinstance(value, dict) and name in value:
+                yield value[name]
+
+    return step
+
+
+def _values(matches: Iterable[Any]) -> Iterator[Any]:
+    for value in matches:
+        if isinstance(value, dict):
+            yield from value.values()
+
+
+def _elements(matches: Iterable[Any]) -> Iterator[Any]:
+    for value in matches:
+        if isinstance(value, list):
+            yield from value
+        elif value is not None:
+            # Like jsonpath-ng, which takes anything else as a list of one
+            yield value
+
+
+def _index(index: int) -> Step:
+    def step(matches: Iterable[Any]) -> Iterator[Any]:
+        for value in matches:
+            if isinstance(value, (list, str)) and -len(value) <= index < len(value):
+                yield value[index]
+
+    return step
+
+
+def _jsonpath_steps(expression: str) -> list[Step] | None:
+    """Return the steps of a simple jsonpath, or None if it is not one."""
+    start = JSONPATH_START.match(expression)
+    if start is None:
+        return None
+    field, wildcard = start.groups()
+    steps: list[Step] = []
+    names = [field]
+    if field is not None:
+        steps.append(_field(field))
+    elif wildcard is not None:
+        steps.append(_values)
+    position = start.end()
+    while position < len(expression):
+        match = JSONPATH_STEP.match(expression, position)
+        if match is None:
+            return None
+        field, values, elements, index = match.groups()
+        if field is not None:
+            names.append(field)
+            steps.append(_field(field))
+        elif values is not None:
+            steps.append(_values)
+        elif elements is not None:
+            steps.append(_elements)
+        else:
+            steps.append(_index(int(index)))
+        position = match.end()
+    if any(name in JSONPATH_RESERVED for name in names):
+        return None
+    return steps
+
+
+def compile_jsonpath(expression: str) -> Callable[[Any], Iterator[Any]]:
+    """Compile ``expression`` into a function iterating over its matches.
+
+    Raises a ValueError if the expression is invalid.
+    """
+    steps = _jsonpath_steps(expression)
+    if steps is not None:
+
+        def find(value: Any) -> Iterator[Any]:
+            matches: Iterator[Any] = iter((value,))
+            for step in steps:
+                matches = step(matches)
+            return matches
+
+        return find
+
+    from jsonpath_ng import parse as parse_jsonpath
+    from jsonpath_ng.exceptions import JSONPathError
+
+    try:
+        jsonpath = parse_jsonpath(expression)
+    except JSONPathError as e:
+        raise ValueError(f"Invalid jsonpath {expression!r}: {e}")
+    return lambda value: (match.value for match in jsonpath.find(value))
+
+
+def _jmespath_get(value: Any, steps: list[str | int]) -> Any:
+    for step in steps:
+        if isinstance(step, str):
+            value = value.get(step) if isinstance(value, dict) else None
+        elif isinstance(value, list) and -len(value) <= step < len(value):
+            value = value[step]
+        else:
+            return None
+    return value
+
+
+def _jmespath_steps(
+    expression: str,
+) -> tuple[list[str | int], list[str | int] | None] | None:
+    """Split a simple jmespath into the steps before and after its projection.
+
+    Return None if it is not a simple one: fields and indices, with at most
+    one ``[*]`` projection.
+    """
+    steps: list[str | int] = []
+    before: list[str | int] | None = None
+    start = JMESPATH_START.match(expression)
+    position = 0
+    if start is not None:
+        steps.append(start.group())
+        position = start.end()
+    elif not expression.startswith("["):
+        return None
+    while position < len(expression):
+        match = JMESPATH_STEP.match(expression, position)
+        if match is None:
+            return None
+        field, index, projection = match.groups()
+        if field is not None:
+            if position == 0:
+                return None
+            steps.append(field)
+        elif index is not None:
+            steps.append(int(index))
+        else:
+            if before is not None:
+                return None
+            before, steps = steps, []
+        position = match.end()
+    if before is None:
+        return steps, None
+    return before, steps
+
+
+def compile_jmespath(expression: str) -> Callable[[Any], Any]:
+    """Compile ``expression`` into a function searching values with it.
+
+    The results of a projection over a list are iterated over lazily. Raises a
+    ValueError if the expression is invalid.
+    """
+    steps = _jmespath_steps(expression)
+    if steps is not None:
+        before, after = steps
+        if after is None:
+            return lambda value: _jmespath_get(value, before)
+
+        def search(value: Any) -> Any:
+            value = _jmespath_get(value, before)
+            if not isinstance(value, list):
+                return None
+            return (
+                projected
+                for projected in (_jmespath_get(item, after) for item in value)
+                if projected is not None
+            )
+
+        return search
+
+    from jmespath import compile as compile_jmespath
+    from jmespath.exceptions import JMESPathError
+
+    try:
+        return compile_jmespath(expression).search
+    except JMESPathError as e:
+        raise ValueError(f"Invalid jmespath {expression!r}: {e}")
@@ -0,0 +1,362 @@
+"""Filtering, grouping and aggregation of tabular results, e.g. the cat APIs.
+
+Conditions and aggregations work a column at a time. Parsing a value (e.g.
+``1.2gb``) and testing it against a condition happen once per distinct value
+of a dictionary-encoded column, see columns.py, rather than once per row.
+
+Sizes and durations compare and aggregate as such: ``store>1gb`` keeps
+``1.5gb`` and drops ``900mb``. Values without a unit are taken as bytes or
+milliseconds when compared to a size or a duration, which is what the cat
+APIs return with ``--bytes b`` and ``--time ms``.
+"""
+
+from collections import Counter
+from fnmatch import fnmatchcase
+import math
+import operator
+import re
+from typing import Annotated, Any, Callable, NamedTuple
+
+import typer
+
+from .columns import MISSING, Columns
+
+
+BYTE_UNITS = {
+    "b": 1,
+    "kb": 1024,
+    "mb": 1024**2,
+    "gb": 1024**3,
+    "tb": 1024**4,
+    "pb": 1024**5,
+}
+# In milliseconds
+TIME_UNITS = {
+    "nanos": 1e-6,
+    "micros": 1e-3,
+    "ms": 1,
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+}
+QUANTITY = re.compile(r"^(-?\d+(?:\.\d+)?)([a-z]*)$")
+
+NUMBER = "number"
+BYTES = "bytes"
+TIME = "time"
+
+CONDITION = re.compile(r"^\s*([^\s!=<>~]+)\s*(==|!=|>=|<=|=|>|<|~)\s*(.*?)\s*$")
+COMPARISONS: dict[str, Callable[[float, float], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+AGGREGATION = re.compile(r"^\s*(\w+)\s*(?:\(\s*([^,()\s]*)\s*(?:,\s*(\d+)\s*)?\))?\s*$")
+AGGREGATIONS = ("count", "sum", "avg", "min", "max", "topk")
+PERCENTILE = re.compile(r"^p(\d{1,2}(?:\.\d+)?|100)$")
+# Values listed by topk when not given
+DEFAULT_TOPK = 5
+
+
+def parse_quantity(value: Any) -> tuple[str, float] | None:
+    """Return the kind and value of a number, size or duration, if it is one.
+
+    Sizes are in bytes, durations in milliseconds.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return NUMBER, float(value)
+    if not isinstance(value, str):
+        return None
+    match = QUANTITY.match(value.strip().lower())
+    if match is None:
+        return None
+    number, unit = float(match[1]), match[2]
+    if not unit:
+        return NUMBER, number
+    if unit in BYTE_UNITS:
+        return BYTES, number * BYTE_UNITS[unit]
+    if unit in TIME_UNITS:
+        return TIME, number * TIME_UNITS[unit]
+    return None
+
+
+def quantity_sort_key(value: Any) -> tuple[int, float, str]:
+    """Order missing values first, then quantities by value, then anything else.
+
+    Unlike columns.sort_key, ``900mb`` comes before ``1.5gb``.
+    """
+    if value is None or value is MISSING:
+        return (0, 0.0, "")
+    quantity = parse_quantity(value)
+    if quantity is not None:
+        return (1, quantity[1], "")
+    return (2, 0.0, str(value))
+
+
+def _compatible(kind: str, other: str) -> bool:
+    return kind == other or NUMBER in (kind, other)
+
+
+def format_quantity(kind: str, number: float) -> Any:
+    """Format an aggregated value the way the cat APIs would."""
+    match kind:
+        case "bytes":
+            for unit, size in reversed(BYTE_UNITS.items()):
+                if abs(number) >= size and size > 1:
+                    return f"{number / size:.1f}{unit}"
+            return f"{number:.0f}b"
+        case "time":
+            for unit in ("d", "h", "m", "s"):
+                if abs(number) >= TIME_UNITS[unit]:
+                    return f"{number / TIME_UNITS[unit]:.1f}{unit}"
+            return f"{number:g}ms"
+        case _:
+            return int(number) if number.is_integer() else round(number, 2)
+
+
+class Condition(NamedTuple):
+    column: str
+    operator: str
+    value: str
+
+    def predicate(self) -> Callable[[Any], bool]:
+        """Return the test of the values of the column."""
+        expected = parse_quantity(self.value)
+        if self.operator in COMPARISONS:
+            if expected is None:
+                raise ValueError(
+                    f"{self.value!r} is not a number, size or duration, "
+                    f"it cannot be compared with {self.operator}"
+                )
+            compare = COMPARISONS[self.operator]
+            kind, threshold = expected
+
+            def compares(value: Any) -> bool:
+                quantity = parse_quantity(value)
+                return (
+                    quantity is not None
+                    and _compatible(quantity[0], kind)
+                    and compare(quantity[1], threshold)
+                )
+
+            return compares
+        if self.operator == "~":
+            pattern = re.compile(self.value)
+            return lambda value: (
+                value is not None
+                and value is not MISSING
+                and pattern.search(str(value)) is not None
+            )
+        is_glob = any(c in self.value for c in "*?[")
+
+        def equals(value: Any) -> bool:
+            if value is None or value is MISSING:
+                return self.value in ("", "null")
+            if expected is not None:
+                quantity = parse_quantity(value)
+                if quantity is not None and _compatible(quantity[0], expected[0]):
+                    return quantity[1] == expected[1]
+            if is_glob:
+                return fnmatchcase(str(value), self.value)
+            return str(value) == self.value
+
+        if self.operator == "!=":
+            return lambda value: not equals(value)
+        return equals
+
+
+def parse_condition(expression: str) -> Condition:
+    match = CONDITION.match(expression)
+    if match is None:
+        raise ValueError(
+            f"Invalid condition {expression!r}, expected COLUMN OPERATOR VALUE "
+            "with OPERATOR one of =, !=, <, <=, >, >=, ~"
+        )
+    column, op, value = match.groups()
+    condition = Condition(column, "=" if op == "==" else op, value)
+    condition.predicate()  # Check the value and the regex
+    return condition
+
+
+class Aggregation(NamedTuple):
+    function: str
+    column: str | None
+    k: int | None
+
+    @property
+    def name(self) -> str:
+        """Name of the column of the aggregated values, e.g. ``sum(store)``."""
+        if self.column is None:
+            return self.function
+        if self.k is None:
+            return f"{self.function}({self.column})"
+        return f"{self.function}({self.column},{self.k})"
+
+    def compute(self, rows: list[int], values: list[Any]) -> Any:
+        """Aggregate the ``values`` of the column in ``rows``."""
+        if self.function == "count":
+            if self.column is None:
+                return len(rows)
+            return sum(
+                1 for i in rows if values[i] is not None and values[i] is not MISSING
+            )
+        if self.function == "topk":
+            counts = Counter(
+                str(values[i])
+                for i in rows
+                if values[i] is not None and values[i] is not MISSING
+            )
+            return ", ".join(
+                f"{value} ({count})"
+                for value, count in counts.most_common(self.k or DEFAULT_TOPK)
+            )
+        quantities = [values[i] for i in rows if values[i] is not None]
+        if not quantities:
+            return None
+        kind = next((k for k, _ in quantities if k != NUMBER), NUMBER)
+        numbers = [number for _, number in quantities]
+        match self.function:
+            case "sum":
+                result = math.fsum(numbers)
+            case "avg":
+                result = math.fsum(numbers) / len(numbers)
+            case "min":
+                result = min(numbers)
+            case "max":
+                result = max(numbers)
+            case _:
+                percentile = float(self.function[1:])
+                numbers.sort()
+                rank = max(math.ceil(percentile / 100 * len(numbers)), 1)
+                result = numbers[rank - 1]
+        return format_quantity(kind, result)
+
+
+def parse_aggregation(expression: str) -> Aggregation:
+    match = AGGREGATION.match(expression)
+    if match is None:
+        raise ValueError(f"Invalid aggregation {expression!r}, e.g. sum(store)")
+    function, column, k = match[1].lower(), match[2] or None, match[3]
+    if function not in AGGREGATIONS and PERCENTILE.match(function) is None:
+        raise ValueError(
+            f"Unknown aggregation {function!r}, expected one of "
+            f"{', '.join(AGGREGATIONS)} or a percentile, e.g. p95"
+        )
+    if column is None and function != "count":
+        raise ValueError(f"{function} needs a column, e.g. {function}(store)")
+    if k is not None and function != "topk":
+        raise ValueError(f"Only topk takes a count, e.g. topk({column},3)")
+    return Aggregation(function, column, int(k) if k is not None else None)
+
+
+def run_query(
+    columns: Columns,
+    conditions: list[Condition],
+    group_by: list[str],
+    aggregations: list[Aggregation],
+) -> Columns:
+    """Filter rows with ``conditions``, then aggregate them by group.
+
+    Rows are only filtered without ``group_by`` nor ``aggregations``. Without
+    ``group_by``, all rows are aggregated together.
+    """
+    names = set(columns.names)
+    for name in (
+        *(condition.column for condition in conditions),
+        *group_by,
+        *(a.column for a in aggregations if a.column is not None),
+    ):
+        if name not in names:
+            raise ValueError(
+                f"Unknown column {name!r}, available: {', '.join(columns.names)}"
+            )
+
+    if conditions:
+        keep = [True] * len(columns)
+        for condition in conditions:
+            tests = columns[condition.column].map(condition.predicate())
+            keep = [kept and passed for kept, passed in zip(keep, tests)]
+        columns = columns.take([i for i, kept in enumerate(keep) if kept])
+    if not group_by and not aggregations:
+        return columns
+
+    groups: dict[tuple[Any, ...], list[int]] = {}
+    try:
+        for i, key in enumerate(columns.iter_rows(group_by)):
+            groups.setdefault(key, []).append(i)
+    except TypeError:
+        raise ValueError(f"Cannot group by {', '.join(group_by)}: not plain values")
+    if not group_by and not groups:
+        groups[()] = []  # Aggregate no rows at all into one
+    values = {}
+    for aggregation in aggregations:
+        if aggregation.column is None or aggregation.column in values:
+            continue
+        column = columns[aggregation.column]
+        if aggregation.function in ("count", "topk"):
+            values[aggregation.column] = list(column)
+        else:
+            values[aggregation.column] = list(column.map(parse_quantity))
+    if not aggregations:
+        aggregations = [Aggregation("count", None, None)]
+    return Columns.from_rows(
+        {
+            **{
+                name: None if value is MISSING else value
+                for name, value in zip(group_by, key)
+            },
+            **{
+                aggregation.name: aggregation.compute(
+                    rows, values.get(aggregation.column, [])
+                )
+                for aggregation in aggregations
+            },
+        }
+        for key, rows in groups.items()
+    )
+
+
+def _validator(
+    parse: Callable[[str], Any],
+) -> Callable[[list[str] | None], list[str] | None]:
+    def validate(value: list[str] | None) -> list[str] | None:
+        for expression in value or []:
+            try:
+                parse(expression)
+            except (ValueError, re.error) as e:
+                raise typer.BadParameter(str(e))
+        return value
+
+    return validate
+
+
+WhereOption = Annotated[
+    list[str] | None,
+    typer.Option(
+        "--where",
+        help="Only keep the rows where COLUMN OPERATOR VALUE, OPERATOR being one of "
+        "=, !=, <, <=, >, >= or ~ (regular expression), e.g. 'store>1gb' or "
+        "'index=logs-*'. Sizes and durations compare as such. Repeat to combine.",
+        callback=_validator(parse_condition),
+    ),
+]
+GroupByOption = Annotated[
+    list[str] | None,
+    typer.Option(
+        "--group-by",
+        help="Columns to group rows by, aggregated with --agg (count by default)",
+    ),
+]
+AggOption = Annotated[
+    list[str] | None,
+    typer.Option(
+        "--agg",
+        help="Aggregation of the rows of each group: count, count(COLUMN), "
+        "sum(COLUMN), avg(COLUMN), min(COLUMN), max(COLUMN), p95(COLUMN) or any "
+        "other percentile, topk(COLUMN[,K]) for the K most frequent values",
+        callback=_validator(parse_aggregation),
+    ),
+]
@@ -1,32 +1,21 @@
 from urllib.parse import urlparse
 
+from elastic_transport import NodeConfig
 from elasticsearch8 import Elasticsearch as Elasticsearch8
 from elasticsearch9 import Elasticsearch as Elasticsearch9
-from elastic_transport import NodeConfig, Transport
 
+from .clients import Elasticsearch8Client, Elasticsearch9Client
+from .identity import ClusterIdentity, detect_cluster_identity
 from .transport import KubeNodeClassFactory, HTTPNodeClassFactory
 from .serializers import SERIALIZERS8, SERIALIZERS9
+from .bundle import BundleClientFactory
 from .cache import Cache
+from .session import SessionRegistry, sessions
 
 
 Elasticsearch = Elasticsearch8 | Elasticsearch9
 
 
-def _detect_major_version(node_class: type, scheme: str, host: str, port: int) -> int:
-    """Probe ``GET /`` on the target and return the ES major version.
-
-    The probe uses the *actual* target host/port so version detection works
-    against any endpoint (not just localhost:9200).
-    """
-    transport = Transport(
-        node_configs=[NodeConfig(scheme, host, port)], node_class=node_class
-    )
-    response = transport.perform_request("GET", "/")
-    # Already JSON decoded
-    version = response.body["version"]["number"]
-    return next(int(part) for part in version.split("."))
-
-
 def KubeClientFactory(
     context_name: str,
     cache_enabled: bool,
@@ -43,26 +32,39 @@ def KubeClientFactory(
         es_name=es_name,
         in_cluster=in_cluster,
     )
-    # The port-forward binds ES on localhost:9200, so probe there.
-    major = _detect_major_version(Node, "http", "localhost", 9200)
+    # One node per pod, each port-forwarded on demand, or the ECK HTTP service
+    # when in-cluster. The transport spreads requests across the nodes, and
+    # backs off from the ones failing.
+    hosts: list[NodeConfig] = Node.node_configs  # type: ignore[attr-defined]
+    major = detect_cluster_identity(
+        context_name,
+        cache_enabled,
+        Node,
+        hosts[0].scheme,
+        hosts[0].host,
+        hosts[0].port,
+    ).major
     match major:
         case 7:
-            return Elasticsearch9(
-                "http://127.0.0.1:9200",
+            return Elasticsearch9Client(
+                hosts,
                 node_class=Node,
                 serializers=SERIALIZERS9,
+                context=(context_name, cache_enabled),
             )
         case 8:
-            return Elasticsearch8(
-                "http://127.0.0.1:9200",
+            return Elasticsearch8Client(
+                hosts,
                 node_class=Node,
                 serializers=SERIALIZERS8,
+                context=(context_name, cache_enabled),
             )
         case 9:
-            return Elasticsearch9(
-                "http://127.0.0.1:9200",
+            return Elasticsearch9Client(
+                hosts,
                 node_class=Node,
                 serializers=SERIALIZERS9,
+                context=(context_name, cache_enabled),
             )
         case _:
             raise ValueError(f"Unsupported Elasticsearch major version: {major}")
@@ -86,25 +88,30 @@ def HTTPClientFactory(
     scheme = parsed.scheme or "http"
     probe_host = parsed.hostname or "localhost"
     probe_port = parsed.port or (443 if scheme == "https" else 9200)
-    major = _detect_major_version(Node, scheme, probe_host, probe_port)
+    major = detect_cluster_identity(
+        context_name, cache_enabled, Node, scheme, probe_host, probe_port
+    ).major
     match major:
         case 7:
-            return Elasticsearch8(
+            return Elasticsearch8Client(
                 host,
                 node_class=Node,
                 serializers=SERIALIZERS8,
+                context=(context_name, cache_enabled),
             )
         case 8:
-            return Elasticsearch8(
+            return Elasticsearch8Client(
                 host,
                 node_class=Node,
                 serializers=SERIALIZERS8,
+                context=(context_name, cache_enabled),
             )
         case 9:
-            return Elasticsearch9(
+            return Elasticsearch9Client(
                 host,
                 node_class=Node,
                 serializers=SERIALIZERS9,
+                context=(context_name, cache_enabled),
             )
         case _:
             raise ValueError(f"Unsupported Elasticsearch major version: {major}")
@@ -113,8 +120,12 @@ def HTTPClientFactory(
 __all__ = (
     "Elasticsearch",
     "Cache",
+    "ClusterIdentity",
     "KubeClientFactory",
     "HTTPClientFactory",
+    "BundleClientFactory",
     "KubeNodeClassFactory",
     "HTTPNodeClassFactory",
+    "SessionRegistry",
+    "sessions",
 )
@@ -0,0 +1,356 @@
+"""Long-lived local agent owning warm clients for every context.
+
+The agent listens on a Unix socket under ``ESCTL_HOME``. When it is running, the
+CLI builds its clients with ``AgentClientFactory``: their node forwards each raw
+request (method, target, headers, body) to the agent, which performs it with
+its own, already warm, client for that context (port-forwards, SSH tunnels,
+cluster identity and response cache included).
+
+Frames on the socket are ``>II`` (header length, body length), followed by an
+orjson-encoded header and the raw body bytes.
+"""
+
+import copy
+import functools
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any
+
+from elastic_transport import (
+    ApiResponseMeta,
+    BaseNode,
+    ConnectionError,
+    HttpHeaders,
+    NodeConfig,
+)
+from elastic_transport._node._base import NodeApiResponse
+import elastic_transport
+from elasticsearch8 import Elasticsearch as Elasticsearch8
+from elastic_transport.client_utils import DEFAULT, DefaultType
+import orjson
+
+from esctl.constants import ESCTL_AGENT_SOCKET_PATH, ESCTL_CONFIG_PATH
+
+from .clients import Elasticsearch8Client, Elasticsearch9Client
+from .identity import is_version_mismatch
+from .serializers import SERIALIZERS8, SERIALIZERS9
+from .session import sessions
+
+
+logger = logging.getLogger("esctl")
+
+FRAME = struct.Struct(">II")
+AGENT_URL = "http://esctl-agent:9200"
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("esctl agent connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock: socket.socket, header: dict[str, Any], body: bytes = b"") -> None:
+    header_bytes = orjson.dumps(header)
+    sock.sendall(FRAME.pack(len(header_bytes), len(body)) + header_bytes + body)
+
+
+def recv_frame(sock: socket.socket) -> tuple[dict[str, Any], bytes]:
+    header_size, body_size = FRAME.unpack(_recv_exactly(sock, FRAME.size))
+    header = orjson.loads(_recv_exactly(sock, header_size))
+    return header, _recv_exactly(sock, body_size)
+
+
+def _connect() -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(ESCTL_AGENT_SOCKET_PATH))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def call(header: dict[str, Any], body: bytes = b"") -> tuple[dict[str, Any], bytes]:
+    """Send a single request to the agent and return its reply."""
+    with _connect() as sock:
+        send_frame(sock, header, body)
+        return recv_frame(sock)
+
+
+@functools.lru_cache()
+def agent_available() -> bool:
+    """Whether an agent is listening. Checked once per process."""
+    if os.getenv("ESCTL_NO_AGENT") or not hasattr(socket, "AF_UNIX"):
+        return False
+    if not ESCTL_AGENT_SOCKET_PATH.exists():
+        return False
+    try:
+        header, _ = call({"op": "ping"})
+    except (OSError, EOFError):
+        return False
+    return header.get("ok", False)
+
+
+class AgentHttpNode(BaseNode):
+    """Node forwarding every request to the agent over its Unix socket."""
+
+    def __init__(self, config: NodeConfig, context_name: str, cache_enabled: bool):
+        super().__init__(config)
+        self.context_name = context_name
+        self.cache_enabled = cache_enabled
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+
+    def _exchange(
+        self, header: dict[str, Any], body: bytes
+    ) -> tuple[dict[str, Any], bytes]:
+        with self._lock:
+            # One retry on a fresh socket: the agent may have been restarted
+            # since the last request of this (possibly long-lived) process.
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = _connect()
+                    send_frame(self._sock, header, body)
+                    return recv_frame(self._sock)
+                except (OSError, EOFError) as e:
+                    self.close()
+                    if attempt:
+                        raise ConnectionError(
+                            f"esctl agent unreachable: {e}", errors=(e,)
+                        ) from e
+        raise AssertionError("unreachable")
+
+    def perform_request(
+        self,
+        method: str,
+        target: str,
+        body: bytes | None = None,
+        headers: HttpHeaders | None = None,
+        request_timeout: DefaultType | float | None = DEFAULT,
+    ) -> NodeApiResponse:
+        start = time.time()
+        reply, data = self._exchange(
+            {
+                "op": "request",
+                "context": self.context_name,
+                "cache_enabled": self.cache_enabled,
+                "method": method,
+                "target": target,
+                "headers": dict(headers or {}),
+                "request_timeout": (
+                    None if request_timeout is DEFAULT else request_timeout
+                ),
+            },
+            body or b"",
+        )
+        if "error" in reply:
+            error_class = getattr(
+                elastic_transport, reply["error"]["type"], ConnectionError
+            )
+            if not isinstance(error_class, type) or not issubclass(
+                error_class, elastic_transport.TransportError
+            ):
+                error_class = ConnectionError
+            raise error_class(reply["error"]["message"])
+        meta = ApiResponseMeta(
+            node=self.config,
+            duration=time.time() - start,
+            http_version=reply["http_version"],
+            status=reply["status"],
+            headers=HttpHeaders(reply["headers"]),
+        )
+        return NodeApiResponse(meta, data)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def AgentClientFactory(context_name: str, cache_enabled: bool) -> Any:
+    """Build a client for a context whose requests are served by the agent."""
+    reply, _ = call(
+        {"op": "client", "context": context_name, "cache_enabled": cache_enabled}
+    )
+    if "error" in reply:
+        raise ConnectionError(reply["error"]["message"])
+
+    class Node(AgentHttpNode):
+        def __init__(self, config: NodeConfig):
+            super().__init__(config, context_name, cache_enabled)
+
+    # Requests are retried by the transport of the agent's client, against the
+    # nodes of the cluster: retrying them here as well would multiply them
+    context = (context_name, cache_enabled)
+    if reply["major"] == 8:
+        return Elasticsearch8Client(
+            AGENT_URL,
+            node_class=Node,
+            serializers=SERIALIZERS8,
+            max_retries=0,
+            context=context,
+        )
+    return Elasticsearch9Client(
+        AGENT_URL,
+        node_class=Node,
+        serializers=SERIALIZERS9,
+        max_retries=0,
+        context=context,
+    )
+
+
+class _RawSerializers:
+    """Leave bodies as the bytes they are sent and received as."""
+
+    def dumps(self, data: Any, mimetype: str | None = None) -> Any:
+        return data
+
+    def loads(self, data: Any, mimetype: str | None = None) -> Any:
+        return data
+
+
+RAW_SERIALIZERS = _RawSerializers()
+
+
+def _raw_transport(client: Any) -> Any:
+    """The transport of ``client``, passing bodies through as bytes.
+
+    It shares the node pool of the client, so that requests forwarded by the
+    CLI are retried, and nodes marked dead or alive, as the client's own are.
+    """
+    transport = copy.copy(client.transport)
+    transport.serializers = RAW_SERIALIZERS
+    return transport
+
+
+class AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self):
+        from esctl.config import Config
+
+        self.config_loader = Config.load
+        self.started_at = time.time()
+        self._config_source = b""
+        self._config = None
+        self._config_lock = threading.Lock()
+        ESCTL_AGENT_SOCKET_PATH.unlink(missing_ok=True)
+        previous_umask = os.umask(0o077)  # socket is owner-only
+        try:
+            super().__init__(str(ESCTL_AGENT_SOCKET_PATH), AgentRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def _context(self, name: str, cache_enabled: bool) -> Any:
+        with self._config_lock:
+            # Compare contents, not mtimes: the CLI rewrites the file on most runs.
+            source = ESCTL_CONFIG_PATH.read_bytes()
+            if self._config is None or source != self._config_source:
+                if self._config is not None:
+                    # Contexts may have changed under our feet: start afresh.
+                    logger.info("Configuration changed, dropping warm clients")
+                    sessions.close()
+                self.config_loader.cache_clear()
+                self._config = self.config_loader()
+                self._config_source = source
+            conf = self._config.contexts.get(name)
+        if conf is None:
+            raise KeyError(f"Context {name} not found in configuration")
+        # Copy rather than mutate: handler threads share the loaded config.
+        return conf.model_copy(update={"cache_enabled": cache_enabled})
+
+    def client(self, name: str, cache_enabled: bool) -> Any:
+        return self._context(name, cache_enabled).client
+
+    def server_close(self) -> None:
+        super().server_close()
+        ESCTL_AGENT_SOCKET_PATH.unlink(missing_ok=True)
+
+
+class AgentRequestHandler(socketserver.BaseRequestHandler):
+    server: AgentServer
+
+    def handle(self) -> None:
+        while True:
+            try:
+                header, body = recv_frame(self.request)
+            except (EOFError, OSError):
+                return
+            try:
+                reply, data = self.dispatch(header, body)
+            except Exception as e:
+                logger.debug("Agent request failed: %s", e, exc_info=True)
+                error_type = type(e).__name__
+                if not isinstance(e, elastic_transport.TransportError):
+                    error_type = "ConnectionError"
+                reply, data = {"error": {"type": error_type, "message": str(e)}}, b""
+            send_frame(self.request, reply, data)
+            if header.get("op") == "stop":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+    def dispatch(self, header: dict[str, Any], body: bytes) -> tuple[dict, bytes]:
+        match header.get("op"):
+            case "ping":
+                return {"ok": True, "pid": os.getpid()}, b""
+            case "status":
+                return {
+                    "pid": os.getpid(),
+                    "uptime": time.time() - self.server.started_at,
+                    "contexts": [
+                        {"context": name, "cache_enabled": cache_enabled}
+                        for name, cache_enabled in sessions.open_contexts()
+                    ],
+                }, b""
+            case "stop":
+                return {"ok": True}, b""
+            case "client":
+                client = self.server.client(header["context"], header["cache_enabled"])
+                major = 8 if isinstance(client, Elasticsearch8) else 9
+                return {"major": major}, b""
+            case "request":
+                client = self.server.client(header["context"], header["cache_enabled"])
+                timeout = header["request_timeout"]
+                response = _raw_transport(client).perform_request(
+                    header["method"],
+                    header["target"],
+                    body=body or None,
+                    headers=header["headers"],
+                    request_timeout=DEFAULT if timeout is None else timeout,
+                )
+                if is_version_mismatch(response):
+                    # The CLI rebuilds its client next, and asks for the major
+                    # version to build it for: the warm client must move too.
+                    sessions.rebuild_client(header["context"], header["cache_enabled"])
+                return {
+                    "status": response.meta.status,
+                    "headers": dict(response.meta.headers),
+                    "http_version": response.meta.http_version,
+                }, response.body or b""
+            case op:
+                raise ValueError(f"Unknown agent operation: {op}")
+
+
+def serve() -> None:
+    """Run the agent in the foreground until stopped."""
+    # The agent owns the real clients: it must never forward to itself.
+    os.environ["ESCTL_NO_AGENT"] = "1"
+    agent_available.cache_clear()
+    server = AgentServer()
+    logger.info("esctl agent listening on %s", ESCTL_AGENT_SOCKET_PATH)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        sessions.close()
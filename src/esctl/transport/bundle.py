@@ -0,0 +1,432 @@
+"""Diagnostic bundles: responses of a cluster captured once, replayed offline.
+
+``esctl capture`` fetches the usual diagnostic APIs in parallel and writes
+their responses to a single tar archive, compressed with zstd or gzip. With
+``--bundle``, commands are served from that archive by ``BundleHttpNode``
+instead of the cluster: nothing is sent over the network.
+
+The archive holds a ``manifest.json`` describing every captured response,
+and the response bodies under ``responses/``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+import gzip
+import io
+import logging
+import re
+import tarfile
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import parse_qs, parse_qsl, urlsplit
+
+from elastic_transport import ApiResponseMeta, BaseNode, HttpHeaders, NodeConfig
+from elastic_transport._node._base import NodeApiResponse
+from elastic_transport.client_utils import DEFAULT, DefaultType
+from elasticsearch8 import Elasticsearch as Elasticsearch8
+from elasticsearch9 import Elasticsearch as Elasticsearch9
+import orjson
+
+from .cache import _canon_json, _canon_target
+from .compression import zstd_compress, zstd_decompress
+from .serializers import SERIALIZERS8, SERIALIZERS9
+
+
+logger = logging.getLogger("esctl")
+
+BUNDLE_FORMAT = 1
+BUNDLE_URL = "http://esctl-bundle:9200"
+MANIFEST = "manifest.json"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Cat APIs are captured with every column, the ones a command asks for are
+# picked from those when it is replayed
+CAT_APIS = (
+    "aliases",
+    "allocation",
+    "health",
+    "indices",
+    "nodes",
+    "pending_tasks",
+    "recovery",
+    "shards",
+    "tasks",
+    "templates",
+)
+CAPTURE_TARGETS = (
+    "/",
+    *(f"/_cat/{api}?format=json&h=*" for api in CAT_APIS),
+    "/_cluster/health",
+    "/_cluster/pending_tasks",
+    "/_cluster/settings",
+    "/_cluster/state/metadata",
+    "/_nodes/stats",
+    "/_tasks?detailed=true",
+)
+# How many requests are in flight at once while capturing
+CAPTURE_CONCURRENCY = 4
+
+CAT_PATH = re.compile(r"^/_cat/(?P<api>[a-z_]+)(/(?P<expression>[^/]+))?$")
+# Column matched by the expression of a cat API path, e.g. /_cat/shards/logs-*
+CAT_EXPRESSION_COLUMNS = {
+    "aliases": "alias",
+    "allocation": "node",
+    "templates": "name",
+}
+
+
+class CapturedResponse(NamedTuple):
+    method: str
+    # Canonical target, see cache._canon_target
+    target: str
+    # Canonical request body, "" when there is none
+    request_body: str
+    status: int
+    headers: dict[str, str]
+    duration: float
+    body: bytes
+
+
+def _canon_body(body: Any) -> str:
+    """Request body in canonical form, whether it was sent as bytes or not.
+
+    Top-level values are compared as strings: the shard of an allocation
+    explanation is a string when it comes from the cat APIs, and an int when
+    given on the command line.
+    """
+    if body is None or body == b"":
+        return ""
+    if isinstance(body, (bytes, str)):
+        try:
+            body = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return body.decode("utf-8") if isinstance(body, bytes) else body
+    if isinstance(body, dict):
+        body = {k: str(v) for k, v in body.items() if v is not None}
+    return _canon_json(body)
+
+
+def _sort_key(value: Any) -> tuple[int, float, str]:
+    if value is None:
+        return (0, 0.0, "")
+    try:
+        return (1, float(value), "")
+    except (TypeError, ValueError):
+        return (2, 0.0, str(value))
+
+
+def _params(query: str) -> set[tuple[str, str]]:
+    return set(parse_qsl(query, keep_blank_values=True))
+
+
+def _error(status: int, error_type: str, reason: str) -> bytes:
+    error = {"type": error_type, "reason": reason}
+    return orjson.dumps({"error": {"root_cause": [error], **error}, "status": status})
+
+
+class Bundle:
+    """Responses captured from a cluster, looked up by request."""
+
+    def __init__(self, info: dict[str, Any], responses: list[CapturedResponse]):
+        self.info = info
+        self.responses = responses
+        self._exact: dict[tuple[str, str, str], CapturedResponse] = {}
+        self._by_path: dict[tuple[str, str, str], list[CapturedResponse]] = {}
+        for response in responses:
+            key = (response.method, response.target, response.request_body)
+            path = (
+                response.method,
+                urlsplit(response.target).path,
+                response.request_body,
+            )
+            self._exact.setdefault(key, response)
+            self._by_path.setdefault(path, []).append(response)
+
+    @property
+    def major(self) -> int:
+        """Major version of the cluster the bundle was captured from."""
+        root = self.find("GET", "/")
+        if root is None or root.status != 200:
+            raise ValueError("The bundle holds no response to GET /")
+        version = orjson.loads(root.body)["version"]["number"]
+        return int(version.split(".")[0])
+
+    def find(
+        self, method: str, target: str, body: Any = None
+    ) -> CapturedResponse | None:
+        """Return the captured response to a request, if any.
+
+        Requests are matched on their canonical target first. Cat API requests
+        are then answered from the capture of all their columns, and other
+        requests from a capture of the same path with at least their
+        parameters, e.g. ``GET /_tasks`` from ``GET /_tasks?detailed=true``.
+        """
+        method = method.upper()
+        target = _canon_target(target)
+        request_body = _canon_body(body)
+        found = self._exact.get((method, target, request_body))
+        if found is not None:
+            return found
+        if method == "GET" and not request_body:
+            found = self._cat(target)
+            if found is not None:
+                return found
+        parts = urlsplit(target)
+        params = _params(parts.query)
+        for found in self._by_path.get((method, parts.path, request_body), []):
+            # Parameters the capture lacks, e.g. level=shards, change the response
+            if params <= _params(urlsplit(found.target).query):
+                logger.warning("Replaying %s %s from %s", method, target, found.target)
+                return found
+        return None
+
+    def _cat(self, target: str) -> CapturedResponse | None:
+        """Derive a cat API response from the capture of all its columns."""
+        parts = urlsplit(target)
+        match = CAT_PATH.match(parts.path)
+        if match is None:
+            return None
+        api, expression = match["api"], match["expression"]
+        captured = self._exact.get(("GET", f"/_cat/{api}?format=json&h=*", ""))
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if captured is None or captured.status != 200 or params.get("format") != "json":
+            return None
+        if "bytes" in params or "time" in params:
+            logger.debug("Units of %s are the ones captured", target)
+        rows: list[dict[str, Any]] = orjson.loads(captured.body)
+        if expression is not None and expression not in ("_all", "*"):
+            column = CAT_EXPRESSION_COLUMNS.get(api, "index")
+            patterns = expression.split(",")
+            rows = [
+                row
+                for row in rows
+                if any(fnmatchcase(str(row.get(column)), p) for p in patterns)
+            ]
+        for sort in reversed(params.get("s", "").split(",")):
+            if not sort:
+                continue
+            column, _, order = sort.partition(":")
+            rows.sort(
+                key=lambda row: _sort_key(row.get(column)), reverse=order == "desc"
+            )
+        if params.get("h"):
+            columns = list(rows[0]) if rows else []
+            selected = [
+                column
+                for pattern in params["h"].split(",")
+                for column in columns
+                if fnmatchcase(column, pattern)
+            ]
+            rows = [{column: row.get(column) for column in selected} for row in rows]
+        return captured._replace(target=target, body=orjson.dumps(rows))
+
+    def save(self, path: Path) -> int:
+        """Write the bundle to ``path``, compressed according to its suffix.
+
+        ``.zst`` for zstd, ``.gz`` or ``.tgz`` for gzip, a plain tar archive
+        otherwise. Return the size written.
+        """
+        manifest = {"format": BUNDLE_FORMAT, **self.info, "responses": []}
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for i, response in enumerate(self.responses):
+                name = f"responses/{i:04d}.json"
+                manifest["responses"].append(
+                    {
+                        "method": response.method,
+                        "target": response.target,
+                        "request_body": response.request_body,
+                        "status": response.status,
+                        "headers": response.headers,
+                        "duration": response.duration,
+                        "file": name,
+                    }
+                )
+                _add(tar, name, response.body)
+            _add(tar, MANIFEST, orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+        data = buffer.getvalue()
+        if path.suffix == ".zst":
+            if zstd_compress is None:
+                raise ValueError("zstd is not available, use a .tar.gz bundle")
+            data = zstd_compress(data)
+        elif path.suffix in (".gz", ".tgz"):
+            data = gzip.compress(data, 6)
+        path.write_bytes(data)
+        return len(data)
+
+    @classmethod
+    def load(cls, path: Path) -> "Bundle":
+        data = path.read_bytes()
+        if data.startswith(ZSTD_MAGIC):
+            if zstd_decompress is None:
+                raise ValueError(f"zstd is not available to read {path}")
+            data = zstd_decompress(data)
+        elif data.startswith(GZIP_MAGIC):
+            data = gzip.decompress(data)
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:") as tar:
+            manifest = orjson.loads(_read(tar, MANIFEST))
+            if manifest.pop("format", None) != BUNDLE_FORMAT:
+                raise ValueError(f"{path} is not a bundle esctl can read")
+            responses = [
+                CapturedResponse(
+                    method=entry["method"],
+                    target=entry["target"],
+                    request_body=entry["request_body"],
+                    status=entry["status"],
+                    headers=entry["headers"],
+                    duration=entry["duration"],
+                    body=_read(tar, entry["file"]),
+                )
+                for entry in manifest.pop("responses")
+            ]
+        return cls(manifest, responses)
+
+
+def _add(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    member = tarfile.TarInfo(name)
+    member.size = len(data)
+    member.mtime = int(time.time())
+    tar.addfile(member, io.BytesIO(data))
+
+
+def _read(tar: tarfile.TarFile, name: str) -> bytes:
+    member = tar.extractfile(name)
+    if member is None:
+        raise ValueError(f"{name} is missing from the bundle")
+    return member.read()
+
+
+def _capture_one(
+    client: Any, method: str, target: str, body: Any = None
+) -> CapturedResponse | None:
+    headers = {"accept": "application/json"}
+    if body is not None:
+        headers["content-type"] = "application/json"
+    try:
+        response = client.transport.perform_request(
+            method, target, headers=headers, body=body
+        )
+    except Exception as e:
+        logger.warning("Could not capture %s %s: %s", method, target, e)
+        return None
+    data = response.body
+    if not isinstance(data, (bytes, str)):
+        data = orjson.dumps(data)  # Deserialized by the transport
+    elif isinstance(data, str):
+        data = data.encode("utf-8")
+    return CapturedResponse(
+        method=method,
+        target=_canon_target(target),
+        request_body=_canon_body(body),
+        status=response.meta.status,
+        headers=dict(response.meta.headers),
+        duration=response.meta.duration,
+        body=data,
+    )
+
+
+def capture(client: Any, info: dict[str, Any], max_explanations: int = 20) -> Bundle:
+    """Capture the diagnostic APIs of a cluster into a bundle.
+
+    The allocation of up to ``max_explanations`` unassigned shards is explained
+    too, as ``esctl troubleshoot`` would ask for it.
+    """
+    with ThreadPoolExecutor(CAPTURE_CONCURRENCY) as executor:
+        responses = list(
+            executor.map(
+                lambda target: _capture_one(client, "GET", target), CAPTURE_TARGETS
+            )
+        )
+        captured = [response for response in responses if response is not None]
+        bundle = Bundle(info, captured)
+        shards = bundle.find("GET", "/_cat/shards?format=json&h=*")
+        unassigned = (
+            [row for row in orjson.loads(shards.body) if row["state"] == "UNASSIGNED"]
+            if shards is not None and shards.status == 200
+            else []
+        )
+        explanations = executor.map(
+            lambda row: _capture_one(
+                client,
+                "POST",
+                "/_cluster/allocation/explain",
+                {
+                    "index": row["index"],
+                    "shard": row["shard"],
+                    "primary": row["prirep"] == "p",
+                },
+            ),
+            unassigned[:max_explanations],
+        )
+        captured.extend(response for response in explanations if response is not None)
+    return Bundle(info, captured)
+
+
+class BundleHttpNode(BaseNode):
+    """Node answering requests from a bundle, without any network access."""
+
+    def __init__(self, config: NodeConfig, bundle: Bundle, path: Path):
+        super().__init__(config)
+        self.bundle = bundle
+        self.path = path
+
+    def perform_request(
+        self,
+        method: str,
+        target: str,
+        body: bytes | None = None,
+        headers: HttpHeaders | None = None,
+        request_timeout: DefaultType | float | None = DEFAULT,
+    ) -> NodeApiResponse:
+        lookup = "GET" if method.upper() == "HEAD" else method
+        found = self.bundle.find(lookup, target, body)
+        if found is not None:
+            status = found.status
+            response_headers = HttpHeaders(found.headers)
+            data = found.body
+        else:
+            response_headers = HttpHeaders({"content-type": "application/json"})
+            if method.upper() in ("GET", "HEAD"):
+                status = 404
+                data = _error(
+                    status,
+                    "resource_not_found_exception",
+                    f"{method} {target} was not captured in {self.path.name}",
+                )
+            else:
+                status = 405
+                data = _error(
+                    status,
+                    "illegal_argument_exception",
+                    f"{method} {target} was not captured in {self.path.name}, "
+                    "and bundles are read-only",
+                )
+        # Required by the clients, see ElasticProductMixin
+        response_headers.setdefault("X-Elastic-Product", "Elasticsearch")
+        meta = ApiResponseMeta(
+            node=self.config,
+            duration=0.0,
+            http_version="1.1",
+            status=status,
+            headers=response_headers,
+        )
+        return NodeApiResponse(meta, b"" if method.upper() == "HEAD" else data)
+
+    def close(self) -> None:
+        pass
+
+
+def BundleClientFactory(path: Path) -> Any:
+    """Build a client whose requests are answered from the bundle at ``path``."""
+    bundle = Bundle.load(path)
+
+    class Node(BundleHttpNode):
+        def __init__(self, config: NodeConfig):
+            super().__init__(config, bundle, path)
+
+    if bundle.major == 8 or bundle.major == 7:
+        return Elasticsearch8(BUNDLE_URL, node_class=Node, serializers=SERIALIZERS8)
+    return Elasticsearch9(BUNDLE_URL, node_class=Node, serializers=SERIALIZERS9)
@@ -1,15 +1,38 @@
+import dataclasses
+import functools
+import logging
+import os
 import re
 import sqlite3
+import threading
 import time
 from typing import Any, Mapping, Optional
+from urllib.parse import parse_qsl, quote, urlsplit
 
 import blake3
-from elastic_transport import ApiResponseMeta
+from elastic_transport import ApiResponseMeta, HttpHeaders
 from elastic_transport._node._base import NodeApiResponse
 import orjson
 
-from esctl.constants import ESCTL_CACHE_DB_PATH, ESCTL_TTL_CONFIG_PATH
+from esctl.constants import (
+    ESCTL_CACHE_COMPACTION_INTERVAL,
+    ESCTL_CACHE_CONTEXT_MAX_SIZE,
+    ESCTL_CACHE_DB_PATH,
+    ESCTL_CACHE_MAX_SIZE,
+    ESCTL_CACHE_MEMORY_SIZE,
+)
 
+from .clusterstate import ClusterState, ClusterStateTracker
+from .compression import compress, decompress
+from .invalidation import Invalidation, matches_indices
+from .memory import MemoryCache, MemoryEntry
+from .stats import FLUSH_INTERVAL, CacheStats
+from .ttl import ttl_policy
+
+
+logger = logging.getLogger("esctl")
+
+MiB = 1024 * 1024
 
 US = "\x1f"  # unit separator; never appears in JSON
 
@@ -26,6 +49,42 @@ def _canon_headers(headers: Optional[Mapping[str, Any]]) -> Mapping[str, Any]:
     return {str(k).lower(): headers[k] for k in headers if k.lower() != "authorization"}
 
 
+# Query parameters whose value, when set to it, is the default
+NOOP_PARAMS = {
+    "error_trace": "false",
+    "help": "false",
+    "human": "false",
+    "local": "false",
+    "pretty": "false",
+    "v": "false",
+}
+
+# Query parameters listing values in no particular order
+UNORDERED_PARAMS = frozenset(("expand_wildcards", "filter_path"))
+
+
+@functools.lru_cache(maxsize=1024)
+def _canon_target(target: str) -> str:
+    """Target with the query string in canonical form, for cache keys.
+
+    Parameters are sorted, no-op ones dropped and order-insensitive lists
+    sorted, so ``?h=index&format=json&pretty=false`` and ``?format=json&h=index``
+    share their cache entry. The order of other lists (e.g. the ``h`` columns
+    of the cat APIs) shows in the response, and is left alone.
+    """
+    parts = urlsplit(target)
+    params = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if NOOP_PARAMS.get(name) == value:
+            continue
+        if name in UNORDERED_PARAMS:
+            value = ",".join(sorted(value.split(",")))
+        params.append((name, value))
+    params.sort(key=lambda param: param[0])  # Stable: repeated parameters keep order
+    query = "&".join(f"{name}={quote(value, ',*')}" for name, value in params)
+    return f"{parts.path}?{query}" if query else parts.path
+
+
 def _make_cache_key(
     method: str,
     target: str,
@@ -40,116 +99,467 @@ def _make_cache_key(
     return h.digest()  # 32 bytes
 
 
-def _serialize(response: NodeApiResponse) -> str:
-    return _canon_json(
-        {
-            "status": response.meta.status,
-            "headers": dict(response.meta.headers),
-            "http_version": response.meta.http_version,
-            "body": response.body.decode("utf-8", errors="replace"),
-        }
+def _create_table(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            cache_key         BLOB PRIMARY KEY,      -- 32 bytes blake3
+            method            TEXT NOT NULL,
+            target            TEXT NOT NULL,
+            headers_json      TEXT NOT NULL,         -- request headers, see the key
+            status            INTEGER NOT NULL,
+            http_version      TEXT NOT NULL,
+            response_headers  TEXT NOT NULL,         -- JSON object
+            duration          REAL NOT NULL,         -- seconds the request took
+            codec             TEXT NOT NULL,         -- see compression.py
+            body              BLOB NOT NULL,
+            stored_at         INTEGER NOT NULL,      -- epoch seconds
+            ttl               INTEGER NOT NULL,      -- seconds
+            last_access       INTEGER NOT NULL,      -- epoch seconds
+            size              INTEGER NOT NULL,      -- bytes stored
+            max_stale         INTEGER NOT NULL DEFAULT 0, -- seconds past the TTL
+            -- Cluster state the response was fetched under, if it derives from it
+            cluster_uuid      TEXT,
+            state_version     INTEGER
+        ) WITHOUT ROWID;
+    """
+    )
+    # Helpful secondary index if you ever want to purge by method/target.
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_method_target ON {table}(method, target);"
+    )
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table}(last_access);"
     )
 
 
-def _deserialize(s: str) -> NodeApiResponse:
-    d = orjson.loads(s)
-    return NodeApiResponse(
-        body=d["body"].encode("utf-8"),
-        meta=ApiResponseMeta(
-            status=d["status"],
-            headers=d["headers"],
-            http_version=d["http_version"],
-            node=None,  # type: ignore[arg-type]
-            duration=0.0,  # type: ignore[arg-type
-        ),
+def _insert(
+    conn: sqlite3.Connection, table: str, row: dict[str, Any], replace: bool = False
+) -> None:
+    """Insert ``row``, columns it does not set get their default."""
+    conn.execute(
+        f"INSERT {'OR REPLACE ' if replace else ''}INTO {table} "
+        f"({', '.join(row)}) VALUES ({', '.join('?' * len(row))});",
+        tuple(row.values()),
     )
 
 
-class Cache:
-    @staticmethod
-    def get_ttl(key: str) -> int:
-        """Return TTL in seconds for a given cache key."""
-        cache_config_path = ESCTL_TTL_CONFIG_PATH
-        if not cache_config_path.exists():
-            return 300  # default 5 minutes
-        cache_config = orjson.loads(cache_config_path.read_bytes())
-        for pattern, ttl in cache_config.items():
-            if re.search(pattern, key):
-                return int(ttl)
-        else:
-            return 300  # default 5 minutes
+def _migrate_to_binary(conn: sqlite3.Connection) -> None:
+    """Convert the JSON text responses of schema 0 to compressed bodies."""
+    for table in _cache_tables(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+        # Tables created before size-bounded eviction have no last access
+        last_access = "last_access" if "last_access" in columns else "stored_at"
+        conn.execute(f"DROP INDEX IF EXISTS {table}_method_target;")
+        conn.execute(f"DROP INDEX IF EXISTS {table}_last_access;")
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy;")
+        _create_table(conn, table)
+        rows = conn.execute(
+            "SELECT cache_key, method, target, headers_json, response, stored_at, "
+            f"ttl, {last_access} FROM {table}_legacy;"
+        )
+        for key, method, target, headers_c, response, stored_at, ttl, access in rows:
+            d = orjson.loads(response)
+            _insert(
+                conn,
+                table,
+                {
+                    "cache_key": key,
+                    "method": method,
+                    "target": target,
+                    "headers_json": headers_c,
+                    **_encode(
+                        d["status"],
+                        d["http_version"],
+                        d["headers"],
+                        d.get("duration", 0.0),
+                        d["body"].encode("utf-8"),
+                    ),
+                    "stored_at": stored_at,
+                    "ttl": ttl,
+                    "last_access": access,
+                },
+            )
+        conn.execute(f"DROP TABLE {table}_legacy;")
+
+
+def _add_max_stale(conn: sqlite3.Connection) -> None:
+    """Let responses be served stale past their TTL."""
+    for table in _cache_tables(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+        if "max_stale" not in columns:
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN max_stale INTEGER NOT NULL DEFAULT 0;"
+            )
+
+
+def _add_cluster_state(conn: sqlite3.Connection) -> None:
+    """Tag responses with the cluster state they were fetched under."""
+    for table in _cache_tables(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+        if "cluster_uuid" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN cluster_uuid TEXT;")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN state_version INTEGER;")
+
+
+# Version of the cache tables, stored as the database's user_version:
+# 0. JSON envelope of the response stored as text
+# 1. Compressed body and response metadata in separate columns
+# 2. Maximum staleness of the responses
+# 3. Cluster state of the responses
+MIGRATIONS = [_migrate_to_binary, _add_max_stale, _add_cluster_state]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    if conn.execute("PRAGMA user_version;").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # The connection is in autocommit mode, run the migrations in one
+    # transaction, which also keeps concurrent processes from racing
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+        for migration in MIGRATIONS[version:]:
+            logger.debug("Migrating the cache database: %s", migration.__doc__)
+            migration(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+        conn.execute("COMMIT;")
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def _encode(
+    status: int,
+    http_version: str,
+    headers: Mapping[str, str],
+    duration: float,
+    body: bytes,
+) -> dict[str, Any]:
+    """Column values of a response."""
+    headers_json = orjson.dumps(dict(headers)).decode("utf-8")
+    codec, data = compress(body)
+    return {
+        "status": status,
+        "http_version": http_version,
+        "response_headers": headers_json,
+        "duration": duration,
+        "codec": codec,
+        "body": data,
+        "size": len(headers_json) + len(data),
+    }
+
+
+def connect() -> sqlite3.Connection:
+    """Open a connection to the shared cache database with esctl's pragmas.
+
+    Connections may be shared between threads (e.g. by the session registry);
+    SQLite serializes access to them.
+    """
+    conn = sqlite3.connect(
+        ESCTL_CACHE_DB_PATH, autocommit=True, check_same_thread=False
+    )
+    # Only effective on a new database, see compact() for existing ones
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB, safe default
+    _migrate(conn)
+    return conn
 
+
+def _cache_tables(conn: sqlite3.Connection) -> list[str]:
+    return [
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name GLOB 'http_cache_*';"
+        )
+    ]
+
+
+def _evict(conn: sqlite3.Connection, tables: list[str], max_size: int) -> int:
+    """Evict the least recently used responses of ``tables`` beyond ``max_size`` bytes."""
+    if not tables:
+        return 0
+    entries = " UNION ALL ".join(
+        f"SELECT '{table}' AS tbl, cache_key, last_access, size FROM {table}"
+        for table in tables
+    )
+    evicted = conn.execute(
+        f"""
+        SELECT tbl, cache_key FROM (
+            SELECT tbl, cache_key, SUM(size) OVER (
+                ORDER BY last_access DESC, cache_key
+            ) AS total
+            FROM ({entries})
+        ) WHERE total > ?;
+        """,
+        (max_size,),
+    ).fetchall()
+    with conn:
+        for table in tables:
+            conn.executemany(
+                f"DELETE FROM {table} WHERE cache_key = ?;",
+                [(key,) for tbl, key in evicted if tbl == table],
+            )
+    return len(evicted)
+
+
+def compact(conn: sqlite3.Connection, force: bool = False) -> bool:
+    """Purge expired responses, enforce the size limits and give space back.
+
+    Runs at most once every ``ESCTL_CACHE_COMPACTION_INTERVAL`` seconds across
+    all esctl processes, unless ``force`` is set. Returns whether it ran.
+    """
+    now = int(time.time())
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_compaction "
+            "(id INTEGER PRIMARY KEY CHECK (id = 0), last_run INTEGER NOT NULL);"
+        )
+        conn.execute("INSERT OR IGNORE INTO cache_compaction VALUES (0, 0);")
+        # Claiming the run atomically keeps concurrent processes from all doing it
+        claimed = conn.execute(
+            "UPDATE cache_compaction SET last_run = ? WHERE last_run <= ?;",
+            (now, now if force else now - ESCTL_CACHE_COMPACTION_INTERVAL),
+        ).rowcount
+    if not claimed:
+        return False
+    tables = _cache_tables(conn)
+    with conn:
+        for table in tables:
+            conn.execute(
+                f"DELETE FROM {table} WHERE stored_at + ttl + max_stale <= ?;",
+                (now,),
+            )
+    evicted = sum(
+        _evict(conn, [table], ESCTL_CACHE_CONTEXT_MAX_SIZE * MiB) for table in tables
+    )
+    evicted += _evict(conn, tables, ESCTL_CACHE_MAX_SIZE * MiB)
+    logger.debug("Cache compaction evicted %d responses", evicted)
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+        # Databases created before incremental vacuum was enabled need a full
+        # VACUUM, once, for the setting to apply
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("VACUUM;")
+    else:
+        conn.execute("PRAGMA incremental_vacuum;")
+    return True
+
+
+def _staleness(
+    stored_at: int,
+    ttl: int,
+    max_stale: int,
+    cluster_uuid: Optional[str],
+    state_version: Optional[int],
+    state: Optional[ClusterState],
+) -> Optional[bool]:
+    """Whether a cached response is stale, None if it must not be served anymore."""
+    if (
+        state is not None
+        and cluster_uuid is not None
+        and (cluster_uuid, state_version) != state
+    ):
+        return None
+    age = int(time.time()) - stored_at
+    if age >= ttl + max_stale:
+        return None
+    return age >= ttl
+
+
+def _copy(response: NodeApiResponse) -> NodeApiResponse:
+    """Copy of a cached response, for callers to modify (e.g. its duration)."""
+    meta = dataclasses.replace(response.meta, headers=response.meta.headers.copy())
+    return NodeApiResponse(meta, response.body)
+
+
+class Cache:
     def __init__(self, context_name: str, enabled: bool = True):
         self.db_path = ESCTL_CACHE_DB_PATH
         self.enabled = enabled
-        self.conn = sqlite3.connect(self.db_path, autocommit=True)
-        self.conn.execute("PRAGMA journal_mode=WAL;")
-        self.conn.execute("PRAGMA synchronous=NORMAL;")
-        self.conn.execute("PRAGMA temp_store=MEMORY;")
-        self.conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB, safe default
+        self.conn = connect()
         self.context_name = re.sub(r"[^a-zA-Z0-9_]", "_", context_name)
+        # Last access of the responses served, written in batches
+        self._touched: dict[bytes, int] = {}
+        self._touch_lock = threading.Lock()
+        self._last_touch_flush = time.monotonic()
         self._initialize_db()
+        self.stats = CacheStats(self.conn, self.context_name)
+        self.cluster_state = ClusterStateTracker()
+        self.memory = MemoryCache(ESCTL_CACHE_MEMORY_SIZE * MiB)
+        # Generation of the cache the responses in memory belong to, see
+        # _check_generation
+        self._generation = self._read_generation()
 
     def _initialize_db(self):
         with self.conn:
+            _create_table(self.conn, f"http_cache_{self.context_name}")
             self.conn.execute(
-                f"""
-                CREATE TABLE IF NOT EXISTS http_cache_{self.context_name} (
-                    cache_key     BLOB PRIMARY KEY,      -- 32 bytes blake3
-                    method        TEXT NOT NULL,
-                    target          TEXT NOT NULL,
-                    headers_json  TEXT NOT NULL,
-                    response      TEXT NOT NULL,
-                    stored_at     INTEGER NOT NULL,       -- epoch seconds
-                    ttl           INTEGER NOT NULL        -- seconds
+                """
+                CREATE TABLE IF NOT EXISTS http_inflight (
+                    context       TEXT NOT NULL,
+                    cache_key     BLOB NOT NULL,
+                    pid           INTEGER NOT NULL,
+                    expires_at    REAL NOT NULL,         -- epoch seconds
+                    PRIMARY KEY (context, cache_key)
                 ) WITHOUT ROWID;
             """
             )
-        with self.conn:
-            # Helpful secondary index if you ever want to purge by method/target.
             self.conn.execute(
-                f"""
-                CREATE INDEX IF NOT EXISTS http_cache_{self.context_name}_method_target
-                ON http_cache_{self.context_name}(method, target);
+                """
+                CREATE TABLE IF NOT EXISTS http_generations (
+                    context       TEXT PRIMARY KEY,
+                    generation    INTEGER NOT NULL      -- bumped on invalidation
+                ) WITHOUT ROWID;
             """
             )
 
-    def get(
+    def _read_generation(self) -> int:
+        row = self.conn.execute(
+            "SELECT generation FROM http_generations WHERE context = ?;",
+            (self.context_name,),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self) -> None:
+        """Tell the other processes their responses in memory may be outdated."""
+        self.conn.execute(
+            "INSERT INTO http_generations VALUES (?, 1) "
+            "ON CONFLICT (context) DO UPDATE SET generation = generation + 1;",
+            (self.context_name,),
+        )
+        generation = self._read_generation()
+        if generation != self._generation + 1:
+            # Bumped by another process as well since the last check
+            self.memory.clear()
+        self._generation = generation
+
+    def _check_generation(self) -> None:
+        """Drop the responses in memory if another process invalidated any.
+
+        Invalidations (of the reads outdated by a write, or all of them with
+        ``esctl config cache purge``) only reach the database. Other processes,
+        like the agent or ``esctl shell``, find out through the generation of
+        the cache, which they bump.
+        """
+        if not len(self.memory):
+            return
+        generation = self._read_generation()
+        if generation != self._generation:
+            self.memory.clear()
+            self._generation = generation
+
+    def lookup(
         self,
         method: str,
         target: str,
         headers: Optional[Mapping[str, Any]] = None,
-    ) -> Optional[NodeApiResponse]:
-        """Return cached response if fresh, else None (and evict if expired)."""
+        state: Optional[ClusterState] = None,
+    ) -> tuple[Optional[NodeApiResponse], bool]:
+        """Return the cached response and whether it is stale, i.e. past its TTL.
+
+        Stale responses are returned until they are ``max_stale`` seconds past
+        their TTL, then evicted. Responses tagged with a cluster state other
+        than the current ``state`` are evicted as well. The duration of a
+        cached response is the one of the original request.
+        """
         if method.upper() not in ("GET", "HEAD"):
-            return None
+            return None, False
         if not self.enabled:
-            return None
+            return None, False
+        target = _canon_target(target)
         headers_c = _canon_json(_canon_headers(headers))
+        memory_key = (method, target, headers_c)
+        self._check_generation()
+        entry = self.memory.get(memory_key)
+        if entry is not None:
+            stale = _staleness(
+                entry.stored_at,
+                entry.ttl,
+                entry.max_stale,
+                entry.cluster_uuid,
+                entry.state_version,
+                state,
+            )
+            if stale is not None:
+                self._touch(entry.cache_key)
+                self.stats.l1_hit(method, target)
+                return _copy(entry.response), stale
+            self.memory.pop(memory_key)
         key = _make_cache_key(method, target, headers_c)
 
         row = self.conn.execute(
-            "SELECT response, stored_at, ttl, headers_json "
-            "FROM http_cache WHERE cache_key = ?;",
+            "SELECT status, http_version, response_headers, duration, codec, body, "
+            "stored_at, ttl, max_stale, cluster_uuid, state_version, headers_json "
+            f"FROM http_cache_{self.context_name} WHERE cache_key = ?;",
             (key,),
         ).fetchone()
 
         if not row:
-            return None
+            return None, False
 
-        response, stored_at, ttl, headers_c_db = row
+        status, http_version, response_headers, duration, codec, data, *rest = row
+        stored_at, ttl, max_stale, cluster_uuid, state_version, headers_c_db = rest
 
         # Paranoia check to guard against theoretical hash collisions
         if headers_c_db != headers_c:
             # Collision or inconsistent canonicalization -> act as a miss
-            return None
+            return None, False
 
-        if int(time.time()) < stored_at + int(ttl):
-            return _deserialize(response)
+        stale = _staleness(
+            stored_at, ttl, max_stale, cluster_uuid, state_version, state
+        )
+        if stale is not None:
+            try:
+                body = decompress(codec, data)
+            except ValueError as e:
+                # e.g. stored by an esctl with zstd support, and this one has none
+                logger.debug("Ignoring cached response: %s", e)
+                return None, False
+            self._touch(key)
+            response = NodeApiResponse(
+                body=body,
+                meta=ApiResponseMeta(
+                    status=status,
+                    headers=HttpHeaders(orjson.loads(response_headers)),
+                    http_version=http_version,
+                    node=None,  # type: ignore[arg-type]
+                    duration=duration,
+                ),
+            )
+            self.memory.put(
+                memory_key,
+                MemoryEntry(
+                    response,
+                    key,
+                    target,
+                    stored_at,
+                    ttl,
+                    max_stale,
+                    cluster_uuid,
+                    state_version,
+                    len(body),
+                ),
+            )
+            return _copy(response), stale
 
-        # Expired: evict and miss
+        # Expired, or fetched under another cluster state: evict and miss
+        self.stats.expiration(method, target)
         self.delete(method, target, headers=headers)
-        return None
+        return None, False
+
+    def get(
+        self,
+        method: str,
+        target: str,
+        headers: Optional[Mapping[str, Any]] = None,
+    ) -> Optional[NodeApiResponse]:
+        """Return cached response if fresh, else None (and evict if expired)."""
+        response, stale = self.lookup(method, target, headers)
+        return None if stale else response
 
     def set(
         self,
@@ -159,22 +569,87 @@ class Cache:
         *,
         headers: Optional[Mapping[str, Any]] = None,
         ttl: Optional[int] = None,
+        max_stale: Optional[int] = None,
+        state: Optional[ClusterState] = None,
     ) -> None:
-        """Insert/refresh cache entry."""
+        """Insert/refresh cache entry, by default with the TTL of its rule.
+
+        ``state`` is the cluster state the response was fetched under, if it
+        derives from it, see ``lookup``.
+        """
         if method.upper() not in ("GET", "HEAD"):
             return
         if not self.enabled:
             return
+        target = _canon_target(target)
         headers_c = _canon_json(_canon_headers(headers))
         key = _make_cache_key(method, target, headers_c)
-        ttl = int(ttl if ttl is not None else 300)  # default 5 minutes
-        response_str = _serialize(response)
+        if ttl is None:
+            rule = ttl_policy().resolve(method, target)
+            ttl, max_stale = rule.ttl, rule.max_stale
+        max_stale = int(max_stale or 0)
+        columns = _encode(
+            response.meta.status,
+            response.meta.http_version,
+            response.meta.headers,
+            # How long the request took, i.e. what a cache hit saves
+            response.meta.duration,
+            response.body,
+        )
+        now = int(time.time())
         with self.conn:
-            self.conn.execute(
-                f"INSERT OR REPLACE INTO http_cache_{self.context_name} "
-                "(cache_key, method, target, headers_json, response, stored_at, ttl) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?);",
-                (key, method, target, headers_c, response_str, int(time.time()), ttl),
+            _insert(
+                self.conn,
+                f"http_cache_{self.context_name}",
+                {
+                    "cache_key": key,
+                    "method": method,
+                    "target": target,
+                    "headers_json": headers_c,
+                    **columns,
+                    "stored_at": now,
+                    "ttl": ttl,
+                    "last_access": now,
+                    "max_stale": max_stale,
+                    "cluster_uuid": state.cluster_uuid if state else None,
+                    "state_version": state.version if state else None,
+                },
+                replace=True,
+            )
+        self.memory.put(
+            (method, target, headers_c),
+            MemoryEntry(
+                _copy(response),
+                key,
+                target,
+                now,
+                ttl,
+                max_stale,
+                state.cluster_uuid if state else None,
+                state.version if state else None,
+                len(response.body),
+            ),
+        )
+
+    def _touch(self, key: bytes) -> None:
+        with self._touch_lock:
+            self._touched[key] = int(time.time())
+        # Long-lived processes (e.g. the agent) never close their caches
+        if time.monotonic() - self._last_touch_flush > FLUSH_INTERVAL:
+            self.flush_touches()
+
+    def flush_touches(self) -> None:
+        """Write the last access of the responses served since the last flush."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._last_touch_flush = time.monotonic()
+        if not touched:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"UPDATE http_cache_{self.context_name} "
+                "SET last_access = ? WHERE cache_key = ?;",
+                [(last_access, key) for key, last_access in touched.items()],
             )
 
     def delete(
@@ -185,14 +660,115 @@ class Cache:
         headers: Optional[Mapping[str, Any]] = None,
     ) -> None:
         """Remove a single cache entry."""
+        target = _canon_target(target)
         headers_c = _canon_json(_canon_headers(headers))
         key = _make_cache_key(method, target, headers_c)
+        self.memory.pop((method, target, headers_c))
         with self.conn:
             self.conn.execute(
                 f"DELETE FROM http_cache_{self.context_name} WHERE cache_key = ?;",
                 (key,),
             )
 
+    def acquire(
+        self,
+        method: str,
+        target: str,
+        *,
+        headers: Optional[Mapping[str, Any]] = None,
+        timeout: float,
+    ) -> bool:
+        """Take the lease to fetch a response, False if another fetch holds it.
+
+        Leases are shared by every esctl process, so that only one of them
+        sends a given request while the others wait for its response to be
+        cached. A lease not released after ``timeout`` seconds (e.g. its
+        process died) can be taken over.
+        """
+        target = _canon_target(target)
+        headers_c = _canon_json(_canon_headers(headers))
+        key = _make_cache_key(method, target, headers_c)
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM http_inflight "
+                "WHERE context = ? AND cache_key = ? AND expires_at < ?;",
+                (self.context_name, key, now),
+            )
+            return bool(
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO http_inflight VALUES (?, ?, ?, ?);",
+                    (self.context_name, key, os.getpid(), now + timeout),
+                ).rowcount
+            )
+
+    def release(
+        self,
+        method: str,
+        target: str,
+        *,
+        headers: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        target = _canon_target(target)
+        headers_c = _canon_json(_canon_headers(headers))
+        key = _make_cache_key(method, target, headers_c)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM http_inflight WHERE context = ? AND cache_key = ?;",
+                (self.context_name, key),
+            )
+
+    def entries(self) -> list[tuple[str, str, int]]:
+        """Method, target and size in bytes of every stored response."""
+        return self.conn.execute(
+            f"SELECT method, target, size FROM http_cache_{self.context_name};"
+        ).fetchall()
+
+    def invalidate(self, invalidation: Invalidation) -> int:
+        """Drop the cached reads made outdated by a write, return how many."""
+        self.memory.discard(lambda entry: invalidation.covers(entry.target))
+        table = f"http_cache_{self.context_name}"
+        keys: list[tuple[bytes]] = []
+        for prefix in invalidation.prefixes:
+            # Range scans of the (method, target) index
+            keys += self.conn.execute(
+                f"SELECT cache_key FROM {table} WHERE method IN ('GET', 'HEAD') "
+                "AND target >= ? AND target < ?;",
+                (prefix, prefix + "\U0010ffff"),
+            ).fetchall()
+        if invalidation.indices:
+            # Reads of indices, including all of them with GET /_all/...
+            keys += [
+                (key,)
+                for key, target in self.conn.execute(
+                    f"SELECT cache_key, target FROM {table} "
+                    "WHERE method IN ('GET', 'HEAD') "
+                    "AND (target NOT GLOB '/_*' OR target GLOB '/_all*');"
+                )
+                if matches_indices(target, invalidation.indices)
+            ]
+        with self.conn:
+            self.conn.executemany(f"DELETE FROM {table} WHERE cache_key = ?;", keys)
+        self._bump_generation()
+        return len(keys)
+
     def clear(self) -> None:
+        self.memory.clear()
         with self.conn:
             self.conn.execute(f"DELETE FROM http_cache_{self.context_name};")
+        self._bump_generation()
+
+    def close(self) -> None:
+        """Flush pending writes and, when due, compact the database.
+
+        Caches are closed once the command is done, so compaction does not
+        delay its output.
+        """
+        self.flush_touches()
+        self.stats.flush()
+        try:
+            compact(self.conn)
+        except sqlite3.OperationalError as e:
+            # e.g. another process holds the database, it will be done next time
+            logger.debug("Cache compaction failed: %s", e)
+        self.conn.close()
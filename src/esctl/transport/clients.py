@@ -0,0 +1,87 @@
+import logging
+from typing import Any
+
+from elasticsearch8 import ApiError as ApiError8
+from elasticsearch8 import Elasticsearch as Elasticsearch8
+from elasticsearch9 import ApiError as ApiError9
+from elasticsearch9 import Elasticsearch as Elasticsearch9
+
+from .session import sessions
+
+
+logger = logging.getLogger("esctl")
+
+# What ``options()`` carries over from one client to its clones
+_OPTIONS = (
+    "_headers",
+    "_request_timeout",
+    "_ignore_status",
+    "_max_retries",
+    "_retry_on_status",
+    "_retry_on_timeout",
+)
+
+
+def _is_version_mismatch(error: ApiError8 | ApiError9) -> bool:
+    return error.meta.status == 400 and "media_type_header_exception" in str(error.body)
+
+
+class RedetectingClient:
+    """Rebuild the client when the cluster rejects its version headers.
+
+    The major version of the cluster is persisted, so a cluster upgraded or
+    swapped in the meantime is only noticed when it answers a request with a
+    ``media_type_header_exception``. The client of the context is then rebuilt
+    in the session registry, which probes the cluster afresh, and the request
+    is retried once through it. Clients already handed out (and their
+    ``options()`` clones) forward their later requests to the new one.
+    """
+
+    def __init__(self, *args, context: tuple[str, bool] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._context = context
+
+    def options(self, *args, **kwargs) -> Any:
+        client = super().options(*args, **kwargs)  # type: ignore[misc]
+        client._context = self._context
+        return client
+
+    def _replacement(self) -> Any:
+        """A clone of the registry's client for the context, with our options."""
+        current = sessions.current_client(*self._context)  # type: ignore[misc]
+        if current is None or current.transport is self.transport:  # type: ignore[attr-defined]
+            return None
+        clone = current.options()
+        for option in _OPTIONS:
+            setattr(clone, option, getattr(self, option))
+        return clone
+
+    def perform_request(self, *args, **kwargs) -> Any:
+        if self._context is None:
+            return super().perform_request(*args, **kwargs)  # type: ignore[misc]
+        client = self._replacement() or self
+        try:
+            return super(RedetectingClient, client).perform_request(*args, **kwargs)  # type: ignore[misc]
+        except (ApiError8, ApiError9) as e:
+            if not _is_version_mismatch(e):
+                raise
+            logger.warning(
+                "Cluster version changed for context %s, rebuilding its client",
+                self._context[0],
+            )
+            current = sessions.current_client(*self._context)
+            if current is not None and current.transport is client.transport:
+                # Not rebuilt by another thread in the meantime
+                sessions.rebuild_client(*self._context)
+            client = self._replacement()
+            if client is None:
+                raise
+            return super(RedetectingClient, client).perform_request(*args, **kwargs)
+
+
+class Elasticsearch8Client(RedetectingClient, Elasticsearch8):
+    pass
+
+
+class Elasticsearch9Client(RedetectingClient, Elasticsearch9):
+    pass
@@ -0,0 +1,88 @@
+import logging
+import re
+import threading
+import time
+from typing import Callable, NamedTuple
+from urllib.parse import urlsplit
+
+from elastic_transport._node._base import NodeApiResponse
+import orjson
+
+from esctl.constants import ESCTL_CLUSTER_STATE_CHECK_INTERVAL
+
+
+logger = logging.getLogger("esctl")
+
+STATE_VERSION_TARGET = "/_cluster/state/version"
+
+# Responses derived from the cluster metadata: indices, aliases, data streams,
+# templates, settings and mappings. They only change along with the cluster state.
+METADATA_PATH = re.compile(
+    r"""^/(
+        (
+            _cat/(indices|aliases|templates)
+            | _cluster/settings
+            | ([^_/][^/]*/)?_(alias|aliases|mapping|mappings|settings)
+            | _(index_template|component_template|template|data_stream|resolve/index)
+        )(/.*)?
+        | [^_/][^/]*  # GET /<index>
+    )$""",
+    re.VERBOSE,
+)
+
+
+def is_metadata_derived(method: str, target: str) -> bool:
+    return method.upper() in ("GET", "HEAD") and bool(
+        METADATA_PATH.match(urlsplit(target).path)
+    )
+
+
+class ClusterState(NamedTuple):
+    cluster_uuid: str
+    version: int
+
+
+class ClusterStateTracker:
+    """The cluster state version of a context, as last seen by this process.
+
+    Cached metadata-derived responses are tagged with the state they were
+    fetched under, and only served while it is still the current one. Checking
+    it costs one small request, made at most once every
+    ``ESCTL_CLUSTER_STATE_CHECK_INTERVAL`` seconds: in practice once per
+    command, and regularly in the agent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: ClusterState | None = None
+        self._checked_at: float | None = None
+
+    def current(self, fetch: Callable[[str], NodeApiResponse]) -> ClusterState | None:
+        """Return the current state, using ``fetch`` to check it when due.
+
+        None if the cluster does not tell (e.g. missing privileges), in which
+        case responses are neither tagged nor invalidated.
+        """
+        with self._lock:
+            if (
+                self._checked_at is not None
+                and time.monotonic() - self._checked_at
+                < ESCTL_CLUSTER_STATE_CHECK_INTERVAL
+            ):
+                return self._state
+            try:
+                response = fetch(STATE_VERSION_TARGET)
+                if response.meta.status != 200:
+                    raise ValueError(f"HTTP {response.meta.status}")
+                body = orjson.loads(response.body)
+                self._state = ClusterState(body["cluster_uuid"], int(body["version"]))
+            except Exception as e:
+                logger.debug("Could not check the cluster state version: %s", e)
+                self._state = None
+            self._checked_at = time.monotonic()
+            return self._state
+
+    def forget(self) -> None:
+        """Check the state again on next use, e.g. after a write."""
+        with self._lock:
+            self._checked_at = None
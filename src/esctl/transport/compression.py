@@ -0,0 +1,52 @@
+"""Compression of the response bodies stored in the cache.
+
+zstd is used when available (``compression.zstd`` from Python 3.14, or the
+``zstandard`` package), zlib otherwise. Every body records its codec, so a
+cache database stays readable whichever of them is installed.
+"""
+
+import zlib
+
+try:
+    from compression.zstd import (  # type: ignore[import-not-found]
+        compress as zstd_compress,
+        decompress as zstd_decompress,
+    )
+except ImportError:
+    try:
+        from zstandard import (  # type: ignore[no-redef]
+            compress as zstd_compress,
+            decompress as zstd_decompress,
+        )
+    except ImportError:
+        zstd_compress = zstd_decompress = None  # type: ignore[assignment]
+
+
+IDENTITY = "identity"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+# Bodies smaller than this are not worth the round-trip through a compressor
+MIN_SIZE = 512
+
+
+def compress(body: bytes) -> tuple[str, bytes]:
+    """Return the codec used and the compressed ``body``."""
+    if len(body) < MIN_SIZE:
+        return IDENTITY, body
+    if zstd_compress is not None:
+        return ZSTD, zstd_compress(body)
+    return ZLIB, zlib.compress(body, 1)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Raise ValueError if ``codec`` is unknown or not available here."""
+    match codec:
+        case "identity":
+            return data
+        case "zlib":
+            return zlib.decompress(data)
+        case "zstd" if zstd_decompress is not None:
+            return zstd_decompress(data)
+        case _:
+            raise ValueError(f"Cannot decompress {codec} cache entries")
@@ -0,0 +1,230 @@
+from base64 import b64decode
+from typing import NamedTuple
+
+from kubernetes import client as kube_client
+
+from esctl.constants import ESCTL_KUBE_DISCOVERY_TTL
+from esctl.utils import EsctlError
+
+from .metadata import MetadataStore
+
+
+DISCOVERY_KIND = "eck_discovery"
+IN_CLUSTER_DISCOVERY_KIND = "eck_discovery_in_cluster"
+CLUSTER_LABEL = "elasticsearch.k8s.elastic.co/cluster-name"
+
+
+class DiscoveryError(EsctlError):
+    """The pods or the credentials of an ECK cluster cannot be found."""
+
+
+class ECKDiscovery(NamedTuple):
+    # Pods to spread requests across
+    pod_names: list[str]
+    # The ECK HTTP service, resolvable from inside the cluster
+    service_host: str
+    username: str
+    password: str
+    # PEM CA of the HTTP service, None when its TLS is disabled
+    ca_certificate: str | None = None
+
+
+class ECKLocation(NamedTuple):
+    """What is stored of a discovery: where to find the cluster, not its secrets."""
+
+    pod_names: list[str]
+    service_host: str
+    namespace: str
+    # Secret holding the elastic user credentials
+    user_secret: str
+    # Secret holding the CA of the HTTP service, None when its TLS is disabled
+    ca_secret: str | None = None
+
+
+def _elastic_user_secret(
+    k8s_api: kube_client.CoreV1Api, namespace: str, es_name: str
+) -> tuple[str, dict[str, str]]:
+    """Find the secret ECK stores the ``elastic`` user in, return its name and data."""
+    name = f"{es_name}-es-elastic-user"
+    try:
+        return name, k8s_api.read_namespaced_secret(name, namespace).data
+    except kube_client.ApiException as e:
+        if e.status != 404:
+            raise
+    # Not the standard ECK name: fall back to looking it up by labels.
+    secrets = k8s_api.list_namespaced_secret(
+        namespace=namespace,
+        label_selector=",".join(
+            (f"{CLUSTER_LABEL}={es_name}", "eck.k8s.elastic.co/credentials=true")
+        ),
+    )
+    secret = next(
+        (secret for secret in secrets.items if "elastic-user" in secret.metadata.name),
+        None,
+    )
+    if secret is None:
+        raise DiscoveryError(
+            f"No elastic user secret found for Elasticsearch cluster {es_name} "
+            f"in namespace {namespace}"
+        )
+    return secret.metadata.name, secret.data
+
+
+def _http_ca_secret(
+    k8s_api: kube_client.CoreV1Api, namespace: str, es_name: str
+) -> tuple[str, dict[str, str]] | None:
+    """Find the secret holding the CA ECK signed the HTTP service certificate with."""
+    name = f"{es_name}-es-http-certs-public"
+    try:
+        return name, k8s_api.read_namespaced_secret(name, namespace).data
+    except kube_client.ApiException as e:
+        if e.status != 404:
+            raise
+        return None  # TLS is disabled on the HTTP layer
+
+
+def _credentials(data: dict[str, str]) -> tuple[str, str]:
+    username = next(iter(data.keys()))
+    password = b64decode(next(iter(data.values()))).decode("utf-8")
+    return username, password
+
+
+def _ca_certificate(data: dict[str, str]) -> str:
+    return b64decode(data["ca.crt"]).decode("utf-8")
+
+
+def _is_ready(pod: kube_client.V1Pod) -> bool:
+    return any(
+        condition.type == "Ready" and condition.status == "True"
+        for condition in (pod.status.conditions or [])
+    )
+
+
+def _has_role(pod: kube_client.V1Pod, role: str) -> bool:
+    labels = pod.metadata.labels or {}
+    return labels.get(f"elasticsearch.k8s.elastic.co/node-{role}") == "true"
+
+
+def _serving_pods(pods: list[kube_client.V1Pod]) -> list[kube_client.V1Pod]:
+    """Pick the pods client traffic should go to.
+
+    Coordinating-only pods exist for that very purpose, then data pods can
+    take it. Dedicated masters are only used when nothing else is available,
+    so esctl does not add load to the nodes keeping the cluster together.
+    """
+    coordinating = [
+        pod
+        for pod in pods
+        if not any(_has_role(pod, role) for role in ("master", "data", "ingest"))
+    ]
+    data = [pod for pod in pods if _has_role(pod, "data")]
+    return coordinating or data or pods
+
+
+def _discover(
+    k8s_api: kube_client.CoreV1Api, namespace: str, es_name: str, in_cluster: bool
+) -> tuple[ECKLocation, ECKDiscovery]:
+    service_host = f"{es_name}-es-http.{namespace}.svc"
+    if in_cluster:
+        # The service is reachable directly, no need for any pod.
+        pod_names: list[str] = []
+        ca = _http_ca_secret(k8s_api, namespace, es_name)
+    else:
+        pods = k8s_api.list_namespaced_pod(
+            namespace=namespace, label_selector=f"{CLUSTER_LABEL}={es_name}"
+        ).items
+        # A cluster that is still starting is better than no cluster at all.
+        candidates = [pod for pod in pods if _is_ready(pod)] or pods
+        if not candidates:
+            raise DiscoveryError(
+                f"No pod found for Elasticsearch cluster {es_name} "
+                f"in namespace {namespace}"
+            )
+        pod_names = sorted(pod.metadata.name for pod in _serving_pods(candidates))
+        ca = None
+    user_secret, data = _elastic_user_secret(k8s_api, namespace, es_name)
+    location = ECKLocation(
+        pod_names=pod_names,
+        service_host=service_host,
+        namespace=namespace,
+        user_secret=user_secret,
+        ca_secret=None if ca is None else ca[0],
+    )
+    return location, ECKDiscovery(
+        pod_names,
+        service_host,
+        *_credentials(data),
+        ca_certificate=None if ca is None else _ca_certificate(ca[1]),
+    )
+
+
+def _read_secrets(
+    k8s_api: kube_client.CoreV1Api, location: ECKLocation
+) -> ECKDiscovery:
+    """Read the secrets of a stored discovery."""
+    read = k8s_api.read_namespaced_secret
+    ca_certificate = None
+    if location.ca_secret is not None:
+        ca_certificate = _ca_certificate(
+            read(location.ca_secret, location.namespace).data
+        )
+    return ECKDiscovery(
+        location.pod_names,
+        location.service_host,
+        *_credentials(read(location.user_secret, location.namespace).data),
+        ca_certificate=ca_certificate,
+    )
+
+
+def discover_eck(
+    context_name: str,
+    cache_enabled: bool,
+    k8s_api: kube_client.CoreV1Api,
+    namespace: str,
+    es_name: str,
+    in_cluster: bool = False,
+) -> ECKDiscovery:
+    """Find the pods and credentials to use for an ECK cluster.
+
+    In-cluster, the pods are not needed but the CA of the HTTP service is.
+
+    Where to find them is cached per context for a short while, sparing the
+    pod listing and the secret lookup on the critical path of every command.
+    The credentials and CA are never stored, only the names of their secrets:
+    they are read again each time. ``--no-cache`` always looks everything up.
+    """
+    kind = IN_CLUSTER_DISCOVERY_KIND if in_cluster else DISCOVERY_KIND
+    store = MetadataStore(context_name)
+    try:
+        if cache_enabled:
+            cached = store.get(kind)
+            if cached is not None and cached.keys() == set(ECKLocation._fields):
+                try:
+                    return _read_secrets(k8s_api, ECKLocation(**cached))
+                except kube_client.ApiException as e:
+                    if e.status != 404:
+                        raise
+                    # The secrets were replaced: look them up again
+        location, discovery = _discover(k8s_api, namespace, es_name, in_cluster)
+        store.set(kind, location._asdict(), ttl=ESCTL_KUBE_DISCOVERY_TTL)
+        return discovery
+    finally:
+        store.close()
+
+
+def forget_eck_discovery(context_name: str) -> None:
+    store = MetadataStore(context_name)
+    try:
+        store.delete(DISCOVERY_KIND)
+        store.delete(IN_CLUSTER_DISCOVERY_KIND)
+    finally:
+        store.close()
+
+
+def is_pod_gone(exception: kube_client.ApiException) -> bool:
+    """Whether a failed port-forward means the pod no longer exists.
+
+    Websocket handshake failures are reported with ``status=0`` and the HTTP
+    status in the reason.
+    """
+    return exception.status == 404 or "Handshake status 404" in str(exception.reason)
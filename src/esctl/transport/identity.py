@@ -0,0 +1,89 @@
+from typing import NamedTuple
+
+from elastic_transport import NodeConfig, Urllib3HttpNode
+from elastic_transport._node._base import NodeApiResponse
+import orjson
+
+from esctl.constants import ESCTL_CLUSTER_IDENTITY_TTL
+
+from .metadata import MetadataStore
+
+
+IDENTITY_KIND = "identity"
+
+
+class ClusterIdentity(NamedTuple):
+    major: int
+    cluster_uuid: str
+    node_name: str
+
+
+def _probe_cluster_identity(
+    node_class: type, scheme: str, host: str, port: int
+) -> ClusterIdentity:
+    """Probe ``GET /`` on the target and return what it says about the cluster.
+
+    The probe uses the *actual* target host/port so version detection works
+    against any endpoint (not just localhost:9200). It goes through a node of
+    ``node_class`` for its credentials, TLS and port-forward, but skips the
+    caching layer: the probe is neither stored nor counted in the stats.
+    """
+    node = node_class(NodeConfig(scheme, host, port))
+    try:
+        response = Urllib3HttpNode.perform_request(node, "GET", "/")
+    finally:
+        node.close()
+    body = orjson.loads(response.body)
+    version = body["version"]["number"]
+    return ClusterIdentity(
+        major=next(int(part) for part in version.split(".")),
+        cluster_uuid=body.get("cluster_uuid", ""),
+        node_name=body.get("name", ""),
+    )
+
+
+def detect_cluster_identity(
+    context_name: str,
+    cache_enabled: bool,
+    node_class: type,
+    scheme: str,
+    host: str,
+    port: int,
+) -> ClusterIdentity:
+    """Return the cluster identity for a context, probing only when needed.
+
+    The probed identity is persisted per context, so warm invocations skip the
+    ``GET /`` round trip entirely. ``--no-cache`` always probes (and refreshes
+    the persisted identity).
+    """
+    store = MetadataStore(context_name)
+    try:
+        if cache_enabled:
+            cached = store.get(IDENTITY_KIND)
+            if cached is not None:
+                return ClusterIdentity(**cached)
+        identity = _probe_cluster_identity(node_class, scheme, host, port)
+        store.set(IDENTITY_KIND, identity._asdict(), ttl=ESCTL_CLUSTER_IDENTITY_TTL)
+        return identity
+    finally:
+        store.close()
+
+
+def forget_cluster_identity(context_name: str) -> None:
+    store = MetadataStore(context_name)
+    try:
+        store.delete(IDENTITY_KIND)
+    finally:
+        store.close()
+
+
+def is_version_mismatch(response: NodeApiResponse) -> bool:
+    """Whether the server rejected the client's compatibility headers.
+
+    This is what a stale identity looks like: e.g. an ES 9 client (sending
+    ``compatible-with=9``) talking to a cluster that was downgraded or swapped
+    for an ES 8 one.
+    """
+    return (
+        response.meta.status == 400 and b"media_type_header_exception" in response.body
+    )
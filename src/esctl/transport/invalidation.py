@@ -0,0 +1,110 @@
+from fnmatch import fnmatchcase
+from typing import NamedTuple
+from urllib.parse import unquote, urlsplit
+
+
+# APIs called with POST to send a body, which nonetheless only read
+READ_ONLY_APIS = frozenset(
+    (
+        "_analyze",
+        "_count",
+        "_eql",
+        "_explain",
+        "_field_caps",
+        "_mget",
+        "_msearch",
+        "_mtermvectors",
+        "_search",
+        "_sql",
+        "_termvectors",
+        "_validate",
+    )
+)
+
+# Cluster-wide reads describing indices, outdated by any write to an index
+INDEX_LISTINGS = (
+    "/_alias",
+    "/_cat/aliases",
+    "/_cat/count",
+    "/_cat/health",
+    "/_cat/indices",
+    "/_cat/recovery",
+    "/_cat/segments",
+    "/_cat/shards",
+    "/_cluster/health",
+    "/_cluster/state",
+    "/_data_stream",
+    "/_mapping",
+    "/_resolve/index",
+    "/_settings",
+    "/_stats",
+)
+
+TEMPLATES = (
+    "/_cat/templates",
+    "/_component_template",
+    "/_index_template",
+    "/_template",
+)
+
+# Reads outdated by writes to an API, by its first path segment. Writes to
+# other APIs outdate the reads of the same API.
+API_READS: dict[str, tuple[str, ...]] = {
+    "_cluster": ("/_cluster", "/_cat/allocation", "/_cat/health", "/_cat/shards"),
+    "_component_template": TEMPLATES,
+    "_index_template": TEMPLATES,
+    "_snapshot": ("/_snapshot", "/_cat/repositories", "/_cat/snapshots"),
+    "_tasks": ("/_tasks", "/_cat/tasks"),
+    "_template": TEMPLATES,
+}
+
+# APIs whose writes may affect any index, the ones they target are in the body
+ANY_INDEX_APIS = frozenset(("_alias", "_aliases", "_bulk", "_data_stream", "_reindex"))
+
+
+class Invalidation(NamedTuple):
+    # Reads to drop, by target prefix
+    prefixes: tuple[str, ...] = ()
+    # Index expressions whose reads to drop: a cached ``GET /logs-*/_settings``
+    # is dropped by a write to ``logs-2``
+    indices: tuple[str, ...] = ()
+
+    def covers(self, target: str) -> bool:
+        """Whether the cached read of ``target`` is to be dropped."""
+        return target.startswith(self.prefixes) or (
+            bool(self.indices) and matches_indices(target, self.indices)
+        )
+
+
+def invalidation(method: str, target: str) -> Invalidation:
+    """Return the cached reads a request makes outdated, if it writes."""
+    if method.upper() in ("GET", "HEAD"):
+        return Invalidation()
+    segments = [unquote(s) for s in urlsplit(target).path.split("/") if s]
+    if not segments or READ_ONLY_APIS.intersection(segments):
+        return Invalidation()
+    api = segments[0]
+    if not api.startswith("_") or api == "_all":
+        return Invalidation(INDEX_LISTINGS, _index_patterns(api))
+    if api in ANY_INDEX_APIS or segments[-1] == "_restore":
+        return Invalidation(
+            (f"/{api}", *API_READS.get(api, ()), *INDEX_LISTINGS), ("*",)
+        )
+    return Invalidation(API_READS.get(api, (f"/{api}",)))
+
+
+def _index_patterns(expression: str) -> tuple[str, ...]:
+    return tuple("*" if i == "_all" else i for i in expression.split(","))
+
+
+def matches_indices(target: str, indices: tuple[str, ...]) -> bool:
+    """Whether ``target`` reads one of ``indices``, wildcards on either side."""
+    path = urlsplit(target).path.lstrip("/")
+    expression = unquote(path.split("/", 1)[0])
+    if not expression or (expression.startswith("_") and expression != "_all"):
+        return False
+    return any(
+        fnmatchcase(read, written) or fnmatchcase(written, read)
+        for read in _index_patterns(expression)
+        for written in indices
+    )
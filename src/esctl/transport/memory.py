@@ -0,0 +1,77 @@
+from collections import OrderedDict
+import threading
+from typing import Callable, Hashable, NamedTuple
+
+from elastic_transport._node._base import NodeApiResponse
+
+
+class MemoryEntry(NamedTuple):
+    response: NodeApiResponse
+    # Key of the response in cache.db
+    cache_key: bytes
+    target: str
+    stored_at: int
+    ttl: int
+    max_stale: int
+    cluster_uuid: str | None
+    state_version: int | None
+    size: int
+
+
+class MemoryCache:
+    """In-process LRU of cached responses, in front of ``cache.db``.
+
+    Entries are the responses of ``cache.db`` as they were decompressed, with
+    what it takes to apply the same expiry rules. Holding ``max_size`` bytes
+    of response bodies at most, it is mostly useful to long-lived processes
+    polling the same endpoints, like ``esctl shell`` or the agent.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, MemoryEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> MemoryEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: MemoryEntry) -> None:
+        if entry.size > self.max_size:
+            self.pop(key)
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def discard(self, predicate: Callable[[MemoryEntry], bool]) -> None:
+        """Drop every entry ``predicate`` is true for."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if predicate(entry):
+                    del self._entries[key]
+                    self.size -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -0,0 +1,75 @@
+import re
+import time
+from typing import Any
+
+import orjson
+
+from .cache import connect
+
+
+class MetadataStore:
+    """Per-context key/value store for small facts about a cluster.
+
+    Lives in ``cache.db`` next to the HTTP response cache, but unlike it, entries
+    are addressed by a ``kind`` (e.g. ``"identity"``) rather than by request, so
+    they survive ``config cache purge`` of the response cache.
+    """
+
+    def __init__(self, context_name: str):
+        self.conn = connect()
+        self.context_name = re.sub(r"[^a-zA-Z0-9_]", "_", context_name)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS context_metadata (
+                    context       TEXT NOT NULL,
+                    kind          TEXT NOT NULL,
+                    value_json    TEXT NOT NULL,
+                    stored_at     INTEGER NOT NULL,       -- epoch seconds
+                    ttl           INTEGER NOT NULL,       -- seconds
+                    PRIMARY KEY (context, kind)
+                ) WITHOUT ROWID;
+            """
+            )
+
+    def get(self, kind: str) -> Any | None:
+        """Return the stored value if fresh, else None (and evict if expired)."""
+        row = self.conn.execute(
+            "SELECT value_json, stored_at, ttl FROM context_metadata "
+            "WHERE context = ? AND kind = ?;",
+            (self.context_name, kind),
+        ).fetchone()
+        if not row:
+            return None
+        value_json, stored_at, ttl = row
+        if int(time.time()) < stored_at + int(ttl):
+            return orjson.loads(value_json)
+        self.delete(kind)
+        return None
+
+    def set(self, kind: str, value: Any, *, ttl: int) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO context_metadata "
+                "(context, kind, value_json, stored_at, ttl) VALUES (?, ?, ?, ?, ?);",
+                (
+                    self.context_name,
+                    kind,
+                    orjson.dumps(value).decode("utf-8"),
+                    int(time.time()),
+                    int(ttl),
+                ),
+            )
+
+    def delete(self, kind: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM context_metadata WHERE context = ? AND kind = ?;",
+                (self.context_name, kind),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
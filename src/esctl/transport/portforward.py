@@ -0,0 +1,59 @@
+import logging
+import socket
+import threading
+
+from kubernetes import client as kube_client
+from kubernetes.stream import portforward
+from kubernetes.stream.ws_client import PortForward
+
+
+logger = logging.getLogger("esctl")
+
+
+class PortForwardManager:
+    """Opens and supervises the port-forward streams to the pods of a cluster.
+
+    The Kubernetes port-forward protocol carries exactly one TCP stream per port
+    and websocket, so HTTP connections cannot share a stream concurrently.
+    Instead, nodes using the manager keep a single pooled connection per pod:
+    requests take turns on one long-lived stream, which is only reopened once
+    it broke (pod restarted, API server dropped the websocket, ...).
+    """
+
+    def __init__(self, api: kube_client.CoreV1Api, namespace: str):
+        self.api = api
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._streams: dict[tuple[str, int], PortForward] = {}
+
+    def open(self, pod_name: str, port: int) -> socket.socket:
+        """Return a socket connected to ``port`` on ``pod_name``.
+
+        Any previous stream to the same pod and port is closed first: its
+        connection is being replaced, so it is either broken or unused.
+        """
+        key = (pod_name, port)
+        with self._lock:
+            previous = self._streams.pop(key, None)
+            if previous is not None:
+                logger.debug("Reopening port-forward to %s:%s", pod_name, port)
+                previous.close()
+            pf: PortForward = portforward(
+                self.api.connect_get_namespaced_pod_portforward,
+                pod_name,
+                self.namespace,
+                ports=str(port),
+            )
+            self._streams[key] = pf
+            return pf.socket(port)
+
+    def is_alive(self, pod_name: str, port: int) -> bool:
+        with self._lock:
+            pf = self._streams.get((pod_name, port))
+        return pf is not None and pf.connected and pf.error(port) is None
+
+    def close(self) -> None:
+        with self._lock:
+            streams, self._streams = self._streams, {}
+        for pf in streams.values():
+            pf.close()
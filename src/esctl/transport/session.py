@@ -0,0 +1,144 @@
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from esctl.constants import ESCTL_BACKGROUND_EXIT_TIMEOUT
+
+from .cache import Cache
+
+
+logger = logging.getLogger("esctl")
+
+
+class SessionRegistry:
+    """Process-wide registry of clients and cache connections, one per context.
+
+    Building a client is not free: it loads credentials, sets up a connection
+    pool (and for some context types a tunnel or port-forward) and checks the
+    cluster identity. The registry makes sure that happens at most once per
+    context and process, and that everything is torn down in ``close``.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: dict[tuple[str, bool], Any] = {}
+        self._factories: dict[tuple[str, bool], Callable[[], Any]] = {}
+        self._caches: dict[tuple[str, bool], Cache] = {}
+        self._close_callbacks: list[Callable[[], None]] = []
+        self._background: dict[Any, threading.Thread] = {}
+        self._exit_hook = False
+
+    def client(
+        self, context_name: str, cache_enabled: bool, factory: Callable[[], Any]
+    ) -> Any:
+        """Return the client for a context, building it with ``factory`` once."""
+        key = (context_name, bool(cache_enabled))
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = factory()
+                self._factories[key] = factory
+            return self._clients[key]
+
+    def current_client(self, context_name: str, cache_enabled: bool) -> Any:
+        """The client registered for a context, if any."""
+        with self._lock:
+            return self._clients.get((context_name, bool(cache_enabled)))
+
+    def rebuild_client(self, context_name: str, cache_enabled: bool) -> Any:
+        """Build the client of a context afresh, with the factory it was built with.
+
+        The replaced client may still be in use by another thread: it is only
+        closed along with the registry.
+        """
+        key = (context_name, bool(cache_enabled))
+        with self._lock:
+            previous = self._clients[key]
+            self._clients[key] = self._factories[key]()
+            self._close_callbacks.append(previous.close)
+            return self._clients[key]
+
+    def open_contexts(self) -> list[tuple[str, bool]]:
+        """The ``(context name, cache enabled)`` pairs with a live client."""
+        with self._lock:
+            return list(self._clients)
+
+    def cache(self, context_name: str, enabled: bool = True) -> Cache:
+        """Return the shared cache connection for a context."""
+        key = (context_name, bool(enabled))
+        with self._lock:
+            if key not in self._caches:
+                self._caches[key] = Cache(context_name, enabled=enabled)
+            return self._caches[key]
+
+    def run_in_background(self, key: Any, task: Callable[[], None]) -> None:
+        """Run ``task`` in a thread, unless a task with the same key is running.
+
+        Threads are daemons: ``close`` waits for them. A process exiting
+        without closing the registry (e.g. shell completion) waits for them for
+        ``ESCTL_BACKGROUND_EXIT_TIMEOUT`` seconds at most, so that a slow
+        cluster does not hold its exit.
+        """
+
+        def run():
+            try:
+                task()
+            except Exception as e:
+                logger.debug("Background task %s failed: %s", key, e)
+            finally:
+                with self._lock:
+                    self._background.pop(key, None)
+
+        with self._lock:
+            if key in self._background:
+                return
+            thread = threading.Thread(target=run, daemon=True)
+            self._background[key] = thread
+            if not self._exit_hook:
+                atexit.register(self.wait_for_background, ESCTL_BACKGROUND_EXIT_TIMEOUT)
+                self._exit_hook = True
+        thread.start()
+
+    def wait_for_background(self, timeout: float | None = None) -> None:
+        """Wait for the background tasks, for ``timeout`` seconds at most in all."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            background = list(self._background.values())
+        for thread in background:
+            if deadline is None:
+                thread.join()
+            else:
+                thread.join(max(deadline - time.monotonic(), 0))
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        """Register a callback to run when the registry is closed."""
+        with self._lock:
+            self._close_callbacks.append(callback)
+
+    def close(self) -> None:
+        """Close every client and cache, then run the ``on_close`` callbacks.
+
+        Background tasks are waited for first, they may still use them.
+        """
+        self.wait_for_background()
+        with self._lock:
+            clients, self._clients = self._clients, {}
+            self._factories = {}
+            caches, self._caches = self._caches, {}
+            callbacks, self._close_callbacks = self._close_callbacks, []
+        for client in clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug("Failed to close client: %s", e)
+        for cache in caches.values():
+            cache.close()
+        for callback in reversed(callbacks):
+            try:
+                callback()
+            except Exception as e:
+                logger.debug("Session close callback failed: %s", e)
+
+
+sessions = SessionRegistry()
@@ -0,0 +1,137 @@
+from collections import defaultdict
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+FLUSH_INTERVAL = 30  # seconds
+
+# l1_hits are the hits served from memory, see memory.py
+COUNTERS = (
+    "hits",
+    "l1_hits",
+    "misses",
+    "expirations",
+    "bytes_served",
+    "latency_saved",
+)
+
+
+# API namespaces whose next path segment names the API, e.g. _cat/health
+API_NAMESPACES = frozenset(("_cat", "_cluster", "_ilm", "_ingest", "_security", "_slm"))
+
+
+def endpoint_pattern(method: str, target: str) -> str:
+    """Group requests by API rather than by index, document or node.
+
+    API path segments (``_cat``, ``_doc``, ...) are kept, anything else is
+    replaced with ``*``: ``GET /logs-2024/_doc/42`` -> ``GET /*/_doc/*``.
+    """
+    segments: list[str] = []
+    for segment in urlsplit(target).path.split("/"):
+        if not segment:
+            continue
+        if segment.startswith("_") or (segments and segments[-1] in API_NAMESPACES):
+            segments.append(segment)
+        else:
+            segments.append("*")
+    return f"{method.upper()} /{'/'.join(segments)}"
+
+
+class CacheStats:
+    """Hit/miss counters of the response cache of a context, per endpoint.
+
+    Counters are accumulated in memory and written to ``cache.db`` when
+    flushed (at the latest when the cache is closed), so recording them costs
+    nothing on the request path.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, context_name: str):
+        self.conn = conn
+        self.table = f"http_stats_{context_name}"
+        self._lock = threading.Lock()
+        self._pending: defaultdict[str, dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(COUNTERS, 0)
+        )
+        self._last_flush = time.monotonic()
+        with self.conn:
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    endpoint      TEXT PRIMARY KEY,
+                    hits          INTEGER NOT NULL DEFAULT 0,
+                    l1_hits       INTEGER NOT NULL DEFAULT 0,
+                    misses        INTEGER NOT NULL DEFAULT 0,
+                    expirations   INTEGER NOT NULL DEFAULT 0,
+                    bytes_served  INTEGER NOT NULL DEFAULT 0,
+                    latency_saved REAL NOT NULL DEFAULT 0   -- seconds
+                ) WITHOUT ROWID;
+            """
+            )
+
+    def _record(self, method: str, target: str, **counters: float) -> None:
+        with self._lock:
+            pending = self._pending[endpoint_pattern(method, target)]
+            for name, value in counters.items():
+                pending[name] += value
+        # Long-lived processes (e.g. the agent) never close their caches
+        if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def hit(
+        self, method: str, target: str, bytes_served: int, latency_saved: float
+    ) -> None:
+        self._record(
+            method,
+            target,
+            hits=1,
+            bytes_served=bytes_served,
+            latency_saved=max(latency_saved, 0.0),
+        )
+
+    def l1_hit(self, method: str, target: str) -> None:
+        """Count a hit as served from memory, on top of ``hit``."""
+        self._record(method, target, l1_hits=1)
+
+    def miss(self, method: str, target: str) -> None:
+        self._record(method, target, misses=1)
+
+    def expiration(self, method: str, target: str) -> None:
+        self._record(method, target, expirations=1)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = (
+                self._pending,
+                defaultdict(lambda: dict.fromkeys(COUNTERS, 0)),
+            )
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTERS)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO {self.table} (endpoint, {', '.join(COUNTERS)}) "
+                f"VALUES (?, {', '.join('?' * len(COUNTERS))}) "
+                f"ON CONFLICT (endpoint) DO UPDATE SET {updates};",
+                [
+                    (endpoint, *(counters[name] for name in COUNTERS))
+                    for endpoint, counters in pending.items()
+                ],
+            )
+
+    def rows(self) -> dict[str, dict[str, float]]:
+        """Counters per endpoint pattern, including the ones not flushed yet."""
+        self.flush()
+        return {
+            endpoint: dict(zip(COUNTERS, counters))
+            for endpoint, *counters in self.conn.execute(
+                f"SELECT endpoint, {', '.join(COUNTERS)} FROM {self.table};"
+            )
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {self.table};")
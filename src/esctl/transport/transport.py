@@ -1,5 +1,8 @@
-from base64 import b64decode, b64encode
+from base64 import b64encode
+import logging
 import socket
+import ssl
+import threading
 import time
 from typing import Type
 
@@ -8,18 +11,37 @@ from elastic_transport._node._base import NodeApiResponse
 from elastic_transport.client_utils import DefaultType
 from kubernetes import client as kube_client
 from kubernetes import config as kube_config
-from kubernetes.stream import portforward
-from kubernetes.stream.ws_client import PortForward
 import urllib3
 from urllib3.connection import HTTPConnection as Urllib3HTTPConnection
+from urllib3.connection import HTTPSConnection as Urllib3HTTPSConnection
 
-from .cache import Cache
+from esctl.constants import (
+    ESCTL_CACHE_INFLIGHT_TIMEOUT,
+    ESCTL_KUBE_KEEPALIVE_INTERVAL,
+)
+
+from .clusterstate import ClusterState, is_metadata_derived
+from .discovery import discover_eck, forget_eck_discovery, is_pod_gone
+from .identity import forget_cluster_identity, is_version_mismatch
+from .invalidation import invalidation
+from .portforward import PortForwardManager
+from .session import sessions
+
+
+logger = logging.getLogger("esctl")
 
 
 class CacheHttpNode(Urllib3HttpNode):
     def __init__(self, config: NodeConfig, context_name: str, cache_enabled: bool):
         super().__init__(config)
-        self.cache = Cache(context_name, enabled=cache_enabled)
+        self.context_name = context_name
+        self.cache = sessions.cache(context_name, enabled=cache_enabled)
+
+    def _check_identity(self, response: NodeApiResponse) -> None:
+        if is_version_mismatch(response):
+            # The persisted identity no longer matches the cluster: drop it so
+            # that the client, rebuilt on this error, re-probes ``GET /``.
+            forget_cluster_identity(self.context_name)
 
     def perform_request(
         self,
@@ -32,31 +54,140 @@ class CacheHttpNode(Urllib3HttpNode):
         if method.upper() not in ("GET", "HEAD"):
             # Only cache GET and HEAD requests, pass through others
             # Don't want to cache update requests, obviously
-            return super().perform_request(
-                method, target, body, headers, request_timeout
-            )
-        start_time = time.time()
-        response = self.cache.get(method, target, headers)
-        if response is not None:
-            response.meta.duration = time.time() - start_time
-            response.meta.node = self.config
+            try:
+                response = super().perform_request(
+                    method, target, body, headers, request_timeout
+                )
+            finally:
+                # Even a failed write may have been partly applied
+                self._invalidate(method, target)
+            self._check_identity(response)
             return response
-        response = super().perform_request(
-            method, target, body, headers, request_timeout
-        )
-        self.cache.set(
+        start_time = time.time()
+        state = self._cluster_state(method, target)
+        response, stale = self.cache.lookup(method, target, headers, state=state)
+        if stale:
+            sessions.run_in_background(
+                (self.context_name, method, target),
+                lambda: self._refresh(
+                    method, target, body, headers, request_timeout, state
+                ),
+            )
+        if response is None:
+            response, cached = self._fetch(
+                method, target, body, headers, request_timeout, state
+            )
+            if not cached:
+                return response
+        duration = time.time() - start_time
+        self.cache.stats.hit(
             method,
             target,
-            response,
-            headers=headers,
-            ttl=Cache.get_ttl(f"{method.upper()} {target}"),
+            bytes_served=len(response.body),
+            latency_saved=response.meta.duration - duration,
         )
+        response.meta.duration = duration
+        response.meta.node = self.config
         return response
 
+    def _fetch(
+        self,
+        method: str,
+        target: str,
+        body: bytes | None,
+        headers: HttpHeaders | None,
+        request_timeout: DefaultType | float | None,
+        state: ClusterState | None,
+    ) -> tuple[NodeApiResponse, bool]:
+        """Send a request missing from the cache, and cache its response.
 
-class HTTPConnection(Urllib3HTTPConnection):
+        If another esctl process is already sending it, wait for its response
+        to be cached instead, so that a burst of identical commands sends it
+        once. Returns the response and whether it comes from the cache.
+        """
+        if not self.cache.enabled:
+            response = super().perform_request(
+                method, target, body, headers, request_timeout
+            )
+            self._check_identity(response)
+            return response, False
+        timeout = ESCTL_CACHE_INFLIGHT_TIMEOUT
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        waited = False
+        leased = self.cache.acquire(method, target, headers=headers, timeout=timeout)
+        while not leased:
+            if time.monotonic() > deadline:
+                break  # Send it anyway
+            waited = True
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+            response, _ = self.cache.lookup(method, target, headers, state=state)
+            if response is not None:
+                return response, True
+            leased = self.cache.acquire(
+                method, target, headers=headers, timeout=timeout
+            )
+        try:
+            if leased and waited:
+                # Cached by the previous holder right before it released the lease
+                response, _ = self.cache.lookup(method, target, headers, state=state)
+                if response is not None:
+                    return response, True
+            self.cache.stats.miss(method, target)
+            response = super().perform_request(
+                method, target, body, headers, request_timeout
+            )
+            self._check_identity(response)
+            self.cache.set(method, target, response, headers=headers, state=state)
+            return response, False
+        finally:
+            if leased:
+                self.cache.release(method, target, headers=headers)
+
+    def _invalidate(self, method: str, target: str) -> None:
+        """Drop the cached reads a write makes outdated."""
+        # It may have changed the cluster state
+        self.cache.cluster_state.forget()
+        dropped = self.cache.invalidate(invalidation(method, target))
+        if dropped:
+            logger.debug("%s %s invalidated %d cached reads", method, target, dropped)
+
+    def _cluster_state(self, method: str, target: str) -> ClusterState | None:
+        """The current cluster state, if the response to the request derives from it."""
+        if not self.cache.enabled or not is_metadata_derived(method, target):
+            return None
+        return self.cache.cluster_state.current(
+            lambda target: super(CacheHttpNode, self).perform_request("GET", target)
+        )
+
+    def _refresh(
+        self,
+        method: str,
+        target: str,
+        body: bytes | None,
+        headers: HttpHeaders | None,
+        request_timeout: DefaultType | float | None,
+        state: ClusterState | None,
+    ) -> None:
+        """Replace a stale cached response with a fresh one."""
+        if not self.cache.acquire(
+            method, target, headers=headers, timeout=ESCTL_CACHE_INFLIGHT_TIMEOUT
+        ):
+            return  # Another esctl process is on it
+        try:
+            response = super().perform_request(
+                method, target, body, headers, request_timeout
+            )
+            self._check_identity(response)
+            self.cache.set(method, target, response, headers=headers, state=state)
+        finally:
+            self.cache.release(method, target, headers=headers)
+
+
+class ElasticProductMixin:
     def getresponse(self) -> urllib3.HTTPResponse:
-        response = super().getresponse()
+        response = super().getresponse()  # type: ignore[misc]
         # Hack around the fact that ES raises an exception if the
         # X-Elastic-Product header is not set, claiming an "unsupported product"
         # 100% is to not have AWS' version of ES be compatible with the client
@@ -70,16 +201,35 @@ class HTTPConnection(Urllib3HTTPConnection):
         return response
 
 
+class HTTPConnection(ElasticProductMixin, Urllib3HTTPConnection):
+    pass
+
+
+class HTTPSConnection(ElasticProductMixin, Urllib3HTTPSConnection):
+    pass
+
+
 class HTTPConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
     ConnectionCls = HTTPConnection  # type: ignore
 
 
+class HTTPSConnectionPool(urllib3.connectionpool.HTTPSConnectionPool):
+    ConnectionCls = HTTPSConnection  # type: ignore
+
+
 def HTTPNodeClassFactory(
     context_name: str,
     cache_enabled: bool,
     username: str | None,
     password: str | None,
+    ca_certificate: str | None = None,
 ) -> type[CacheHttpNode]:
+    """Build the node class for plain HTTP(S) endpoints.
+
+    ``ca_certificate`` is a PEM CA to trust for HTTPS instead of the system
+    ones.
+    """
+
     class HTTPNode(CacheHttpNode):
         def __init__(self, config: NodeConfig):
             super().__init__(config, context_name, cache_enabled)
@@ -89,6 +239,17 @@ def HTTPNodeClassFactory(
                     "utf-8"
                 )
                 self._headers["Authorization"] = f"Basic {auth}"
+            if config.scheme == "https":
+                kw["ssl_context"] = ssl.create_default_context(cadata=ca_certificate)
+                self.pool = HTTPSConnectionPool(
+                    config.host,
+                    port=config.port,
+                    timeout=urllib3.Timeout(total=config.request_timeout),
+                    maxsize=config.connections_per_node,
+                    block=True,
+                    **kw,
+                )
+                return
             self.pool = HTTPConnectionPool(
                 config.host,
                 port=config.port,
@@ -114,64 +275,121 @@ def KubeNodeClassFactory(
     else:
         kube_config.load_kube_config(context=kube_context)
     k8s_api = kube_client.CoreV1Api()
-    pod_name = next(
-        pod.metadata.name
-        for pod in k8s_api.list_namespaced_pod(
-            namespace=kube_namespace,
-            label_selector=",".join(
-                (
-                    f"elasticsearch.k8s.elastic.co/cluster-name={es_name}",
-                    "elasticsearch.k8s.elastic.co/node-master=true",
-                )
-            ),
-        ).items
+    discovery = discover_eck(
+        context_name, cache_enabled, k8s_api, kube_namespace, es_name, in_cluster
     )
+    username, password = discovery.username, discovery.password
 
-    secrets = k8s_api.list_namespaced_secret(
-        namespace=kube_namespace,
-        label_selector=",".join(
-            (
-                f"elasticsearch.k8s.elastic.co/cluster-name={es_name}",
-                "eck.k8s.elastic.co/credentials=true",
-            )
-        ),
-    )
-    elastic_secret = next(
-        secret.data
-        for secret in secrets.items
-        if "elastic-user" in secret.metadata.name
-    )
-    username = next(iter(elastic_secret.keys()))
-    password = b64decode(next(iter(elastic_secret.values()))).decode("utf-8")
+    if in_cluster:
+        # The ECK HTTP service is reachable from here: talk to it directly over
+        # pooled keep-alive connections rather than through the API server.
+        scheme = "http" if discovery.ca_certificate is None else "https"
+        HTTPNode = HTTPNodeClassFactory(
+            context_name,
+            cache_enabled,
+            username,
+            password,
+            ca_certificate=discovery.ca_certificate,
+        )
+
+        class InClusterHttpNode(HTTPNode):  # type: ignore[valid-type,misc]
+            basic_auth = (username, password)
+            node_configs = [NodeConfig(scheme, discovery.service_host, 9200)]
+
+        return InClusterHttpNode
+
+    manager = PortForwardManager(k8s_api, kube_namespace)
+    sessions.on_close(manager.close)
+
+    # Each node is named after the pod it talks to. Should that pod be gone for
+    # good, its node is rerouted to a pod from a fresh discovery instead.
+    routes: dict[str, str] = {}
 
     class KubeHTTPConnection(HTTPConnection):
         def _new_conn(self) -> socket.socket:
-            pf: PortForward = portforward(
-                k8s_api.connect_get_namespaced_pod_portforward,
-                pod_name,
-                kube_namespace,
-                ports=str(self.port),
-            )
-            return pf.socket(self.port)
+            pod_name = routes.get(self.host, self.host)
+            try:
+                return manager.open(pod_name, self.port)
+            except kube_client.ApiException as e:
+                if not is_pod_gone(e):
+                    raise
+                forget_eck_discovery(context_name)
+                rediscovered = discover_eck(
+                    context_name, False, k8s_api, kube_namespace, es_name
+                ).pod_names
+                # Streams are per pod: never take over a pod another node uses.
+                in_use = {routes.get(pod, pod) for pod in discovery.pod_names}
+                replacement = next(
+                    (pod for pod in rediscovered if pod not in in_use), None
+                )
+                if pod_name in rediscovered or replacement is None:
+                    raise  # The node pool backs off and retries it later
+                logger.info("Pod %s is gone, rerouting to %s", pod_name, replacement)
+                routes[self.host] = replacement
+                return manager.open(replacement, self.port)
 
     class KubePortForwardConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
         ConnectionCls = KubeHTTPConnection  # type: ignore
 
     class KubeHttpNode(CacheHttpNode):
         basic_auth = (username, password)
+        node_configs = [
+            NodeConfig("http", pod_name, 9200) for pod_name in discovery.pod_names
+        ]
 
         def __init__(self, config: NodeConfig):
             super().__init__(config, context_name, cache_enabled)
             kw = self.pool.conn_kw
             auth = b64encode(f"{username}:{password}".encode("utf-8")).decode("utf-8")
             self._headers["Authorization"] = f"Basic {auth}"
+            # A single connection per pod, hence a single port-forward stream:
+            # concurrent requests queue on it rather than each opening their own
+            # tunnel.
             self.pool = KubePortForwardConnectionPool(
                 config.host,
                 port=config.port,
                 timeout=urllib3.Timeout(total=config.request_timeout),
-                maxsize=config.connections_per_node,
+                maxsize=1,
                 block=True,
                 **kw,
             )
+            self._last_used = time.monotonic()
+            self._closed = threading.Event()
+            threading.Thread(
+                target=self._keepalive,
+                name=f"esctl port-forward keepalive: {context_name}/{config.host}",
+                daemon=True,
+            ).start()
+
+        def perform_request(self, *args, **kwargs) -> NodeApiResponse:
+            self._last_used = time.monotonic()
+            try:
+                return super().perform_request(*args, **kwargs)
+            finally:
+                self._last_used = time.monotonic()
+
+        def _keepalive(self) -> None:
+            """Keep an idle stream from being dropped by the API server or a proxy.
+
+            Goes through the pool like any request, so it never races with one.
+            """
+            while not self._closed.wait(ESCTL_KUBE_KEEPALIVE_INTERVAL):
+                idle = time.monotonic() - self._last_used
+                if idle < ESCTL_KUBE_KEEPALIVE_INTERVAL:
+                    continue
+                pod_name = routes.get(self.config.host, self.config.host)
+                if not manager.is_alive(pod_name, self.config.port):
+                    continue  # Nothing to keep alive, next request reconnects
+                try:
+                    self.pool.urlopen(
+                        "HEAD", "/", headers=self._headers, retries=False
+                    ).drain_conn()
+                except Exception as e:
+                    logger.debug("Port-forward keepalive failed: %s", e)
+                self._last_used = time.monotonic()
+
+        def close(self) -> None:
+            self._closed.set()
+            super().close()
 
     return KubeHttpNode
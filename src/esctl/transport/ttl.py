@@ -0,0 +1,106 @@
+import functools
+import logging
+import re
+from typing import Any, NamedTuple
+
+import orjson
+
+from esctl.constants import ESCTL_TTL_CONFIG_PATH
+
+
+logger = logging.getLogger("esctl")
+
+DEFAULT_TTL = 300  # 5 minutes
+
+# Built-in TTLs, by how fast what an endpoint returns changes. The first match
+# wins, and user rules from ttl.json come before these.
+VOLATILE = 10
+STABLE = 3600
+BUILTIN_RULES: list[tuple[str, int]] = [
+    (r"^(GET|HEAD) /_tasks\b", 5),
+    (
+        r"^(GET|HEAD) /_cat/(health|pending_tasks|recovery|tasks|thread_pool)\b",
+        VOLATILE,
+    ),
+    (r"^(GET|HEAD) /_cluster/(health|pending_tasks)\b", VOLATILE),
+    (r"^(GET|HEAD) /([^/]+/)?_recovery\b", VOLATILE),
+    (r"^(GET|HEAD) /_cat/(templates|repositories|plugins|nodeattrs)\b", STABLE),
+    (r"^(GET|HEAD) /_(index_template|component_template|template)\b", STABLE),
+    (r"^(GET|HEAD) /_snapshot/?(\?.*)?$", STABLE),  # Repositories, not snapshots
+    (r"^(GET|HEAD) /_cluster/settings\b", STABLE),
+    (r"^(GET|HEAD) /([^/]+/)?_settings\b", STABLE),
+    # Checked against the cluster state version anyway, see clusterstate.py
+    (r"^(GET|HEAD) /([^/]+/)?_(mapping|mappings|alias|aliases)\b", STABLE),
+    (r"^(GET|HEAD) /_cat/aliases\b", STABLE),
+    (r"^(GET|HEAD) /_(ilm|slm)/policy\b", STABLE),
+    (r"^(GET|HEAD) /_ingest/pipeline\b", STABLE),
+]
+
+
+class TTLRule(NamedTuple):
+    pattern: str
+    ttl: int
+    # Where the rule comes from: "ttl.json", "built-in" or "default"
+    source: str
+    # Seconds past the TTL during which the response is still served, while
+    # it is refreshed in the background
+    max_stale: int = 0
+
+
+def _parse(value: Any) -> tuple[int, int]:
+    """TTL and max staleness of a ttl.json value: ``60`` or ``{"ttl": 60, ...}``."""
+    if isinstance(value, dict):
+        return int(value["ttl"]), int(value.get("max_stale", 0))
+    return int(value), 0
+
+
+class TTLPolicy:
+    """Ordered TTL rules, matched against ``"<METHOD> <target>"``.
+
+    Rules are python regular expressions, searched in order: the user's from
+    ``ttl.json`` first, then the built-in ones, falling back to
+    ``DEFAULT_TTL``. Rules may let responses be served stale for a while,
+    see ``TTLRule.max_stale``.
+    """
+
+    def __init__(self, user_rules: dict[str, Any]):
+        self.rules: list[tuple[re.Pattern[str], TTLRule]] = []
+        for source, rules in (
+            ("ttl.json", user_rules.items()),
+            ("built-in", BUILTIN_RULES),
+        ):
+            for pattern, value in rules:
+                try:
+                    compiled = re.compile(pattern)
+                    ttl, max_stale = _parse(value)
+                except (re.error, KeyError, TypeError, ValueError) as e:
+                    logger.warning("Ignoring TTL rule %r: %s", pattern, e)
+                    continue
+                self.rules.append((compiled, TTLRule(pattern, ttl, source, max_stale)))
+
+    def resolve(self, method: str, target: str) -> TTLRule:
+        """Return the rule giving the TTL of a request."""
+        key = f"{method.upper()} {target}"
+        for compiled, rule in self.rules:
+            if compiled.search(key):
+                return rule
+        return TTLRule("", DEFAULT_TTL, "default")
+
+    def ttl(self, method: str, target: str) -> int:
+        return self.resolve(method, target).ttl
+
+
+@functools.lru_cache(maxsize=1)
+def _load(mtime_ns: int | None) -> TTLPolicy:
+    if mtime_ns is None:
+        return TTLPolicy({})
+    return TTLPolicy(orjson.loads(ESCTL_TTL_CONFIG_PATH.read_bytes() or b"{}"))
+
+
+def ttl_policy() -> TTLPolicy:
+    """Return the TTL policy, compiled once per version of ``ttl.json``."""
+    try:
+        mtime_ns: int | None = ESCTL_TTL_CONFIG_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    return _load(mtime_ns)
@@ -0,0 +1,206 @@
+from contextlib import contextmanager
+import logging
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Iterator, NamedTuple
+
+import orjson
+
+from esctl.constants import ESCTL_TUNNEL_IDLE_TIMEOUT, ESCTL_TUNNELS_DIR
+
+from . import tunnel_watchdog
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+logger = logging.getLogger("esctl")
+
+# Tunnels spawned by this process, to reap them once killed
+_spawned: dict[int, subprocess.Popen] = {}
+
+
+class Tunnel(NamedTuple):
+    pid: int
+    port: int
+    # What the tunnel leads to, a tunnel is only reused for the same target
+    target: str
+    last_used: float
+
+
+def _path(context_name: str, suffix: str):
+    name = re.sub(r"[^a-zA-Z0-9_-]", "_", context_name)
+    return ESCTL_TUNNELS_DIR / f"{name}{suffix}"
+
+
+@contextmanager
+def _locked(context_name: str) -> Iterator[None]:
+    """Serialize tunnel management for a context across esctl processes."""
+    ESCTL_TUNNELS_DIR.mkdir(exist_ok=True, parents=True)
+    with _path(context_name, ".lock").open("a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _read(context_name: str) -> Tunnel | None:
+    try:
+        return Tunnel(**orjson.loads(_path(context_name, ".json").read_bytes()))
+    except (FileNotFoundError, TypeError, orjson.JSONDecodeError):
+        return None
+
+
+def _write(context_name: str, tunnel: Tunnel) -> None:
+    _path(context_name, ".json").write_bytes(orjson.dumps(tunnel._asdict()))
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_listening(port: int) -> bool:
+    with socket.socket() as s:
+        s.settimeout(0.5)
+        return s.connect_ex(("localhost", port)) == 0
+
+
+def _free_port(preferred: int) -> int:
+    """Return ``preferred`` if nothing listens on it, else any free port."""
+    for port in (preferred, 0):
+        with socket.socket() as s:
+            try:
+                s.bind(("localhost", port))
+            except OSError:
+                continue
+            return s.getsockname()[1]
+    raise OSError("No free local port for the tunnel")
+
+
+def _kill(pid: int) -> None:
+    """Kill a tunnel, and the children it spawned (e.g. ssh for gcloud)."""
+    try:
+        # Tunnels lead their own process group. Anything else is not ours: the
+        # pid was reused after the tunnel died.
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    process = _spawned.pop(pid, None)
+    if process is not None:
+        process.wait()
+
+
+def _wait_listening(process: subprocess.Popen, port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while time.monotonic() < deadline:
+        if _is_listening(port):
+            return True
+        if process.poll() is not None:
+            return False  # Exited early, e.g. the port was taken in between
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return False
+
+
+def open_tunnel(
+    context_name: str,
+    target: str,
+    command: Callable[[int], list[str]],
+    preferred_port: int,
+    timeout: float = 10.0,
+    attempts: int = 3,
+) -> int:
+    """Return the local port of a running tunnel to ``target``, opening it if needed.
+
+    Tunnels are detached from esctl and recorded under ``ESCTL_HOME/tunnels``,
+    so later invocations (and concurrent ones) reuse them instead of paying
+    for a new SSH session. ``command`` builds the command line of the tunnel
+    given the local port to listen on: ``preferred_port`` if free, any free
+    port otherwise. Tunnels left unused for ``ESCTL_TUNNEL_IDLE_TIMEOUT``
+    seconds are closed by the watchdog they are run through, whether esctl
+    runs again or not.
+    """
+    reap_idle_tunnels()
+    with _locked(context_name):
+        tunnel = _read(context_name)
+        if tunnel is not None:
+            if (
+                tunnel.target == target
+                and _is_running(tunnel.pid)
+                and _is_listening(tunnel.port)
+            ):
+                _write(context_name, tunnel._replace(last_used=time.time()))
+                return tunnel.port
+            _kill(tunnel.pid)
+            _path(context_name, ".json").unlink(missing_ok=True)
+        for _ in range(attempts):
+            port = _free_port(preferred_port)
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    tunnel_watchdog.__file__,
+                    str(_path(context_name, ".json")),
+                    str(ESCTL_TUNNEL_IDLE_TIMEOUT),
+                    *command(port),
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            _spawned[process.pid] = process
+            if _wait_listening(process, port, timeout):
+                _write(context_name, Tunnel(process.pid, port, target, time.time()))
+                return port
+            _kill(process.pid)
+        raise ConnectionError(f"Could not open a tunnel to {target}")
+
+
+def touch_tunnel(context_name: str) -> None:
+    """Mark the tunnel of a context as used, pushing back its expiry."""
+    with _locked(context_name):
+        tunnel = _read(context_name)
+        if tunnel is not None:
+            _write(context_name, tunnel._replace(last_used=time.time()))
+
+
+def close_tunnel(context_name: str) -> None:
+    with _locked(context_name):
+        tunnel = _read(context_name)
+        if tunnel is not None:
+            _kill(tunnel.pid)
+        _path(context_name, ".json").unlink(missing_ok=True)
+
+
+def reap_idle_tunnels() -> None:
+    """Close the idle tunnels whose watchdog did not, e.g. if it was killed."""
+    if not ESCTL_TUNNELS_DIR.exists():
+        return
+    now = time.time()
+    for path in ESCTL_TUNNELS_DIR.glob("*.json"):
+        context_name = path.stem
+        tunnel = _read(context_name)
+        if tunnel is None or now - tunnel.last_used < ESCTL_TUNNEL_IDLE_TIMEOUT:
+            continue
+        with _locked(context_name):
+            # Re-read under the lock, it may just have been used
+            tunnel = _read(context_name)
+            if tunnel is None or now - tunnel.last_used < ESCTL_TUNNEL_IDLE_TIMEOUT:
+                continue
+            logger.debug("Closing idle tunnel for context %s", context_name)
+            _kill(tunnel.pid)
+            path.unlink(missing_ok=True)
@@ -0,0 +1,55 @@
+"""Close a detached tunnel once it has not been used for a while.
+
+``open_tunnel`` runs the tunnel command through this script, as a file rather
+than a module so that it starts without importing esctl::
+
+    python tunnel_watchdog.py RECORD IDLE_TIMEOUT COMMAND...
+
+It runs ``COMMAND`` and sleeps until the tunnel recorded in ``RECORD`` has been
+idle for ``IDLE_TIMEOUT`` seconds. It then removes the record and kills its
+process group, i.e. itself and the tunnel. It exits along with the tunnel too.
+"""
+
+import fcntl
+import json
+import os
+from pathlib import Path
+import signal
+import subprocess
+import sys
+import time
+
+
+def _last_used(record: Path) -> float | None:
+    """When the tunnel was last used, or None if the record is not ours."""
+    try:
+        tunnel = json.loads(record.read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+    if tunnel.get("pid") != os.getpid():
+        return None
+    return tunnel["last_used"]
+
+
+def main(record: Path, idle_timeout: float, command: list[str]) -> int:
+    process = subprocess.Popen(command)
+    # The record is only written once the tunnel listens
+    last_used = time.time()
+    while True:
+        try:
+            return process.wait(max(last_used + idle_timeout - time.time(), 0.1))
+        except subprocess.TimeoutExpired:
+            pass
+        # Same lock as esctl: the tunnel may be in the middle of being reused
+        with record.with_suffix(".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            recorded = _last_used(record)
+            last_used = recorded or last_used
+            if time.time() - last_used >= idle_timeout:
+                if recorded is not None:
+                    record.unlink()
+                os.killpg(0, signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    sys.exit(main(Path(sys.argv[1]), float(sys.argv[2]), sys.argv[3:]))
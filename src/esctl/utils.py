@@ -5,15 +5,18 @@ from string import Formatter
 from datetime import timedelta
 import sys
 import traceback
+from typing import Callable
 
-import kubernetes
-import requests
 from rich import print
 from rich.prompt import Confirm
 
 from esctl.constants import ISSUE_TEMPLATE
 
 
+class EsctlError(Exception):
+    """Error to show to the user as is, rather than to report as a bug."""
+
+
 def strfdelta(tdelta: timedelta):
     """Convert a datetime.timedelta object or a regular number to a custom-
     formatted string, just like the stftime() method does for datetime.datetime
@@ -53,15 +56,23 @@ def strfdelta(tdelta: timedelta):
 
 
 def try_create_github_issue(
-    exception: Exception, token: str | None, es_version: str
+    exception: Exception, get_token: Callable[[], str | None], es_version: str
 ) -> None:
-    """Create a GitHub issue for the given exception using the provided token."""
-    if token is None:
-        return
+    """Create a GitHub issue for the given exception.
+
+    ``get_token`` is only called once an issue may actually be filed: it
+    usually runs a command (e.g. ``gh auth token``).
+    """
     if os.getenv("ESCTL_DISABLE_ISSUE_REPORTING", False):
         return
+    token = get_token()
+    if token is None:
+        return
     if not Confirm.ask("Submit a GitHub issue?", default=True):
         return
+    import kubernetes
+    import requests
+
     url = "https://api.github.com/repos/happn-app/esctl/issues"
     headers = {
         "Authorization": f"Bearer {token}",
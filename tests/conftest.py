@@ -58,3 +58,72 @@ def write_config():
         return config
 
     return _write
+
+
+@pytest.fixture
+def make_response():
+    """Return a helper building the response of a node, as Elasticsearch sends it."""
+    from elastic_transport import ApiResponseMeta, HttpHeaders
+    from elastic_transport._node._base import NodeApiResponse
+
+    def _make(
+        body: bytes = b"{}",
+        status: int = 200,
+        duration: float = 0.1,
+        headers: dict[str, str] | None = None,
+    ):
+        meta = ApiResponseMeta(
+            status=status,
+            http_version="1.1",
+            headers=HttpHeaders(
+                {"content-type": "application/json"} if headers is None else headers
+            ),
+            duration=duration,
+            node=None,  # type: ignore[arg-type]
+        )
+        return NodeApiResponse(meta, body)
+
+    return _make
+
+
+@pytest.fixture
+def upstream(mocker, make_response):
+    """Stand in for Elasticsearch: the node under the cache, answering ``{}``.
+
+    Set its ``return_value`` or ``side_effect`` to answer something else.
+    """
+    from elastic_transport import Urllib3HttpNode
+
+    return mocker.patch.object(
+        Urllib3HttpNode, "perform_request", return_value=make_response()
+    )
+
+
+@pytest.fixture
+def node(upstream):
+    """A caching node in front of ``upstream``, with an empty cache.
+
+    The cache is shared through the session registry: it is left open.
+    """
+    from elastic_transport import NodeConfig
+
+    from esctl.transport.transport import CacheHttpNode
+
+    node = CacheHttpNode(NodeConfig("http", "localhost", 9200), "node-test", True)
+    node.cache.clear()
+    node.cache.stats.reset()
+    node.cache.cluster_state.forget()
+    node.upstream = upstream
+    return node
+
+
+@pytest.fixture
+def cache():
+    """An empty cache, of its own rather than from the session registry."""
+    from esctl.transport.cache import Cache
+
+    cache = Cache("cache-test")
+    cache.clear()
+    yield cache
+    cache.clear()
+    cache.conn.close()
@@ -0,0 +1,74 @@
+import socket
+import tempfile
+import threading
+from pathlib import Path
+
+from elastic_transport import ConnectionError
+from elasticsearch9 import Elasticsearch as Elasticsearch9
+import pytest
+
+from esctl.transport import agent
+
+
+def test_frame_roundtrip():
+    left, right = socket.socketpair()
+    with left, right:
+        agent.send_frame(left, {"op": "ping"}, b"\x00binary body")
+        assert agent.recv_frame(right) == ({"op": "ping"}, b"\x00binary body")
+
+
+@pytest.fixture
+def running_agent(monkeypatch, mocker, upstream, make_response):
+    # AF_UNIX paths are length limited, keep it short.
+    socket_path = Path(tempfile.mkdtemp(prefix="esctl-")) / "agent.sock"
+    monkeypatch.setattr(agent, "ESCTL_AGENT_SOCKET_PATH", socket_path)
+    monkeypatch.delenv("ESCTL_NO_AGENT", raising=False)
+    upstream.return_value = make_response(
+        b'[{"status":"green"}]',
+        headers={
+            "content-type": "application/json",
+            "x-elastic-product": "Elasticsearch",
+        },
+    )
+    mocker.patch.object(
+        agent.AgentServer,
+        "client",
+        lambda self, name, cache: Elasticsearch9("http://localhost:9200"),
+    )
+    server = agent.AgentServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    agent.agent_available.cache_clear()
+    yield upstream
+    server.shutdown()
+    server.server_close()
+    agent.agent_available.cache_clear()
+
+
+def test_agent_available(running_agent):
+    assert agent.agent_available()
+
+
+def test_client_requests_are_forwarded(running_agent):
+    client = agent.AgentClientFactory("prod", True)
+    assert isinstance(client, Elasticsearch9)
+    response = client.cat.health(format="json")
+    assert response.body == [{"status": "green"}]
+    assert running_agent.call_count == 1
+    method, target = running_agent.call_args.args
+    assert (method, target) == ("GET", "/_cat/health?format=json")
+
+
+def test_agent_requests_are_retried(running_agent):
+    # Through the transport of the agent's client, as without the agent
+    running_agent.side_effect = [ConnectionError("down"), running_agent.return_value]
+    client = agent.AgentClientFactory("prod", True)
+    assert client.cat.health(format="json").body == [{"status": "green"}]
+    assert running_agent.call_count == 2
+
+
+def test_agent_not_available_without_socket(monkeypatch):
+    monkeypatch.setattr(agent, "ESCTL_AGENT_SOCKET_PATH", Path("/nonexistent.sock"))
+    agent.agent_available.cache_clear()
+    assert not agent.agent_available()
+    agent.agent_available.cache_clear()
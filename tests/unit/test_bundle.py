@@ -0,0 +1,187 @@
+import socket
+from types import SimpleNamespace
+
+from elastic_transport import ApiResponseMeta, HttpHeaders
+from elasticsearch8 import Elasticsearch as Elasticsearch8
+from elasticsearch8 import ApiError
+import orjson
+import pytest
+from typer.testing import CliRunner
+
+from esctl.transport.bundle import (
+    CAPTURE_TARGETS,
+    Bundle,
+    BundleClientFactory,
+    CapturedResponse,
+    capture,
+)
+from esctl.transport.compression import zstd_compress
+
+
+SHARDS = [
+    {"index": "logs-1", "shard": "0", "prirep": "p", "state": "STARTED", "docs": "9"},
+    {"index": "logs-2", "shard": "0", "prirep": "p", "state": "STARTED", "docs": "10"},
+    {"index": "metrics", "shard": "1", "prirep": "r", "state": "UNASSIGNED"},
+]
+
+
+def _captured(method, target, body, request_body=""):
+    return CapturedResponse(
+        method=method,
+        target=target,
+        request_body=request_body,
+        status=200,
+        headers={"content-type": "application/json"},
+        duration=0.1,
+        body=orjson.dumps(body),
+    )
+
+
+@pytest.fixture
+def bundle():
+    return Bundle(
+        {"context": "prod"},
+        [
+            _captured("GET", "/", {"version": {"number": "8.15.0"}}),
+            _captured("GET", "/_cat/shards?format=json&h=*", SHARDS),
+            _captured("GET", "/_cluster/health", {"status": "yellow"}),
+            _captured("GET", "/_tasks?detailed=true", {"nodes": {}}),
+            _captured(
+                "POST",
+                "/_cluster/allocation/explain",
+                {"allocate_explanation": "no nodes"},
+                '{"index":"metrics","primary":"False","shard":"1"}',
+            ),
+        ],
+    )
+
+
+def test_cat_responses_are_derived(bundle):
+    found = bundle.find("GET", "/_cat/shards/logs-*?format=json&h=index,docs&s=docs")
+    assert orjson.loads(found.body) == [
+        {"index": "logs-1", "docs": "9"},
+        {"index": "logs-2", "docs": "10"},
+    ]
+    found = bundle.find("GET", "/_cat/shards?format=json&s=index:desc&h=ind*")
+    assert [row["index"] for row in orjson.loads(found.body)] == [
+        "metrics",
+        "logs-2",
+        "logs-1",
+    ]
+
+
+def test_requests_fall_back_to_captures_with_their_parameters(bundle, caplog):
+    assert bundle.find("GET", "/_cluster/health?pretty=false") is not None
+    with caplog.at_level("WARNING", logger="esctl"):
+        tasks = bundle.find("GET", "/_tasks")
+    assert tasks.target == "/_tasks?detailed=true"
+    assert "Replaying GET /_tasks from /_tasks?detailed=true" in caplog.text
+    # The capture lacks parameters which change the response
+    assert bundle.find("GET", "/_cluster/health?level=indices") is None
+    assert bundle.find("GET", "/_tasks?actions=*reindex") is None
+    assert bundle.find("GET", "/_nodes/stats") is None
+    # Bodies are compared by value, not by their serialization
+    explain = bundle.find(
+        "POST",
+        "/_cluster/allocation/explain",
+        b'{"shard": 1, "index": "metrics", "primary": false}',
+    )
+    assert orjson.loads(explain.body) == {"allocate_explanation": "no nodes"}
+    assert (
+        bundle.find(
+            "POST",
+            "/_cluster/allocation/explain?include_disk_info=true",
+            b'{"shard": 1, "index": "metrics", "primary": false}',
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.zst"])
+def test_bundle_roundtrip(bundle, tmp_path, suffix):
+    if suffix == ".tar.zst" and zstd_compress is None:
+        pytest.skip("zstd is not available")
+    path = tmp_path / f"bundle{suffix}"
+    bundle.save(path)
+    loaded = Bundle.load(path)
+    assert loaded.info == {"context": "prod"}
+    assert loaded.responses == bundle.responses
+
+
+def test_client_is_served_from_the_bundle(bundle, tmp_path):
+    path = tmp_path / "bundle.tar.gz"
+    bundle.save(path)
+    client = BundleClientFactory(path)
+    assert isinstance(client, Elasticsearch8)
+    shards = client.cat.shards(format="json", h=["index", "state"], s=["state"])
+    assert shards.body[-1] == {"index": "metrics", "state": "UNASSIGNED"}
+    assert client.cluster.health().body == {"status": "yellow"}
+    with pytest.raises(ApiError) as e:
+        client.indices.delete(index="logs-1")
+    assert e.value.meta.status == 405
+    with pytest.raises(ApiError) as e:
+        client.nodes.stats()
+    assert e.value.meta.status == 404
+
+
+def test_capture_explains_unassigned_shards():
+    requests = []
+
+    def perform_request(method, target, headers=None, body=None):
+        requests.append((method, target))
+        data = SHARDS if target.startswith("/_cat/shards") else {}
+        meta = ApiResponseMeta(
+            status=200,
+            http_version="1.1",
+            headers=HttpHeaders({"content-type": "application/json"}),
+            duration=0.1,
+            node=None,  # type: ignore[arg-type]
+        )
+        return SimpleNamespace(meta=meta, body=data)
+
+    client = SimpleNamespace(transport=SimpleNamespace(perform_request=perform_request))
+    bundle = capture(client, {"context": "prod"})
+    assert len(bundle.responses) == len(CAPTURE_TARGETS) + 1
+    assert ("POST", "/_cluster/allocation/explain") in requests
+    assert bundle.find(
+        "POST",
+        "/_cluster/allocation/explain",
+        {"index": "metrics", "shard": "1", "primary": False},
+    )
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    def connect(*args, **kwargs):
+        raise AssertionError("reached the network")
+
+    monkeypatch.setattr(socket, "create_connection", connect)
+    monkeypatch.setattr(socket.socket, "connect", connect)
+
+
+def test_exec_is_served_from_the_bundle(bundle, tmp_path, offline):
+    from esctl.cli import app
+
+    path = tmp_path / "bundle.tar.gz"
+    bundle.save(path)
+    result = CliRunner().invoke(
+        app,
+        ["--bundle", str(path), "exec"],
+        input='print(client.cluster.health()["status"], cache)',
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == "yellow None"
+
+
+def test_shell_is_served_from_the_bundle(bundle, tmp_path, offline, mocker):
+    from esctl.cli import app
+
+    path = tmp_path / "bundle.tar.gz"
+    bundle.save(path)
+    start_ipython = mocker.patch("esctl.commands.shell.start_ipython")
+    result = CliRunner().invoke(app, ["--bundle", str(path), "shell"])
+    assert result.exit_code == 0, result.output
+    client = start_ipython.call_args.kwargs["user_ns"]["client"]
+    assert client.cluster.health().body == {"status": "yellow"}
+    config = start_ipython.call_args.kwargs["config"]
+    assert config.TerminalInteractiveShell.term_title_format == "esctl [bundle.tar.gz]"
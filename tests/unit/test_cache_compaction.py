@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+from esctl.transport import cache as cache_module
+from esctl.transport.cache import Cache, compact
+
+
+@pytest.fixture
+def random_response(make_response):
+    # Random, so that compression leaves the size alone
+    return lambda size: make_response(os.urandom(size))
+
+
+@pytest.fixture
+def caches(cache):
+    other = Cache("compaction-b")
+    other.clear()
+    yield cache, other
+    other.clear()
+    other.conn.close()
+
+
+def _targets(cache: Cache) -> set[str]:
+    return {target for _, target, _ in cache.entries()}
+
+
+def test_expired_responses_are_purged(caches, random_response):
+    a, _ = caches
+    a.set("GET", "/expired", random_response(10), ttl=-1)
+    a.set("GET", "/fresh", random_response(10))
+    assert compact(a.conn, force=True)
+    assert _targets(a) == {"/fresh"}
+
+
+def test_least_recently_used_are_evicted_per_context(
+    caches, random_response, monkeypatch
+):
+    a, _ = caches
+    monkeypatch.setattr(cache_module, "MiB", 1000)  # limits in KB
+    monkeypatch.setattr(cache_module, "ESCTL_CACHE_CONTEXT_MAX_SIZE", 2)
+    for target in ("/old", "/used", "/new"):
+        a.set("GET", target, random_response(1200))
+    a.conn.execute(f"UPDATE http_cache_{a.context_name} SET last_access = 1;")
+    a.get("GET", "/used")
+    a.flush_touches()
+    compact(a.conn, force=True)
+    assert _targets(a) == {"/used"}
+
+
+def test_global_limit_spans_contexts(caches, random_response, monkeypatch):
+    a, b = caches
+    monkeypatch.setattr(cache_module, "MiB", 1000)
+    monkeypatch.setattr(cache_module, "ESCTL_CACHE_MAX_SIZE", 2)
+    a.set("GET", "/old", random_response(1200))
+    a.conn.execute(f"UPDATE http_cache_{a.context_name} SET last_access = 1;")
+    b.set("GET", "/recent", random_response(1200))
+    b.set("GET", "/latest", random_response(1200))
+    b.conn.execute(
+        f"UPDATE http_cache_{b.context_name} SET last_access = 2 "
+        "WHERE target = '/recent';"
+    )
+    compact(a.conn, force=True)
+    assert _targets(a) == set()
+    assert _targets(b) == {"/latest"}
+
+
+def test_compaction_runs_once_per_interval(caches):
+    a, _ = caches
+    compact(a.conn, force=True)
+    assert not compact(a.conn)
+    a.conn.execute(
+        "UPDATE cache_compaction SET last_run = ?;",
+        (int(time.time()) - cache_module.ESCTL_CACHE_COMPACTION_INTERVAL - 1,),
+    )
+    assert compact(a.conn)
@@ -0,0 +1,33 @@
+import pytest
+
+from esctl.transport.cache import _canon_target
+
+
+@pytest.mark.parametrize(
+    "target, canonical",
+    [
+        ("/_cat/health", "/_cat/health"),
+        ("/_cat/indices?", "/_cat/indices"),
+        ("/_cat/indices?h=index&format=json", "/_cat/indices?format=json&h=index"),
+        ("/_cat/indices?format=json&pretty=false&v=false", "/_cat/indices?format=json"),
+        ("/_cat/indices?v=true", "/_cat/indices?v=true"),
+        # Column order shows in the response
+        ("/_cat/indices?h=index,health", "/_cat/indices?h=index,health"),
+        ("/logs?expand_wildcards=open,closed", "/logs?expand_wildcards=closed,open"),
+        (
+            "/_nodes?filter_path=nodes.*.name,_nodes",
+            "/_nodes?filter_path=_nodes,nodes.*.name",
+        ),
+        ("/logs%2A?s=a&s=b", "/logs%2A?s=a&s=b"),
+        ("/_cat/indices?h=index%2Chealth", "/_cat/indices?h=index,health"),
+    ],
+)
+def test_canonical_target(target, canonical):
+    assert _canon_target(target) == canonical
+
+
+def test_equivalent_targets_share_their_entry(cache, make_response):
+    cache.set("GET", "/_cat/indices?h=index&format=json", make_response(b"[]"))
+    cache.memory.clear()
+    assert cache.get("GET", "/_cat/indices?format=json&pretty=false&h=index")
+    assert cache.get("GET", "/_cat/indices?format=json&h=health") is None
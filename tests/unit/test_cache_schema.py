@@ -0,0 +1,108 @@
+import sqlite3
+
+import orjson
+import pytest
+
+from esctl.transport import cache as cache_module
+from esctl.transport.cache import SCHEMA_VERSION, Cache, connect
+
+
+BODY = orjson.dumps([{"index": f"logs-{i}", "shard": i % 5} for i in range(500)])
+
+
+@pytest.fixture
+def response(make_response):
+    return make_response(BODY, duration=0.25)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "cache.db"
+    monkeypatch.setattr(cache_module, "ESCTL_CACHE_DB_PATH", path)
+    return path
+
+
+def test_bodies_are_stored_compressed(db_path, response):
+    cache = Cache("schema-test")
+    cache.set("GET", "/_cat/shards", response)
+    codec, size = cache.conn.execute(
+        "SELECT codec, length(body) FROM http_cache_schema_test;"
+    ).fetchone()
+    assert codec in ("zstd", "zlib")
+    assert size < len(BODY) / 4
+    response = cache.get("GET", "/_cat/shards")
+    assert response.body == BODY
+    assert response.meta.headers["content-type"] == "application/json"
+    assert response.meta.duration == 0.25
+    cache.conn.close()
+
+
+def test_small_bodies_are_stored_as_is(db_path, make_response):
+    cache = Cache("schema-test")
+    cache.set("GET", "/", make_response())
+    assert cache.conn.execute(
+        "SELECT codec, body FROM http_cache_schema_test;"
+    ).fetchone() == ("identity", b"{}")
+    cache.conn.close()
+
+
+def test_unknown_codec_is_a_miss(db_path, response):
+    cache = Cache("schema-test")
+    cache.set("GET", "/_cat/shards", response)
+    cache.conn.execute("UPDATE http_cache_schema_test SET codec = 'brotli';")
+    cache.memory.clear()
+    assert cache.get("GET", "/_cat/shards") is None
+    cache.conn.close()
+
+
+def test_legacy_database_is_migrated(db_path):
+    legacy = sqlite3.connect(db_path)
+    legacy.execute(
+        """
+        CREATE TABLE http_cache_legacy (
+            cache_key BLOB PRIMARY KEY, method TEXT NOT NULL, target TEXT NOT NULL,
+            headers_json TEXT NOT NULL, response TEXT NOT NULL,
+            stored_at INTEGER NOT NULL, ttl INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    legacy.execute(
+        "CREATE INDEX http_cache_legacy_method_target "
+        "ON http_cache_legacy(method, target);"
+    )
+    key = cache_module._make_cache_key("GET", "/_cat/shards", "{}")
+    envelope = {
+        "status": 200,
+        "headers": {"content-type": "application/json"},
+        "http_version": "1.1",
+        "body": BODY.decode(),
+    }
+    legacy.execute(
+        "INSERT INTO http_cache_legacy VALUES (?, 'GET', '/_cat/shards', '{}', ?, "
+        "strftime('%s', 'now'), 300);",
+        (key, orjson.dumps(envelope).decode()),
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = connect()
+    assert conn.execute("PRAGMA user_version;").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+    cache = Cache("legacy")
+    response = cache.get("GET", "/_cat/shards")
+    assert response.body == BODY
+    assert response.meta.status == 200
+    assert cache.entries()[0][2] < len(BODY)
+    cache.conn.close()
+
+
+def test_stats_tables_are_not_cache_tables(db_path, make_response):
+    # Cache table http_cache_stats_bar, statistics in http_stats_stats_bar
+    cache = Cache("stats_bar")
+    cache.set("GET", "/", make_response())
+    cache.stats.miss("GET", "/")
+    cache.stats.flush()
+    assert cache_module._cache_tables(cache.conn) == ["http_cache_stats_bar"]
+    assert cache.stats.table == "http_stats_stats_bar"
+    assert cache.get("GET", "/").body == b"{}"
+    cache.conn.close()
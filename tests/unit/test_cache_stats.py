@@ -0,0 +1,53 @@
+import pytest
+
+from esctl.transport.cache import Cache
+from esctl.transport.stats import endpoint_pattern
+
+
+@pytest.mark.parametrize(
+    "target, pattern",
+    [
+        ("/", "GET /"),
+        ("/_cat/health?format=json", "GET /_cat/health"),
+        ("/_cat/indices/logs-*", "GET /_cat/indices/*"),
+        ("/logs-2024/_doc/42", "GET /*/_doc/*"),
+        ("/_nodes/node-1/stats", "GET /_nodes/*/*"),
+    ],
+)
+def test_endpoint_pattern(target, pattern):
+    assert endpoint_pattern("get", target) == pattern
+
+
+def test_hits_and_misses_are_recorded(node, make_response):
+    node.upstream.return_value = make_response(b'{"status":"green"}', duration=0.5)
+    for _ in range(3):
+        response = node.perform_request("GET", "/_cat/health?format=json")
+        assert response.body == b'{"status":"green"}'
+    assert node.upstream.call_count == 1
+    stats = node.cache.stats.rows()["GET /_cat/health"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["bytes_served"] == 2 * len(b'{"status":"green"}')
+    assert 0 < stats["latency_saved"] <= 1.0
+
+
+def test_expirations_are_recorded(node, make_response):
+    node.cache.set("GET", "/_cat/health", make_response(), ttl=-1)
+    node.perform_request("GET", "/_cat/health")
+    stats = node.cache.stats.rows()["GET /_cat/health"]
+    assert (stats["expirations"], stats["misses"], stats["hits"]) == (1, 1, 0)
+
+
+def test_writes_are_not_recorded(node):
+    node.perform_request("POST", "/_cache/clear")
+    assert node.cache.stats.rows() == {}
+
+
+def test_stats_survive_reopening():
+    cache = Cache("stats-reopen")
+    cache.stats.reset()
+    cache.stats.miss("GET", "/_cat/health")
+    cache.close()
+    cache = Cache("stats-reopen")
+    assert cache.stats.rows()["GET /_cat/health"]["misses"] == 1
+    cache.close()
@@ -0,0 +1,129 @@
+from elasticsearch8 import Elasticsearch as Elasticsearch8
+from elasticsearch9 import Elasticsearch as Elasticsearch9
+import pytest
+
+from esctl.transport import HTTPClientFactory, HTTPNodeClassFactory, identity, sessions
+from esctl.transport.identity import (
+    ClusterIdentity,
+    detect_cluster_identity,
+    forget_cluster_identity,
+    is_version_mismatch,
+)
+from esctl.transport.metadata import MetadataStore
+
+
+IDENTITY = ClusterIdentity(major=8, cluster_uuid="uuid-1", node_name="es-0")
+
+
+@pytest.fixture(autouse=True)
+def _forget_identity():
+    forget_cluster_identity("identity-test")
+
+
+def _detect(cache_enabled=True):
+    return detect_cluster_identity(
+        "identity-test", cache_enabled, object, "http", "localhost", 9200
+    )
+
+
+def test_warm_invocation_skips_probe(mocker):
+    probe = mocker.patch.object(
+        identity, "_probe_cluster_identity", return_value=IDENTITY
+    )
+    assert _detect() == IDENTITY
+    assert _detect() == IDENTITY
+    assert probe.call_count == 1
+
+
+def test_no_cache_always_probes(mocker):
+    probe = mocker.patch.object(
+        identity, "_probe_cluster_identity", return_value=IDENTITY
+    )
+    _detect(cache_enabled=False)
+    _detect(cache_enabled=False)
+    assert probe.call_count == 2
+
+
+def test_forget_forces_reprobe(mocker):
+    probe = mocker.patch.object(
+        identity, "_probe_cluster_identity", return_value=IDENTITY
+    )
+    _detect()
+    forget_cluster_identity("identity-test")
+    _detect()
+    assert probe.call_count == 2
+
+
+def test_metadata_store_expires(mocker):
+    store = MetadataStore("identity-test")
+    store.set("something", {"a": 1}, ttl=60)
+    assert store.get("something") == {"a": 1}
+    mocker.patch("esctl.transport.metadata.time.time", return_value=2**40)
+    assert store.get("something") is None
+
+
+def test_is_version_mismatch(make_response):
+    body = b'{"error":{"type":"media_type_header_exception"},"status":400}'
+    assert is_version_mismatch(make_response(body, status=400))
+    assert not is_version_mismatch(make_response(b'{"error":{}}', status=400))
+    assert not is_version_mismatch(make_response())
+
+
+ROOT = b'{"name":"es-0","cluster_uuid":"uuid-1","version":{"number":"8.19.0"}}'
+HEADERS = {"content-type": "application/json", "x-elastic-product": "Elasticsearch"}
+MISMATCH = b'{"error":{"type":"media_type_header_exception"},"status":400}'
+
+
+def _detect_with(node_class):
+    return detect_cluster_identity(
+        "identity-test", True, node_class, "http", "localhost", 9200
+    )
+
+
+def test_probe_bypasses_the_cache(upstream, make_response):
+    upstream.return_value = make_response(ROOT)
+    Node = HTTPNodeClassFactory("identity-test", True, None, None)
+    assert _detect_with(Node) == IDENTITY
+    cache = sessions.cache("identity-test")
+    cache.stats.flush()
+    assert cache.entries() == []
+    assert cache.stats.rows() == {}
+
+
+@pytest.fixture
+def upgraded_cluster(upstream, make_response):
+    """An ES 8 cluster, persisted as an ES 9 one. Yields the statuses it sent."""
+    statuses = []
+
+    def respond(*args):
+        if "compatible-with=9" in str(args):
+            response = make_response(MISMATCH, status=400)
+        else:
+            response = make_response(ROOT, headers=HEADERS)
+        statuses.append(response.meta.status)
+        return response
+
+    upstream.side_effect = respond
+    sessions.cache("identity-test").clear()
+    MetadataStore("identity-test").set(
+        identity.IDENTITY_KIND, {**IDENTITY._asdict(), "major": 9}, ttl=60
+    )
+    yield statuses
+    sessions.close()
+
+
+def test_client_is_rebuilt_when_the_cluster_version_changes(upgraded_cluster):
+    client = sessions.client(
+        "identity-test",
+        True,
+        lambda: HTTPClientFactory(
+            "identity-test", True, "http://localhost:9200", None, None
+        ),
+    )
+    assert isinstance(client, Elasticsearch9)
+    assert client.info()["cluster_uuid"] == "uuid-1"
+    assert isinstance(sessions.current_client("identity-test", True), Elasticsearch8)
+    assert MetadataStore("identity-test").get(identity.IDENTITY_KIND)["major"] == 8
+    # Clients handed out before go through the rebuilt one from now on
+    assert client.options(request_timeout=5).cluster.health()["name"] == "es-0"
+    assert upgraded_cluster.count(400) == 1
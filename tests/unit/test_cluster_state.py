@@ -0,0 +1,96 @@
+import orjson
+import pytest
+
+from esctl.transport import clusterstate
+from esctl.transport.clusterstate import ClusterStateTracker, is_metadata_derived
+from esctl.transport.transport import CacheHttpNode
+
+
+@pytest.mark.parametrize(
+    "target, expected",
+    [
+        ("/_cat/indices?format=json", True),
+        ("/_cat/aliases/logs", True),
+        ("/logs-*", True),
+        ("/.kibana/_settings", True),
+        ("/logs/_mapping/field/message", True),
+        ("/_index_template/logs", True),
+        ("/_cluster/settings", True),
+        ("/_cat/health", False),
+        ("/_cat/shards", False),
+        ("/_nodes/stats", False),
+        ("/logs/_doc/1", False),
+        ("/logs/_search", False),
+        ("/", False),
+    ],
+)
+def test_metadata_derived_endpoints(target, expected):
+    assert is_metadata_derived("GET", target) is expected
+
+
+class FakeCluster:
+    """Answers the state version check, and index listings."""
+
+    def __init__(self, make_response):
+        self.make_response = make_response
+        self.version = 1
+        self.indices = ["logs-1"]
+        self.requests: list[str] = []
+
+    def __call__(self, method, target, *args, **kwargs):
+        self.requests.append(target)
+        if target == clusterstate.STATE_VERSION_TARGET:
+            body = {"cluster_uuid": "uuid", "version": self.version}
+        else:
+            body = self.indices
+        return self.make_response(orjson.dumps(body))
+
+
+@pytest.fixture
+def cluster(upstream, make_response):
+    cluster = FakeCluster(make_response)
+    upstream.side_effect = cluster
+    return cluster
+
+
+def _cat_indices(node: CacheHttpNode) -> list[str]:
+    return orjson.loads(node.perform_request("GET", "/_cat/indices").body)
+
+
+def test_metadata_is_served_while_the_state_is_unchanged(node, cluster):
+    assert _cat_indices(node) == ["logs-1"]
+    node.cache.cluster_state.forget()  # as in a new process
+    assert _cat_indices(node) == ["logs-1"]
+    assert cluster.requests.count("/_cat/indices") == 1
+    assert cluster.requests.count(clusterstate.STATE_VERSION_TARGET) == 2
+
+
+def test_metadata_is_refetched_when_the_state_changes(node, cluster):
+    _cat_indices(node)
+    cluster.version, cluster.indices = 2, ["logs-1", "logs-2"]
+    node.cache.cluster_state.forget()
+    assert _cat_indices(node) == ["logs-1", "logs-2"]
+
+
+def test_state_is_checked_once_per_interval(node, cluster):
+    _cat_indices(node)
+    node.perform_request("GET", "/_cat/aliases")
+    assert cluster.requests.count(clusterstate.STATE_VERSION_TARGET) == 1
+
+
+def test_writes_trigger_a_new_check(node, cluster):
+    _cat_indices(node)
+    node.perform_request("PUT", "/logs-2")
+    cluster.version, cluster.indices = 2, ["logs-1", "logs-2"]
+    assert _cat_indices(node) == ["logs-1", "logs-2"]
+
+
+def test_other_endpoints_do_not_check(node, cluster):
+    node.perform_request("GET", "/_cat/health")
+    assert clusterstate.STATE_VERSION_TARGET not in cluster.requests
+
+
+def test_failed_check_falls_back_to_ttl(make_response):
+    tracker = ClusterStateTracker()
+    assert tracker.current(lambda target: make_response(status=403)) is None
+    assert tracker.current(lambda target: 1 / 0) is None  # not checked again
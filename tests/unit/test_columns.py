@@ -0,0 +1,66 @@
+from esctl.options.columns import (
+    ArrayColumn,
+    Columns,
+    DictColumn,
+    ObjectColumn,
+    make_column,
+)
+from esctl.options.output import Result
+
+
+ROWS = [
+    {"index": "logs", "docs": "10", "state": "STARTED"},
+    {"index": "metrics", "docs": "9", "state": "UNASSIGNED"},
+    {"index": "logs", "docs": "100", "state": "STARTED"},
+]
+
+
+def test_columns_roundtrip():
+    rows = [*ROWS, {"index": "traces", "extra": None}]
+    columns = Columns.from_rows(rows)
+    assert columns.names == ["index", "docs", "state", "extra"]
+    assert len(columns) == 4
+    assert columns.rows() == rows
+
+
+def test_column_types():
+    assert isinstance(make_column([1, 2, 3]), ArrayColumn)
+    assert isinstance(make_column([1.5, 2.0]), ArrayColumn)
+    assert isinstance(make_column([{"a": 1}]), ObjectColumn)
+    column = make_column(["STARTED", "STARTED", "UNASSIGNED", "STARTED"])
+    assert isinstance(column, DictColumn)
+    assert column.values == ["STARTED", "UNASSIGNED"]
+    # Equal, but not the same value
+    assert list(make_column([1, True, 1.0, None])) == [1, True, 1.0, None]
+
+
+def test_distinct_values_are_mapped_once():
+    calls = []
+    column = make_column(["a", "b", "a", "a"])
+    mapped = list(column.map(lambda value: calls.append(value) or value.upper()))
+    assert mapped == ["A", "B", "A", "A"]
+    assert calls == ["a", "b"]
+
+
+def test_sort():
+    columns = Columns.from_rows(ROWS).sort([("index", True), ("docs", False)])
+    assert list(columns["index"]) == ["metrics", "logs", "logs"]
+    # Numbers are compared as such
+    assert list(columns["docs"]) == ["9", "10", "100"]
+    # Unknown columns are skipped, values can be compared by any key
+    columns = Columns.from_rows(ROWS).sort([("unknown", False), ("docs", False)], len)
+    assert list(columns["docs"]) == ["9", "10", "100"]
+
+
+def test_result_sort():
+    result = Result(ROWS)
+    result.sort(["docs:desc"])
+    assert [row["docs"] for row in result.value] == ["100", "10", "9"]
+
+
+def test_result_value_can_be_replaced():
+    result = Result({"acknowledged": True})
+    assert result.columns is None
+    result.value = ROWS
+    assert result.columns is not None
+    assert result.value == ROWS
@@ -48,3 +48,32 @@ def test_inject_context_names():
     )
     assert cfg.contexts["prod"].name == "prod"
     assert cfg.contexts["staging"].name == "staging"
+
+
+def test_github_auth_command_runs_once(mocker):
+    check_output = mocker.patch(
+        "esctl.config.config.subprocess.check_output", return_value=b"token\n"
+    )
+    cfg = Config.model_validate(
+        {
+            "contexts": {},
+            "current_context": "",
+            "github_auth_command": "gh auth token --hostname github.test",
+        }
+    )
+    assert cfg.github_auth == "token"
+    assert cfg.github_auth == "token"
+    check_output.assert_called_once_with(
+        ["gh", "auth", "token", "--hostname", "github.test"]
+    )
+
+
+def test_github_token_not_resolved_when_reporting_disabled(monkeypatch):
+    from esctl.utils import try_create_github_issue
+
+    monkeypatch.setenv("ESCTL_DISABLE_ISSUE_REPORTING", "1")
+
+    def get_token():
+        raise AssertionError("token resolved")
+
+    try_create_github_issue(ValueError("boom"), get_token, "unknown")
@@ -0,0 +1,226 @@
+from base64 import b64encode
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from kubernetes import client as kube_client
+import pytest
+
+from esctl.config import Config
+from esctl.transport.discovery import (
+    IN_CLUSTER_DISCOVERY_KIND,
+    DiscoveryError,
+    discover_eck,
+    forget_eck_discovery,
+    is_pod_gone,
+)
+from esctl.transport.metadata import MetadataStore
+
+
+PASSWORD = b64encode(b"s3cret").decode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def _forget_discovery():
+    forget_eck_discovery("discovery-test")
+
+
+def _pod(name, ready=True, **roles):
+    labels = {
+        f"elasticsearch.k8s.elastic.co/node-{role}": str(enabled).lower()
+        for role, enabled in roles.items()
+    }
+    condition = SimpleNamespace(type="Ready", status=str(ready))
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, labels=labels),
+        status=SimpleNamespace(conditions=[condition]),
+    )
+
+
+def _api(*pods) -> Mock:
+    api = Mock()
+    api.list_namespaced_pod.return_value = SimpleNamespace(
+        items=list(pods) or [_pod("prod-es-master-0", master=True)]
+    )
+    api.read_namespaced_secret.return_value = SimpleNamespace(
+        data={"elastic": PASSWORD}
+    )
+    return api
+
+
+def _discover(api, cache_enabled=True):
+    return discover_eck("discovery-test", cache_enabled, api, "default", "prod")
+
+
+def test_discovery():
+    api = _api()
+    discovery = _discover(api)
+    assert discovery.pod_names == ["prod-es-master-0"]
+    assert discovery.service_host == "prod-es-http.default.svc"
+    assert (discovery.username, discovery.password) == ("elastic", "s3cret")
+    api.read_namespaced_secret.assert_called_once_with(
+        "prod-es-elastic-user", "default"
+    )
+    api.list_namespaced_secret.assert_not_called()
+
+
+def test_warm_invocation_skips_lookups():
+    _discover(_api())
+    api = _api()
+    discovery = _discover(api)
+    assert discovery.pod_names == ["prod-es-master-0"]
+    assert discovery.password == "s3cret"
+    api.list_namespaced_pod.assert_not_called()
+    # The credentials are read again, from the secret found the first time
+    api.read_namespaced_secret.assert_called_once_with(
+        "prod-es-elastic-user", "default"
+    )
+
+
+def test_secrets_are_not_stored():
+    api = _api()
+    api.read_namespaced_secret.side_effect = lambda name, namespace: {
+        "prod-es-elastic-user": SimpleNamespace(data={"elastic": PASSWORD}),
+        "prod-es-http-certs-public": SimpleNamespace(
+            data={"ca.crt": b64encode(b"PEM").decode("utf-8")}
+        ),
+    }[name]
+    discover_eck("discovery-test", True, api, "default", "prod", in_cluster=True)
+    store = MetadataStore("discovery-test")
+    stored = store.get(IN_CLUSTER_DISCOVERY_KIND)
+    store.close()
+    assert stored == {
+        "pod_names": [],
+        "service_host": "prod-es-http.default.svc",
+        "namespace": "default",
+        "user_secret": "prod-es-elastic-user",
+        "ca_secret": "prod-es-http-certs-public",
+    }
+    warm = discover_eck("discovery-test", True, api, "default", "prod", True)
+    assert (warm.password, warm.ca_certificate) == ("s3cret", "PEM")
+
+
+def test_replaced_secret_is_looked_up_again():
+    _discover(_api())
+    api = _api()
+    api.read_namespaced_secret.side_effect = kube_client.ApiException(status=404)
+    api.list_namespaced_secret.return_value = SimpleNamespace(
+        items=[
+            SimpleNamespace(
+                metadata=SimpleNamespace(name="custom-elastic-user"),
+                data={"elastic": PASSWORD},
+            )
+        ]
+    )
+    assert _discover(api).password == "s3cret"
+    api.list_namespaced_pod.assert_called_once()
+
+
+def test_no_cache_always_asks_api():
+    _discover(_api())
+    api = _api()
+    _discover(api, cache_enabled=False)
+    api.list_namespaced_pod.assert_called_once()
+
+
+def test_requests_go_to_data_pods():
+    api = _api(
+        _pod("prod-es-master-0", master=True, data=False),
+        _pod("prod-es-data-1", master=False, data=True),
+        _pod("prod-es-data-0", master=False, data=True),
+        _pod("prod-es-data-2", ready=False, master=False, data=True),
+    )
+    assert _discover(api).pod_names == ["prod-es-data-0", "prod-es-data-1"]
+
+
+def test_coordinating_pods_are_preferred():
+    api = _api(
+        _pod("prod-es-data-0", master=True, data=True, ingest=True),
+        _pod("prod-es-coord-0", master=False, data=False, ingest=False),
+    )
+    assert _discover(api).pod_names == ["prod-es-coord-0"]
+
+
+def test_no_pod_raises():
+    api = Mock()
+    api.list_namespaced_pod.return_value = SimpleNamespace(items=[])
+    with pytest.raises(DiscoveryError, match="No pod found"):
+        _discover(api)
+
+
+def test_no_secret_raises():
+    api = _api()
+    api.read_namespaced_secret.side_effect = kube_client.ApiException(status=404)
+    api.list_namespaced_secret.return_value = SimpleNamespace(items=[])
+    with pytest.raises(DiscoveryError, match="No elastic user secret"):
+        _discover(api)
+
+
+def test_discovery_errors_are_printed(tmp_path, mocker, capsys):
+    from esctl.cli import app
+
+    def client(self):
+        raise DiscoveryError("No pod found for Elasticsearch cluster prod")
+
+    mocker.patch.object(Config, "client", property(client))
+    bundle = tmp_path / "bundle.tar"
+    bundle.touch()
+    with pytest.raises(SystemExit) as e:
+        app(["--bundle", str(bundle), "cat", "health"], prog_name="esctl")
+    assert e.value.code == 1
+    assert (
+        "Error: No pod found for Elasticsearch cluster prod" in capsys.readouterr().out
+    )
+
+
+def test_secret_falls_back_to_labels():
+    api = _api()
+    api.read_namespaced_secret.side_effect = kube_client.ApiException(status=404)
+    api.list_namespaced_secret.return_value = SimpleNamespace(
+        items=[
+            SimpleNamespace(
+                metadata=SimpleNamespace(name="custom-elastic-user"),
+                data={"elastic": PASSWORD},
+            )
+        ]
+    )
+    assert _discover(api).password == "s3cret"
+
+
+def test_in_cluster_discovery():
+    api = _api()
+    api.read_namespaced_secret.side_effect = lambda name, namespace: {
+        "prod-es-elastic-user": SimpleNamespace(data={"elastic": PASSWORD}),
+        "prod-es-http-certs-public": SimpleNamespace(
+            data={"ca.crt": b64encode(b"PEM").decode("utf-8")}
+        ),
+    }[name]
+    discovery = discover_eck(
+        "discovery-test", True, api, "default", "prod", in_cluster=True
+    )
+    assert discovery.service_host == "prod-es-http.default.svc"
+    assert discovery.ca_certificate == "PEM"
+    assert discovery.pod_names == []
+    api.list_namespaced_pod.assert_not_called()
+
+
+def test_in_cluster_without_tls():
+    api = _api()
+
+    def read_secret(name, namespace):
+        if name == "prod-es-http-certs-public":
+            raise kube_client.ApiException(status=404)
+        return SimpleNamespace(data={"elastic": PASSWORD})
+
+    api.read_namespaced_secret.side_effect = read_secret
+    discovery = discover_eck(
+        "discovery-test", True, api, "default", "prod", in_cluster=True
+    )
+    assert discovery.ca_certificate is None
+
+
+def test_is_pod_gone():
+    assert is_pod_gone(kube_client.ApiException(status=404))
+    assert is_pod_gone(
+        kube_client.ApiException(status=0, reason="Handshake status 404 Not Found")
+    )
+    assert not is_pod_gone(kube_client.ApiException(status=403))
@@ -0,0 +1,97 @@
+import pytest
+
+from esctl.transport.invalidation import (
+    INDEX_LISTINGS,
+    Invalidation,
+    invalidation,
+    matches_indices,
+)
+from esctl.transport.transport import CacheHttpNode
+
+
+@pytest.mark.parametrize(
+    "method, target, expected",
+    [
+        ("GET", "/logs/_settings", Invalidation()),
+        ("POST", "/logs/_search", Invalidation()),
+        ("POST", "/_sql?format=txt", Invalidation()),
+        ("PUT", "/logs/_settings", Invalidation(INDEX_LISTINGS, ("logs",))),
+        (
+            "DELETE",
+            "/logs-1,logs-2",
+            Invalidation(INDEX_LISTINGS, ("logs-1", "logs-2")),
+        ),
+        ("PUT", "/_all/_settings", Invalidation(INDEX_LISTINGS, ("*",))),
+        (
+            "PUT",
+            "/_cluster/settings",
+            Invalidation(
+                ("/_cluster", "/_cat/allocation", "/_cat/health", "/_cat/shards")
+            ),
+        ),
+        ("POST", "/_ilm/policy/hot", Invalidation(("/_ilm",))),
+        (
+            "POST",
+            "/_reindex?wait_for_completion=false",
+            Invalidation(("/_reindex", *INDEX_LISTINGS), ("*",)),
+        ),
+    ],
+)
+def test_invalidation(method, target, expected):
+    assert invalidation(method, target) == expected
+
+
+def test_restore_invalidates_every_index():
+    restore = invalidation("POST", "/_snapshot/repo/snap-1/_restore")
+    assert restore.indices == ("*",)
+    assert {"/_snapshot", "/_cat/snapshots", "/_cat/indices"} <= set(restore.prefixes)
+
+
+@pytest.mark.parametrize(
+    "target, expected",
+    [
+        ("/logs-2/_settings", True),
+        ("/logs-*/_mapping", True),
+        ("/other,logs-2", True),
+        ("/_all/_settings", True),
+        ("/logs-20/_settings", False),
+        ("/other/_settings", False),
+        ("/_cat/indices", False),
+    ],
+)
+def test_matches_indices(target, expected):
+    assert matches_indices(target, ("logs-2",)) is expected
+
+
+def _cached(node: CacheHttpNode) -> set[str]:
+    return {target for _, target, _ in node.cache.entries()}
+
+
+def test_writes_drop_related_reads(node, make_response):
+    for target in (
+        "/_cat/indices?format=json",
+        "/_cat/templates",
+        "/logs-2/_settings",
+        "/logs-*/_mapping",
+        "/other/_settings",
+    ):
+        node.cache.set("GET", target, make_response())
+    node.perform_request("PUT", "/logs-2/_settings", body=b"{}")
+    assert _cached(node) == {"/_cat/templates", "/other/_settings"}
+
+
+def test_failed_writes_drop_related_reads(node, make_response):
+    node.cache.set("GET", "/logs/_settings", make_response())
+    node.upstream.side_effect = ConnectionError
+    with pytest.raises(ConnectionError):
+        node.perform_request("DELETE", "/logs")
+    assert _cached(node) == set()
+
+
+def test_reindex_drops_reads_of_the_destination(node, make_response):
+    for target in ("/_cat/indices?format=json", "/dest/_count", "/dest/_settings"):
+        node.cache.set("GET", target, make_response())
+    node.perform_request(
+        "POST", "/_reindex", body=b'{"source":{"index":"src"},"dest":{"index":"dest"}}'
+    )
+    assert _cached(node) == set()
@@ -0,0 +1,84 @@
+import pytest
+
+from esctl.transport.cache import Cache
+from esctl.transport.invalidation import Invalidation
+from esctl.transport.memory import MemoryCache, MemoryEntry
+
+
+@pytest.fixture
+def entry(make_response):
+    def _entry(target: str, size: int) -> MemoryEntry:
+        return MemoryEntry(make_response(), b"", target, 0, 300, 0, None, None, size)
+
+    return _entry
+
+
+def test_least_recently_used_entries_are_evicted(entry):
+    memory = MemoryCache(max_size=100)
+    memory.put("a", entry("/a", 40))
+    memory.put("b", entry("/b", 40))
+    memory.get("a")
+    memory.put("c", entry("/c", 40))
+    assert memory.get("b") is None
+    assert memory.get("a") is not None and memory.get("c") is not None
+    assert memory.size == 80
+
+
+def test_entries_larger_than_the_cache_are_not_kept(entry):
+    memory = MemoryCache(max_size=100)
+    memory.put("a", entry("/a", 101))
+    assert memory.get("a") is None and memory.size == 0
+
+
+@pytest.fixture
+def node(node, make_response):
+    node.upstream.return_value = make_response(b'["logs"]')
+    return node
+
+
+def test_repeated_reads_are_served_from_memory(node):
+    node.perform_request("GET", "/_cat/shards")
+    # Out of reach of the database
+    node.cache.conn.execute(f"DELETE FROM http_cache_{node.cache.context_name};")
+    for _ in range(3):
+        assert node.perform_request("GET", "/_cat/shards").body == b'["logs"]'
+    assert node.upstream.call_count == 1
+    stats = node.cache.stats.rows()["GET /_cat/shards"]
+    assert (stats["hits"], stats["l1_hits"], stats["misses"]) == (3, 3, 1)
+
+
+def test_served_responses_do_not_alter_the_cached_one(node):
+    node.perform_request("GET", "/_cat/shards")
+    first = node.perform_request("GET", "/_cat/shards")
+    first.meta.headers["x-test"] = "1"
+    assert "x-test" not in node.perform_request("GET", "/_cat/shards").meta.headers
+
+
+def test_memory_follows_expiry_and_invalidation(node, make_response):
+    node.cache.set("GET", "/logs/_settings", make_response(), ttl=-1)
+    assert node.cache.get("GET", "/logs/_settings") is None
+    node.cache.set("GET", "/logs/_settings", make_response())
+    node.perform_request("PUT", "/logs/_settings", body=b"{}")
+    assert node.cache.memory.size == 0
+
+
+def test_invalidations_of_other_processes_reach_memory(cache, make_response):
+    agent, other = cache, Cache(cache.context_name)
+    agent.set("GET", "/_cat/indices", make_response(), ttl=300)
+    agent.set("GET", "/_cluster/health", make_response(), ttl=300)
+    assert agent.get("GET", "/_cat/indices") is not None
+
+    # e.g. esctl config cache purge, in another process
+    other.clear()
+    assert agent.get("GET", "/_cat/indices") is None
+    assert agent.get("GET", "/_cluster/health") is None
+    assert len(agent.memory) == 0
+    other.conn.close()
+
+
+def test_own_invalidations_keep_other_responses_in_memory(cache, make_response):
+    cache.set("GET", "/logs/_count", make_response(), ttl=300)
+    cache.set("GET", "/metrics/_count", make_response(), ttl=300)
+    cache.invalidate(Invalidation(indices=("logs",)))
+    assert cache.get("GET", "/logs/_count") is None
+    assert len(cache.memory) == 1
@@ -3,12 +3,14 @@ from io import StringIO
 import elastic_transport
 import pytest
 from rich.console import Console
+import typer
 
 from esctl.options.output import (
     Result,
     jmespath_selector,
     jsonpath_selector,
     noop_selector,
+    validate_output,
 )
 
 
@@ -23,7 +25,7 @@ def test_make_table_from_list_of_dicts():
     r = Result([{"a": 1, "b": 2}, {"a": 3, "b": 4}])
     header, rows = r._make_table()
     assert header == ["a", "b"]
-    assert rows == [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+    assert rows.rows() == [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
 
 
 def test_make_table_excludes_headers():
@@ -38,7 +40,7 @@ def test_make_table_from_dict_uses_header_names():
     r.header_names = {"a": "A", "c": "C"}
     header, rows = r._make_table()
     assert header == ["a", "c"]
-    assert rows == [{"a": 1, "b": 2, "c": 3}]
+    assert rows.rows() == [{"a": 1, "b": 2, "c": 3}]
 
 
 def test_make_table_rejects_scalar():
@@ -92,3 +94,88 @@ def test_jmespath_selector():
         FakeResponse({"version": {"number": "9.0.1"}})
     )
     assert result.value == "9.0.1"
+
+
+def test_print_csv_does_not_wrap_long_rows():
+    r = Result([{"a": "x" * 150, "b": "[b]not markup[/]"}])
+    r.console = Console(file=StringIO(), width=80)
+    r.print("csv")
+    out = r.console.file.getvalue()  # type: ignore
+    assert out.splitlines() == ["a,b", f"{'x' * 150},[b]not markup[/]"]
+
+
+def test_large_tables_are_streamed(monkeypatch):
+    monkeypatch.setattr("esctl.options.output.STREAM_THRESHOLD", 2)
+    monkeypatch.setattr("esctl.options.output.STREAM_SAMPLE", 2)
+    r = Result(
+        [
+            {"index": "a", "state": "STARTED"},
+            {"index": "bb", "state": "STARTED"},
+            {"index": "ccc-overflowing", "state": "UNASSIGNED"},
+        ]
+    )
+    r.console = Console(file=StringIO(), width=20)
+    r.print("table", formatter=lambda col, v: f"[b red]{v}[/]" if col == "state" else v)
+    assert r.console.file.getvalue().splitlines() == [  # type: ignore
+        "index  state",
+        "a      STARTED",
+        "bb     STARTED",
+        "ccc-overflowing  UNASSIGNED",
+    ]
+
+
+def test_streamed_tables_are_styled_on_terminals(monkeypatch):
+    monkeypatch.setattr("esctl.options.output.STREAM_THRESHOLD", 0)
+    r = Result([{"state": "STARTED"}])
+    r.console = Console(file=StringIO(), force_terminal=True, color_system="standard")
+    r.print("table", formatter=lambda col, v: f"[b green]{v}[/]")
+    lines = r.console.file.getvalue().splitlines()  # type: ignore
+    assert lines == ["\x1b[1mstate\x1b[0m", "\x1b[1;32mSTARTED\x1b[0m"]
+
+
+def test_broken_pipe_exits_quietly(mocker):
+    r = Result([{"a": 1}])
+    r.console = Console(file=StringIO())
+    mocker.patch.object(r, "_print_csv", side_effect=BrokenPipeError)
+    on_broken_pipe = mocker.patch.object(
+        r.console, "on_broken_pipe", side_effect=SystemExit(1)
+    )
+    with pytest.raises(SystemExit):
+        r.print("csv")
+    on_broken_pipe.assert_called_once()
+
+
+def test_print_ndjson_and_compact_json():
+    rows = [{"a": 1, "b": "x"}, {"a": 2}]
+    for output, pretty, expected in [
+        ("ndjson", True, '{"a": 1, "b": "x"}\n{"a": 2}\n'),
+        ("json", False, '[{"a": 1, "b": "x"}, {"a": 2}]\n'),
+    ]:
+        r = Result(rows, pretty=pretty)
+        r.console = Console(file=StringIO())
+        r.print(output)
+        assert r.console.file.getvalue() == expected  # type: ignore
+    r = Result({"status": "green"})
+    r.console = Console(file=StringIO())
+    r.print("ndjson")
+    assert r.console.file.getvalue() == '{"status": "green"}\n'  # type: ignore
+
+
+def test_selected_matches_are_streamed():
+    response = FakeResponse([{"index": "logs"}, {"index": "metrics"}, {}])
+    result = jsonpath_selector("jsonpath=$[*].index", pretty=False)(response)
+    result.console = Console(file=StringIO())
+    result.print("ndjson")
+    assert result.console.file.getvalue() == '"logs"\n"metrics"\n'  # type: ignore
+
+    result = jmespath_selector("jmespath=[*].index", pretty=False)(response)
+    assert result.value == ["logs", "metrics"]
+    assert jsonpath_selector("jsonpath=$[*].size", pretty=True)(response).value == []
+
+
+def test_invalid_selectors_are_rejected():
+    ctx = typer.Context(typer.main.get_command(typer.Typer(callback=lambda: None)))
+    ctx.obj = {}
+    ctx.params["context"] = None
+    with pytest.raises(typer.BadParameter, match="Invalid jmespath"):
+        validate_output(ctx, "jmespath=nodes.[")
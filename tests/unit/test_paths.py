@@ -0,0 +1,129 @@
+import jmespath
+from jsonpath_ng import parse as parse_jsonpath
+import pytest
+
+from esctl.options.paths import (
+    _jmespath_steps,
+    _jsonpath_steps,
+    compile_jmespath,
+    compile_jsonpath,
+)
+
+
+DOCUMENT = {
+    "cluster_name": "es",
+    "nodes": {
+        "a1": {"name": "es-0", "roles": ["master", "data"], "ip": None},
+        "b2": {"name": "es-1", "roles": ["data"]},
+    },
+    "shards": [
+        {"index": "logs", "store": "1gb", "routing": {"node": "a1"}},
+        {"index": "metrics", "store": None},
+        "not a shard",
+        [{"index": "nested"}],
+    ],
+    "empty": [],
+}
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "$",
+        "$.cluster_name",
+        "cluster_name",
+        "$.nodes.*.name",
+        "$.nodes.*.roles[0]",
+        "$.nodes.*.roles[-1]",
+        "$.nodes.*.roles[5]",
+        "$.shards[*].index",
+        "$.shards[*].routing.node",
+        "$.shards[*][0]",
+        "$.shards.index",
+        "$.nodes[*].a1.name",
+        "$.nodes.a1.ip",
+        "$.cluster_name[*]",
+        "$.cluster_name[0]",
+        "$.empty[*]",
+        "$.missing[*].index",
+        "*.a1",
+        "$.nodes.a1.roles.*",
+    ],
+)
+def test_jsonpath_fast_path(expression):
+    assert _jsonpath_steps(expression) is not None
+    expected = [match.value for match in parse_jsonpath(expression).find(DOCUMENT)]
+    assert list(compile_jsonpath(expression)(DOCUMENT)) == expected
+
+
+@pytest.mark.parametrize(
+    "expression", ["$..name", "$.shards[0:2].index", "$.nodes.a1 .name"]
+)
+def test_jsonpath_falls_back(expression):
+    assert _jsonpath_steps(expression) is None
+    expected = [match.value for match in parse_jsonpath(expression).find(DOCUMENT)]
+    assert list(compile_jsonpath(expression)(DOCUMENT)) == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "cluster_name",
+        "nodes.a1.name",
+        "nodes.a1.roles[1]",
+        "nodes.a1.roles[-1]",
+        "nodes.a1.roles[7]",
+        "nodes.a1.name.first",
+        "shards[*].index",
+        "shards[*].routing.node",
+        "shards[*][0].index",
+        "shards[*]",
+        "shards[0].index",
+        "nodes[*].name",
+        "missing[*].index",
+        "empty[*].index",
+    ],
+)
+def test_jmespath_fast_path(expression):
+    assert _jmespath_steps(expression) is not None
+    result = compile_jmespath(expression)(DOCUMENT)
+    if result is not None and not isinstance(result, (str, list, dict)):
+        result = list(result)
+    assert result == jmespath.search(expression, DOCUMENT)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["nodes.*.name", "shards[].index", "shards[*].roles[*]", "length(shards)"],
+)
+def test_jmespath_falls_back(expression):
+    assert _jmespath_steps(expression) is None
+    result = compile_jmespath(expression)(DOCUMENT)
+    assert result == jmespath.search(expression, DOCUMENT)
+
+
+class Unread(dict):
+    def __contains__(self, key):
+        raise AssertionError("read past the first match")
+
+    get = __contains__
+
+
+def test_matches_are_lazy():
+    rows = [{"index": "logs"}, Unread()]
+    assert next(compile_jsonpath("$[*].index")(rows)) == "logs"
+    assert next(compile_jmespath("[*].index")(rows)) == "logs"
+
+
+@pytest.mark.parametrize(
+    "compile_, expression",
+    [
+        (compile_jsonpath, "$.["),
+        (compile_jsonpath, "$.where"),
+        (compile_jmespath, "nodes.["),
+        (compile_jmespath, ""),
+    ],
+)
+def test_invalid_expressions(compile_, expression):
+    with pytest.raises(ValueError, match="Invalid"):
+        compile_(expression)
@@ -0,0 +1,69 @@
+from unittest.mock import Mock
+
+import pytest
+
+from esctl.transport import portforward as portforward_module
+from esctl.transport.portforward import PortForwardManager
+
+
+class FakePortForward:
+    def __init__(self, port):
+        self.port = port
+        self.closed = False
+        self.error_message = None
+
+    @property
+    def connected(self):
+        return not self.closed
+
+    def socket(self, port):
+        return ("socket", port, id(self))
+
+    def error(self, port):
+        return self.error_message
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened(mocker):
+    streams = []
+
+    def fake_portforward(api_method, name, namespace, ports):
+        streams.append(FakePortForward(int(ports)))
+        return streams[-1]
+
+    mocker.patch.object(portforward_module, "portforward", fake_portforward)
+    return streams
+
+
+def _manager():
+    return PortForwardManager(api=Mock(), namespace="default")
+
+
+def test_reopening_closes_previous_stream(opened):
+    manager = _manager()
+    manager.open("es-0", 9200)
+    manager.open("es-0", 9200)
+    assert len(opened) == 2
+    assert opened[0].closed
+    assert not opened[1].closed
+
+
+def test_streams_are_per_pod(opened):
+    manager = _manager()
+    manager.open("es-0", 9200)
+    manager.open("es-1", 9200)
+    assert not any(pf.closed for pf in opened)
+    manager.close()
+    assert all(pf.closed for pf in opened)
+
+
+def test_is_alive(opened):
+    manager = _manager()
+    assert not manager.is_alive("es-0", 9200)
+    manager.open("es-0", 9200)
+    assert manager.is_alive("es-0", 9200)
+    opened[0].error_message = "connection refused"
+    assert not manager.is_alive("es-0", 9200)
@@ -0,0 +1,240 @@
+import json
+
+import orjson
+import pytest
+import typer
+from typer.testing import CliRunner
+
+from esctl.options.columns import Columns
+from esctl.options.output import Result
+from esctl.options.query import (
+    format_quantity,
+    parse_aggregation,
+    parse_condition,
+    parse_quantity,
+    run_query,
+)
+from esctl.transport.bundle import Bundle, CapturedResponse
+
+
+SHARDS = [
+    {"index": "logs-1", "state": "STARTED", "node": "es-0", "store": "1.5gb"},
+    {"index": "logs-2", "state": "STARTED", "node": "es-0", "store": "900mb"},
+    {"index": "logs-1", "state": "STARTED", "node": "es-1", "store": "1.5gb"},
+    {"index": "metrics", "state": "UNASSIGNED", "node": None, "store": None},
+]
+
+JSON = {"content-type": "application/json"}
+
+
+def query(conditions=(), group_by=(), aggregations=()):
+    return run_query(
+        Columns.from_rows(SHARDS),
+        [parse_condition(condition) for condition in conditions],
+        list(group_by),
+        [parse_aggregation(aggregation) for aggregation in aggregations],
+    ).rows()
+
+
+def test_parse_quantity():
+    assert parse_quantity("1.5gb") == ("bytes", 1.5 * 1024**3)
+    assert parse_quantity("2m") == ("time", 120_000)
+    assert parse_quantity("42") == ("number", 42)
+    assert parse_quantity(7) == ("number", 7)
+    assert parse_quantity("STARTED") is None
+    assert parse_quantity(None) is None
+
+
+def test_format_quantity():
+    assert format_quantity("bytes", 1.5 * 1024**3) == "1.5gb"
+    assert format_quantity("bytes", 12) == "12b"
+    assert format_quantity("time", 90_000) == "1.5m"
+    assert format_quantity("number", 3.0) == 3
+    assert format_quantity("number", 1 / 3) == 0.33
+
+
+@pytest.mark.parametrize(
+    "condition, indices",
+    [
+        ("state=STARTED", ["logs-1", "logs-2", "logs-1"]),
+        ("state != STARTED", ["metrics"]),
+        ("index=logs-*", ["logs-1", "logs-2", "logs-1"]),
+        ("store>1gb", ["logs-1", "logs-1"]),
+        ("store<=900mb", ["logs-2"]),
+        ("store<1000000000", ["logs-2"]),
+        ("node~^es-1$", ["logs-1"]),
+        ("node=null", ["metrics"]),
+    ],
+)
+def test_conditions(condition, indices):
+    assert [row["index"] for row in query([condition])] == indices
+
+
+def test_conditions_combine():
+    rows = query(["state=STARTED", "node=es-0"])
+    assert [row["index"] for row in rows] == ["logs-1", "logs-2"]
+
+
+@pytest.mark.parametrize("expression", ["state", "store>big", "node~(", "=STARTED"])
+def test_invalid_conditions(expression):
+    with pytest.raises(Exception):
+        parse_condition(expression)
+
+
+@pytest.mark.parametrize(
+    "expression", ["median(store)", "sum", "sum(store,3)", "sum(store"]
+)
+def test_invalid_aggregations(expression):
+    with pytest.raises(ValueError):
+        parse_aggregation(expression)
+
+
+def test_group_by():
+    assert query(group_by=["node"]) == [
+        {"node": "es-0", "count": 2},
+        {"node": "es-1", "count": 1},
+        {"node": None, "count": 1},
+    ]
+
+
+def test_aggregations():
+    rows = query(
+        ["state=STARTED"],
+        ["node"],
+        ["sum(store)", "max(store)", "p50(store)", "count(store)", "topk(index,1)"],
+    )
+    assert rows == [
+        {
+            "node": "es-0",
+            "sum(store)": "2.4gb",
+            "max(store)": "1.5gb",
+            "p50(store)": "900.0mb",
+            "count(store)": 2,
+            "topk(index,1)": "logs-1 (1)",
+        },
+        {
+            "node": "es-1",
+            "sum(store)": "1.5gb",
+            "max(store)": "1.5gb",
+            "p50(store)": "1.5gb",
+            "count(store)": 1,
+            "topk(index,1)": "logs-1 (1)",
+        },
+    ]
+
+
+def test_aggregations_without_group_by():
+    assert query(aggregations=["count", "avg(store)", "topk(index)"]) == [
+        {
+            "count": 4,
+            "avg(store)": "1.3gb",
+            "topk(index)": "logs-1 (2), logs-2 (1), metrics (1)",
+        }
+    ]
+    assert query(["state=RELOCATING"], aggregations=["count", "sum(store)"]) == [
+        {"count": 0, "sum(store)": None}
+    ]
+
+
+def test_unknown_column():
+    with pytest.raises(ValueError, match="Unknown column 'size'"):
+        query(["size>1gb"])
+
+
+def test_result_query():
+    result = Result(SHARDS)
+    result.query(["store>1gb"], ["index,node"], ["count"])
+    assert result.columns.rows() == [
+        {"index": "logs-1", "node": "es-0", "count": 1},
+        {"index": "logs-1", "node": "es-1", "count": 1},
+    ]
+    with pytest.raises(typer.BadParameter):
+        Result(SHARDS).query(group_by=["shard"])
+    with pytest.raises(typer.BadParameter):
+        Result({"status": "green"}).query(where=["status=green"])
+
+
+def test_groups_are_sorted_by_quantity():
+    result = Result(SHARDS)
+    result.query(group_by=["index"], aggregations=["sum(store)"], sort=["sum(store)"])
+    # As text, "3.0gb" would come before "900.0mb"
+    assert [row["index"] for row in result.value] == ["metrics", "logs-2", "logs-1"]
+    result.sort(["index:desc"])
+    assert [row["index"] for row in result.value] == ["metrics", "logs-2", "logs-1"]
+    with pytest.raises(typer.BadParameter, match="Unknown column 'store'"):
+        Result(SHARDS).query(group_by=["node"], sort=["store"])
+    with pytest.raises(typer.BadParameter, match="Invalid order"):
+        Result(SHARDS).query(group_by=["node"], sort=["count:up"])
+
+
+@pytest.fixture
+def shards_bundle(tmp_path):
+    path = tmp_path / "bundle.tar.gz"
+    Bundle(
+        {"context": "prod"},
+        [
+            CapturedResponse(
+                "GET",
+                "/",
+                "",
+                200,
+                JSON,
+                0.1,
+                orjson.dumps({"version": {"number": "8.15.0"}}),
+            ),
+            CapturedResponse(
+                "GET",
+                "/_cat/shards?format=json&h=*",
+                "",
+                200,
+                JSON,
+                0.1,
+                orjson.dumps(SHARDS),
+            ),
+        ],
+    ).save(path)
+    return path
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        (["--where", "state=UNASSIGNED", "-o", "jsonpath=$[*].index"], "metrics"),
+        (
+            ["--where", "store>1gb", "-o", "jmespath=[*].{i: index}"],
+            [{"i": "logs-1"}, {"i": "logs-1"}],
+        ),
+        (
+            [
+                "--group-by",
+                "node",
+                "--where",
+                "state=STARTED",
+                "-o",
+                "jsonpath=$[*].count",
+            ],
+            [2, 1],
+        ),
+        (
+            [
+                "--group-by",
+                "index",
+                "--agg",
+                "sum(store)",
+                "--sort",
+                "sum(store):desc",
+                "-o",
+                "jsonpath=$[*].index",
+            ],
+            ["logs-1", "logs-2", "metrics"],
+        ),
+    ],
+)
+def test_queries_run_before_selectors(shards_bundle, args, expected):
+    from esctl.cli import app
+
+    result = CliRunner().invoke(
+        app, ["--bundle", str(shards_bundle), "--no-pretty", "cat", "shards", *args]
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output) == expected
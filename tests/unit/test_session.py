@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from esctl.config.models.http import HTTPESConfig
+from esctl.transport.session import SessionRegistry
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_client_built_once_per_context():
+    registry = SessionRegistry()
+    built = []
+
+    def factory():
+        built.append(FakeClient())
+        return built[-1]
+
+    first = registry.client("prod", True, factory)
+    assert registry.client("prod", True, factory) is first
+    assert registry.client("prod", False, factory) is not first
+    assert registry.client("staging", True, factory) is not first
+    assert len(built) == 3
+
+
+def test_cache_shared_per_context():
+    registry = SessionRegistry()
+    assert registry.cache("prod") is registry.cache("prod")
+    assert registry.cache("prod") is not registry.cache("staging")
+    registry.close()
+
+
+def test_close_tears_everything_down():
+    registry = SessionRegistry()
+    client = registry.client("prod", True, FakeClient)
+    calls = []
+    registry.on_close(lambda: calls.append("tunnel"))
+    registry.close()
+    assert client.closed
+    assert calls == ["tunnel"]
+    # A closed registry starts afresh
+    assert registry.client("prod", True, FakeClient) is not client
+
+
+def test_config_client_goes_through_registry(mocker):
+    registry = SessionRegistry()
+    mocker.patch("esctl.transport.sessions", registry)
+    factory = mocker.patch.object(
+        HTTPESConfig, "_create_client", side_effect=lambda: FakeClient()
+    )
+    config = HTTPESConfig(type="http", name="prod", host="localhost")
+    assert config.client is config.client
+    assert factory.call_count == 1
+
+
+def test_background_tasks_run_once_per_key_and_are_awaited():
+    registry = SessionRegistry()
+    release = threading.Event()
+    runs = []
+
+    def task():
+        release.wait()
+        runs.append(1)
+
+    registry.run_in_background("refresh", task)
+    registry.run_in_background("refresh", task)
+    release.set()
+    registry.close()
+    assert runs == [1]
+
+
+EXIT_PROBE = """
+import sys, time
+from pathlib import Path
+from esctl.transport.session import SessionRegistry
+
+registry = SessionRegistry()
+def refresh():
+    time.sleep(float(sys.argv[2]))
+    Path(sys.argv[1]).write_text("refreshed")
+registry.run_in_background("refresh", refresh)
+# Exits without closing the registry, like shell completion
+"""
+
+
+def _exit_without_closing(
+    tmp_path, duration: float, timeout: str
+) -> tuple[bool, float]:
+    marker = tmp_path / "refreshed"
+    start = time.monotonic()
+    subprocess.run(
+        [sys.executable, "-c", EXIT_PROBE, str(marker), str(duration)],
+        check=True,
+        env={**os.environ, "ESCTL_BACKGROUND_EXIT_TIMEOUT": timeout},
+    )
+    return marker.exists(), time.monotonic() - start
+
+
+def test_background_tasks_are_awaited_at_exit(tmp_path):
+    refreshed, _ = _exit_without_closing(tmp_path, 0.2, "5")
+    assert refreshed
+
+
+def test_background_tasks_do_not_hold_exit(tmp_path):
+    refreshed, elapsed = _exit_without_closing(tmp_path, 30, "0.2")
+    assert not refreshed
+    assert elapsed < 10
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from esctl.transport.cache import Cache
+
+
+@pytest.fixture
+def caches(cache):
+    second = Cache(cache.context_name)
+    cache.release("GET", "/_cat/shards")
+    yield cache, second
+    second.conn.close()
+
+
+def test_lease_is_exclusive(caches):
+    first, second = caches
+    assert first.acquire("GET", "/_cat/shards", timeout=30)
+    assert not second.acquire("GET", "/_cat/shards", timeout=30)
+    assert second.acquire("GET", "/_cat/health", timeout=30)
+    first.release("GET", "/_cat/shards")
+    assert second.acquire("GET", "/_cat/shards", timeout=30)
+    second.release("GET", "/_cat/shards")
+    second.release("GET", "/_cat/health")
+
+
+def test_expired_lease_is_taken_over(caches):
+    first, second = caches
+    assert first.acquire("GET", "/_cat/shards", timeout=-1)
+    assert second.acquire("GET", "/_cat/shards", timeout=30)
+    second.release("GET", "/_cat/shards")
+
+
+class SlowCluster:
+    def __init__(self, response, fail: bool = False):
+        self.response = response
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        time.sleep(0.2)
+        if self.fail and first:
+            raise ConnectionError("boom")
+        return self.response
+
+
+def _burst(node, cluster: SlowCluster, requests: int = 5) -> list:
+    node.upstream.side_effect = cluster
+    node.cache.release("GET", "/_cat/shards")
+
+    def request():
+        try:
+            return node.perform_request("GET", "/_cat/shards").body
+        except ConnectionError as e:
+            return e
+
+    with ThreadPoolExecutor(requests) as pool:
+        return list(pool.map(lambda _: request(), range(requests)))
+
+
+def test_identical_requests_are_sent_once(node, make_response):
+    cluster = SlowCluster(make_response(b'["shard"]'))
+    assert _burst(node, cluster) == [b'["shard"]'] * 5
+    assert cluster.calls == 1
+
+
+def test_waiters_send_the_request_when_the_holder_fails(node, make_response):
+    cluster = SlowCluster(make_response(b'["shard"]'), fail=True)
+    results = _burst(node, cluster)
+    assert sum(isinstance(result, ConnectionError) for result in results) == 1
+    assert results.count(b'["shard"]') == 4
+    assert cluster.calls == 2
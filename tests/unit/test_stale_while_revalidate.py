@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from esctl.transport import sessions
+from esctl.transport.transport import CacheHttpNode
+from esctl.transport.ttl import TTLPolicy
+
+
+def _age(node: CacheHttpNode, seconds: int) -> None:
+    node.cache.conn.execute(
+        f"UPDATE http_cache_{node.cache.context_name} SET stored_at = stored_at - ?;",
+        (seconds,),
+    )
+    node.cache.memory.clear()  # As in a new process
+
+
+@pytest.fixture
+def node(node, make_response):
+    node.upstream.return_value = make_response(b'"fresh"')
+    return node
+
+
+@pytest.fixture
+def stale(make_response):
+    return make_response(b'"stale"')
+
+
+def _wait_for_refresh():
+    while sessions._background:
+        time.sleep(0.01)
+
+
+def test_stale_response_is_served_and_refreshed(node, stale):
+    node.cache.set("GET", "/_cat/shards", stale, ttl=10, max_stale=60)
+    _age(node, 20)
+    assert node.perform_request("GET", "/_cat/shards").body == b'"stale"'
+    _wait_for_refresh()
+    assert node.upstream.call_count == 1
+    assert node.cache.get("GET", "/_cat/shards").body == b'"fresh"'
+
+
+def test_too_stale_response_is_a_miss(node, stale):
+    node.cache.set("GET", "/_cat/shards", stale, ttl=10, max_stale=60)
+    _age(node, 100)
+    assert node.perform_request("GET", "/_cat/shards").body == b'"fresh"'
+
+
+def test_stale_response_without_max_stale_is_a_miss(node, stale):
+    node.cache.set("GET", "/_cat/shards", stale, ttl=10)
+    _age(node, 20)
+    assert node.perform_request("GET", "/_cat/shards").body == b'"fresh"'
+
+
+def test_max_stale_from_ttl_json_object():
+    policy = TTLPolicy({r"^GET /_cat/shards": {"ttl": 30, "max_stale": 600}})
+    rule = policy.resolve("GET", "/_cat/shards")
+    assert (rule.ttl, rule.max_stale) == (30, 600)
+    assert policy.resolve("GET", "/_cat/health").max_stale == 0
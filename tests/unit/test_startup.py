@@ -0,0 +1,74 @@
+"""Cold start of the CLI, which shell completion pays on every TAB press."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+# Seconds `import esctl.cli` may take. Generous, to absorb slow CI runners: it
+# used to take well over a second when every command was imported eagerly.
+STARTUP_BUDGET = float(os.getenv("ESCTL_STARTUP_BUDGET", 1.0))
+
+HEAVY_MODULES = (
+    "elasticsearch8",
+    "elasticsearch9",
+    "elastic_transport",
+    "kubernetes",
+    "IPython",
+    "jmespath",
+    "jsonpath_ng",
+    "ruamel.yaml",
+    "requests",
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import esctl.cli
+elapsed = time.perf_counter() - start
+if len(sys.argv) > 1:
+    try:
+        esctl.cli.app(prog_name="esctl")
+    except SystemExit:
+        pass
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _probe(*args: str, env: dict[str, str] | None = None) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, *args],
+        capture_output=True,
+        check=True,
+        env={**os.environ, **(env or {})},
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_modules():
+    assert _probe()["loaded"] == []
+
+
+def test_import_within_budget():
+    elapsed = min(_probe()["elapsed"] for _ in range(3))
+    assert elapsed < STARTUP_BUDGET
+
+
+@pytest.mark.parametrize("words", ["esctl ", "esctl c", "esctl --out"])
+def test_completion_does_not_load_heavy_modules(words):
+    probe = _probe(
+        "completion",
+        env={
+            "_ESCTL_COMPLETE": "complete_bash",
+            "COMP_WORDS": words,
+            "COMP_CWORD": str(len(words.split(" ")) - 1),
+        },
+    )
+    assert probe["loaded"] == []
@@ -0,0 +1,46 @@
+import orjson
+import pytest
+
+from esctl.transport import ttl
+from esctl.transport.ttl import DEFAULT_TTL, TTLPolicy, ttl_policy
+
+
+@pytest.mark.parametrize(
+    "method, target, expected",
+    [
+        ("GET", "/_cat/health?format=json", ttl.VOLATILE),
+        ("GET", "/_cluster/health/logs-*", ttl.VOLATILE),
+        ("GET", "/logs-2024/_recovery", ttl.VOLATILE),
+        ("GET", "/_tasks?detailed", 5),
+        ("GET", "/_cat/templates", ttl.STABLE),
+        ("GET", "/_snapshot", ttl.STABLE),
+        ("GET", "/_snapshot/repo/_all", DEFAULT_TTL),
+        ("GET", "/logs-2024/_settings", ttl.STABLE),
+        ("HEAD", "/_index_template/logs", ttl.STABLE),
+        ("GET", "/_cat/shards", DEFAULT_TTL),
+    ],
+)
+def test_builtin_tiers(method, target, expected):
+    assert TTLPolicy({}).ttl(method, target) == expected
+
+
+def test_user_rules_come_first():
+    policy = TTLPolicy({r"^GET /_cat/health": 60})
+    rule = policy.resolve("get", "/_cat/health")
+    assert (rule.ttl, rule.source) == (60, "ttl.json")
+    assert policy.resolve("GET", "/_cat/recovery").source == "built-in"
+    assert policy.resolve("GET", "/_cat/shards").source == "default"
+
+
+def test_invalid_user_rules_are_skipped():
+    policy = TTLPolicy({"(": 60})
+    assert policy.ttl("GET", "/_cat/health") == ttl.VOLATILE
+
+
+def test_policy_is_reloaded_when_ttl_json_changes(tmp_path, monkeypatch):
+    path = tmp_path / "ttl.json"
+    monkeypatch.setattr(ttl, "ESCTL_TTL_CONFIG_PATH", path)
+    assert ttl_policy().ttl("GET", "/_cat/shards") == DEFAULT_TTL
+    assert ttl_policy() is ttl_policy()
+    path.write_bytes(orjson.dumps({"^GET /_cat/shards": 42}))
+    assert ttl_policy().ttl("GET", "/_cat/shards") == 42
@@ -0,0 +1,92 @@
+import socket
+import sys
+import time
+
+import pytest
+
+from esctl.transport import tunnel
+
+
+LISTENER = """
+import socket, sys, time
+s = socket.socket()
+s.bind(("localhost", int(sys.argv[1])))
+s.listen()
+time.sleep(60)
+"""
+
+
+def _listener(port: int) -> list[str]:
+    return [sys.executable, "-c", LISTENER, str(port)]
+
+
+@pytest.fixture(autouse=True)
+def tunnels_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tunnel, "ESCTL_TUNNELS_DIR", tmp_path)
+    yield tmp_path
+    for name in ("gce-test", "gce-other"):
+        tunnel.close_tunnel(name)
+
+
+def _busy_port() -> socket.socket:
+    s = socket.socket()
+    s.bind(("localhost", 0))
+    s.listen()
+    return s
+
+
+def test_tunnel_is_reused():
+    port = tunnel.open_tunnel("gce-test", "vm:9200", _listener, 0)
+    pid = tunnel._read("gce-test").pid
+    assert tunnel.open_tunnel("gce-test", "vm:9200", _listener, 0) == port
+    assert tunnel._read("gce-test").pid == pid
+
+
+def test_taken_preferred_port_is_avoided():
+    with _busy_port() as busy:
+        taken = busy.getsockname()[1]
+        port = tunnel.open_tunnel("gce-test", "vm:9200", _listener, taken)
+    assert port != taken
+
+
+def test_new_target_replaces_tunnel():
+    tunnel.open_tunnel("gce-test", "vm:9200", _listener, 0)
+    pid = tunnel._read("gce-test").pid
+    tunnel.open_tunnel("gce-test", "other-vm:9200", _listener, 0)
+    assert tunnel._read("gce-test").pid != pid
+    time.sleep(0.1)
+    assert not tunnel._is_running(pid)
+
+
+def test_idle_tunnels_are_reaped(monkeypatch):
+    tunnel.open_tunnel("gce-other", "vm:9200", _listener, 0)
+    pid = tunnel._read("gce-other").pid
+    monkeypatch.setattr(tunnel, "ESCTL_TUNNEL_IDLE_TIMEOUT", 0)
+    tunnel.reap_idle_tunnels()
+    assert tunnel._read("gce-other") is None
+    time.sleep(0.1)
+    assert not tunnel._is_running(pid)
+
+
+def test_failing_tunnel_raises():
+    with pytest.raises(ConnectionError):
+        tunnel.open_tunnel(
+            "gce-test", "vm:9200", lambda port: [sys.executable, "-c", ""], 0
+        )
+
+
+def test_idle_tunnels_expire_on_their_own(monkeypatch):
+    monkeypatch.setattr(tunnel, "ESCTL_TUNNEL_IDLE_TIMEOUT", 1)
+    port = tunnel.open_tunnel("gce-test", "vm:9200", _listener, 0)
+    pid = tunnel._read("gce-test").pid
+    time.sleep(0.5)
+    tunnel.touch_tunnel("gce-test")
+    time.sleep(0.8)
+    # Used half a second in: not idle for long enough yet
+    assert tunnel._is_listening(port)
+    deadline = time.monotonic() + 5
+    while tunnel._is_listening(port) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not tunnel._is_listening(port)
+    assert tunnel._read("gce-test") is None
+    tunnel._spawned.pop(pid).wait(5)